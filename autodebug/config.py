@@ -26,7 +26,12 @@ def load_config():
         'WORKFLOW_FILE': os.path.join(project_root, ".github", "workflows", "debug.yml"),
         'BACKUP_DIR': os.path.join(project_root, "backup"),
         'PROCESSED_RUNS_FILE': os.path.join(project_root, "processed_runs.json"),
-        'PUSH_HISTORY_FILE': os.path.join(project_root, "push_history.json")
+        'PUSH_HISTORY_FILE': os.path.join(project_root, "push_history.json"),
+        'GREEN_LOG_DIR': os.path.join(project_root, "logs", "green"),  # 最近一次成功运行的日志，用于对比定位失败
+        'STEP_TIMINGS_FILE': os.path.join(project_root, "step_timings.json"),  # 各次运行的步骤与阶段耗时
+        'SPECULATIVE_FIXES': int(os.getenv("AUTODEBUG_SPECULATIVE_FIXES", "0")),  # 同时推送验证的候选修复数，小于 2 时不启用
+        'FIX_STATS_FILE': os.path.join(project_root, "fix_stats.json"),  # 各 (错误签名, 修复) 的成功/失败次数
+        'FIX_POLICY': os.getenv("AUTODEBUG_FIX_POLICY", "thompson")  # 修复排序策略：thompson、ucb 或 order（原有顺序）
     }
 
     # 初始化全局状态
@@ -37,5 +42,7 @@ def load_config():
     config['run_id_counts'] = {}
     config['runs_on_fix_attempts'] = 0
     config['new_error_patterns'] = []
+    config['divergent_region'] = None
+    config['step_timing_report'] = None
 
     return config
\ No newline at end of file
@@ -5,13 +5,21 @@ import requests
 import time
 from datetime import datetime
 from autodebug.history import FixHistory
+from autodebug.workflow_document import WorkflowDocument, StepIndex, functional_operations, is_build_check_pair, step_key
+from autodebug.step_similarity import StepSimilarity, load_history_steps
+from autodebug.pattern_registry import get_pattern_registry, fix_entries
+from autodebug.traceback_extractor import first_traceback
+from autodebug.fix_scheduler import FixScheduler
 import json
 
+# 模块级相似度引擎，签名缓存在多次 DeepSeek 尝试之间复用
+step_similarity = StepSimilarity()
+
 # 全局集合，用于记录已修复的错误
 fixed_errors = set()
 
-def apply_fix(workflow_file, step_name, step_code, error_message, push_changes_func, iteration, branch, history_file):
-    """应用修复到工作流文件，避免嵌套错误、重复步骤，并验证步骤格式"""
+def apply_fix(workflow_file, step_name, step_code, error_message, push_changes_func, iteration, branch, history_file, document=None):
+    """应用修复到工作流文档，避免嵌套错误、重复步骤，并验证步骤格式；推送前一次性写入磁盘"""
     try:
         history = FixHistory(history_file)
 
@@ -20,10 +28,13 @@ def apply_fix(workflow_file, step_name, step_code, error_message, push_changes_f
             print(f"[DEBUG] 步骤 '{step_name}' 已被验证为正确，跳过修改")
             return False
 
-        with open(workflow_file, "r") as f:
-            workflow = yaml.safe_load(f) or {}
+        if document is None:
+            document = WorkflowDocument(workflow_file)
+        if not isinstance(document.data, dict):
+            print("[ERROR] 工作流文件无效，无法应用修复")
+            return False
 
-        jobs = workflow.get("jobs", {})
+        jobs = document.data.get("jobs", {})
         if not jobs:
             print("[ERROR] 工作流文件中未找到 'jobs' 部分，无法应用修复")
             return False
@@ -33,16 +44,13 @@ def apply_fix(workflow_file, step_name, step_code, error_message, push_changes_f
             print("[ERROR] 工作流文件中未找到 'build' 作业，无法应用修复")
             return False
 
-        steps = build_job.get("steps", [])
-        if not steps:
+        if not build_job.get("steps"):
             print("[WARNING] 'build' 作业中未找到步骤，初始化步骤列表")
-            steps = []
 
         # 检查步骤是否已存在（避免重复添加）
-        for step in steps:
-            if step.get("name") == step_name:
-                print(f"[DEBUG] 步骤 '{step_name}' 已存在，跳过修复")
-                return False
+        if document.has_step(step_name):
+            print(f"[DEBUG] 步骤 '{step_name}' 已存在，跳过修复")
+            return False
 
         # 加载新步骤并确保无嵌套错误
         step_yaml = yaml.safe_load(step_code)
@@ -71,25 +79,21 @@ def apply_fix(workflow_file, step_name, step_code, error_message, push_changes_f
             print(f"[ERROR] 修复步骤 '{step_name}' 缺少必要字段（需要 'name' 和 'run' 或 'uses'）：{step_yaml}")
             return False
 
-        # 添加验证通过的步骤
-        steps.append(step_yaml)
-
-        build_job["steps"] = steps
-        jobs["build"] = build_job
-        workflow["jobs"] = jobs
-
-        # 修复嵌套问题并验证语法
-        workflow = fix_yaml_nesting(workflow)
+        # 在内存中记录操作：添加步骤并修复嵌套
+        snapshot = document.snapshot()
+        document.add_step(step_yaml)
+        workflow = fix_yaml_nesting(document.data)
         if workflow is None:
             print("[ERROR] 无法修复 YAML 嵌套问题，停止操作")
+            document.replace(snapshot, reason="rollback")
             return False
+        document.set_steps(workflow["jobs"]["build"]["steps"], op="fix_nesting")
 
-        with open(workflow_file, "w") as f:
-            yaml_content = yaml.dump(workflow, sort_keys=False, indent=2, allow_unicode=True).rstrip() + '\n'
-            if not validate_yaml_content(workflow_file, yaml_content):
-                print("[ERROR] 修复后 YAML 语法仍不正确，停止操作")
-                return False
-            f.write(yaml_content)
+        # 推送前统一写入并验证一次
+        if not document.flush():
+            print("[ERROR] 修复后 YAML 语法仍不正确，停止操作")
+            document.replace(snapshot, reason="rollback")
+            return False
 
         print(f"[DEBUG] 已将修复步骤 '{step_name}' 添加到工作流文件")
         # 推送更改
@@ -227,27 +231,14 @@ def extract_specific_error_from_log(log_content):
     """从日志中提取更具体的错误信息，例如 ValueError: read of closed file"""
     log_lines = log_content.splitlines()
     specific_error = None
-    in_traceback = False
-    traceback_lines = []
     error_index = -1
 
-    for i, line in enumerate(log_lines):
-        if "Traceback (most recent call last):" in line or (line.strip().startswith("File ") and ".py" in line and not in_traceback):
-            in_traceback = True
-            traceback_lines.append(line)
-            continue
-        if in_traceback:
-            traceback_lines.append(line)
-            if line.strip() and not line.startswith("  File") and (line.strip().startswith("ValueError:") or line.strip().startswith("Error:") or line.strip().startswith("Exception:")):
-                error_message = "\n".join(traceback_lines)
-                if "ValueError: read of closed file" in error_message.lower():
-                    specific_error = error_message
-                    error_index = i
-                    print(f"[DEBUG] 从堆栈跟踪中提取到具体错误: {specific_error}")
-                    break
-                in_traceback = False
-                traceback_lines = []
-                continue
+    # 堆栈块来自 traceback_extractor 的缓存结果，与 log_parser 共用同一次扫描
+    block = first_traceback(log_content, lambda block: "valueerror: read of closed file" in block["text"].lower())
+    if block is not None:
+        specific_error = block["text"]
+        error_index = block["end"]
+        print(f"[DEBUG] 从堆栈跟踪中提取到具体错误: {specific_error}")
 
     if not specific_error:
         for i, line in enumerate(log_lines):
@@ -283,24 +274,28 @@ def analyze_error_relevance(error_context, steps):
     return relevant_step
 
 def check_step_functionality_similarity(step1, step2):
-    """检查两个步骤的功能是否相似（基于 run 命令）"""
-    if "run" not in step1 or "run" not in step2:
+    """检查两个步骤的功能是否相似（基于 run 命令的核心操作指纹）；批量查重请使用 StepIndex.find_similar"""
+    if not functional_operations(step1) & functional_operations(step2):
         return False
-    run1 = step1["run"].lower()
-    run2 = step2["run"].lower()
-    # 简单的功能相似性检查：如果两个步骤的 run 命令包含相同的核心操作（如 df -h, du -h）
-    common_operations = ["df -h", "du -h", "ping", "rm -rf", "apt-get clean"]
-    for op in common_operations:
-        if op in run1 and op in run2:
-            # 特殊情况：如果步骤名称中包含 "before build" 和 "after build"，允许功能重复
-            step1_name = step1.get("name", "").lower()
-            step2_name = step2.get("name", "").lower()
-            if ("before build" in step1_name and "after build" in step2_name) or \
-               ("before build" in step2_name and "after build" in step1_name):
-                print(f"[DEBUG] 允许功能重复步骤（用于磁盘空间排查）: {step1_name} 和 {step2_name}")
-                return False
-            return True
-    return False
+    # 特殊情况：如果步骤名称中包含 "before build" 和 "after build"，允许功能重复
+    if is_build_check_pair(step1, step2):
+        print(f"[DEBUG] 允许功能重复步骤（用于磁盘空间排查）: {step1.get('name', '')} 和 {step2.get('name', '')}")
+        return False
+    return True
+
+def step_functionality_key(step):
+    """需要查重的步骤功能类别：同时检查 df -h 与 du -h、网络检查、清理磁盘空间；其他步骤返回 None"""
+    run_content = step.get("run") if isinstance(step, dict) else None
+    if not isinstance(run_content, str):
+        return None
+    run_content = run_content.lower()
+    if "df -h" in run_content and "du -h" in run_content:
+        return "check_disk_space"
+    if "ping" in run_content:
+        return "check_network"
+    if "rm -rf" in run_content or "apt-get clean" in run_content:
+        return "clean_disk_space"
+    return None
 
 def reorder_steps(steps, correct_steps):
     """根据逻辑顺序重新排序步骤"""
@@ -334,15 +329,17 @@ def reorder_steps(steps, correct_steps):
 
     # 确保 correct_steps 按顺序排列
     ordered_steps = []
-    correct_steps_dict = {step.get("name", step.get("uses", "unnamed")): step for step in steps}
+    step_index = StepIndex(steps)
     for correct_step in correct_steps:
-        if correct_step in correct_steps_dict:
-            ordered_steps.append(correct_steps_dict[correct_step])
+        position = step_index.position(correct_step)
+        if position != -1:
+            ordered_steps.append(steps[position])
 
     # 添加其他步骤
+    correct_step_names = set(correct_steps)
     for step in preparation_steps:
         step_name = step.get("name", step.get("uses", "unnamed"))
-        if step_name not in correct_steps:
+        if step_name not in correct_step_names:
             ordered_steps.append(step)
     ordered_steps.extend(build_steps)
     ordered_steps.extend(verification_steps)
@@ -375,14 +372,16 @@ def fetch_annotations(run_id, config):
         print(f"[ERROR] 获取 Annotations 时发生错误: {e}")
         return []
 
-def fix_workflow(workflow_file, errors, error_patterns, push_changes_func, iteration, branch, history_file, run_id, job_id, annotations_error, error_details, successful_steps, config, log_content, additional_fixes=None):
+def fix_workflow(workflow_file, errors, error_patterns, push_changes_func, iteration, branch, history_file, run_id, job_id, annotations_error, error_details, successful_steps, config, log_content, additional_fixes=None, document=None):
     """尝试修复工作流中的错误，增强错误分类和本地修复逻辑"""
     try:
         history = FixHistory(history_file)
+        scheduler = FixScheduler(config['FIX_STATS_FILE'], config.get('FIX_POLICY', "thompson"), history_file=history_file)
 
-        # 加载当前工作流文件
-        with open(workflow_file, "r") as f:
-            current_workflow = yaml.safe_load(f)
+        # 加载当前工作流文档（每次迭代只加载一次，由调用方传入时复用）
+        if document is None:
+            document = WorkflowDocument(workflow_file)
+        current_workflow = document.data if isinstance(document.data, dict) else {}
 
         # 检查每个步骤的执行状态
         current_steps = current_workflow.get("jobs", {}).get("build", {}).get("steps", [])
@@ -511,11 +510,9 @@ def fix_workflow(workflow_file, errors, error_patterns, push_changes_func, itera
                     print(f"[DEBUG] 错误 '{error}' 与步骤 '{relevant_step}' 相关联")
 
         # 检查 debug.yml 文件的语法（不依赖运行日志）
-        with open(workflow_file, "r") as f:
-            content = f.read()
-        if not validate_yaml_content(workflow_file, content):
+        if document.load_error or not document.validate():
             print("[ERROR] 当前 debug.yml 语法错误，尝试修复...")
-            current_workflow = fix_yaml_nesting(current_workflow)
+            current_workflow = fix_yaml_nesting(current_workflow) if not document.load_error else None
             if current_workflow is None:
                 print("[ERROR] 无法修复 YAML 嵌套问题，尝试重置 debug.yml...")
                 # 重置 debug.yml 文件
@@ -551,8 +548,8 @@ def fix_workflow(workflow_file, errors, error_patterns, push_changes_func, itera
                         }
                     }
                 }
-                with open(workflow_file, "w") as f:
-                    yaml.dump(reset_workflow, f, sort_keys=False, indent=2, allow_unicode=True)
+                document.replace(reset_workflow, reason="reset")
+                document.flush()
                 print("[DEBUG] 已重置 debug.yml 以修复语法错误")
                 success = push_changes_func(f"AutoDebug: Reset debug.yml to fix syntax (iteration {iteration})", None, branch)
                 if not success:
@@ -562,6 +559,10 @@ def fix_workflow(workflow_file, errors, error_patterns, push_changes_func, itera
                         json.dump(fix_history, f, ensure_ascii=False, indent=2)
                     return False
                 return True
+            document.replace(current_workflow, reason="fix_nesting")
+            if not document.flush():
+                print("[ERROR] 修复嵌套后 debug.yml 仍无法通过验证")
+                return False
             print("[DEBUG] 已修复 debug.yml 语法")
             success = push_changes_func(f"AutoDebug: Fix YAML syntax (iteration {iteration})", None, branch)
             if not success:
@@ -610,7 +611,7 @@ def fix_workflow(workflow_file, errors, error_patterns, push_changes_func, itera
                             print(f"[DEBUG] 修复 '{fix['name']}' 之前已失败，跳过...")
                             continue
                         print(f"[DEBUG] 尝试修复依赖问题: {fix['name']}")
-                        success = apply_fix(workflow_file, fix["target"], fix["step"], error, push_changes_func, iteration, branch, history_file)
+                        success = apply_fix(workflow_file, fix["target"], fix["step"], error, push_changes_func, iteration, branch, history_file, document=document)
                         if not success:
                             print("[ERROR] 推送失败，停止后续操作")
                             fix_history["errors"][error]["failed_attempts"].append({"fix": fix["name"], "reason": "推送失败"})
@@ -623,6 +624,7 @@ def fix_workflow(workflow_file, errors, error_patterns, push_changes_func, itera
                             json.dump(fix_history, f, ensure_ascii=False, indent=2)
                         fixed_errors.add(error)
                         history.update_step_status(fix["target"], True)
+                        scheduler.mark_applied(error, fix["name"], run_id)
                         return True
                     else:
                         print(f"[DEBUG] 未识别的依赖错误: {package_name}=={version}，跳过...")
@@ -645,7 +647,7 @@ def fix_workflow(workflow_file, errors, error_patterns, push_changes_func, itera
                     print(f"[DEBUG] 修复 '{fix['name']}' 之前已失败，跳过...")
                     continue
                 print(f"[DEBUG] 尝试修复网络超时问题: {fix['name']}")
-                success = apply_fix(workflow_file, fix["target"], fix["step"], error, push_changes_func, iteration, branch, history_file)
+                success = apply_fix(workflow_file, fix["target"], fix["step"], error, push_changes_func, iteration, branch, history_file, document=document)
                 if not success:
                     print("[ERROR] 推送失败，停止后续操作")
                     fix_history["errors"][error]["failed_attempts"].append({"fix": fix["name"], "reason": "推送失败"})
@@ -658,71 +660,49 @@ def fix_workflow(workflow_file, errors, error_patterns, push_changes_func, itera
                     json.dump(fix_history, f, ensure_ascii=False, indent=2)
                 fixed_errors.add(error)
                 history.update_step_status(fix["target"], True)
+                scheduler.mark_applied(error, fix["name"], run_id)
                 return True
 
-        # 检查错误模式并应用修复
-        for pattern_info in error_patterns:
-            pattern = pattern_info["pattern"]
-            for error in cleaned_errors:
-                if re.search(pattern, error, re.IGNORECASE):
-                    print(f"[DEBUG] 错误 '{error}' 匹配模式 '{pattern}'")
-                    fixes = pattern_info.get("fix")
-                    if fixes:
-                        if isinstance(fixes, list):
-                            for fix in fixes:
-                                step_name = fix.get("step_name")
-                                step_code = fix.get("step_code")
-                                if step_name in error_step_mapping.get(error, "") or not error_step_mapping.get(error):
-                                    if step_code and not history.is_section_protected(step_name):
-                                        failed_attempts = fix_history.get("errors", {}).get(error, {}).get("failed_attempts", [])
-                                        failed_fixes = [attempt["fix"] for attempt in failed_attempts]
-                                        if step_name in failed_fixes:
-                                            print(f"[DEBUG] 修复 '{step_name}' 之前已失败，跳过...")
-                                            continue
-                                        print(f"[DEBUG] 尝试修复: {step_name}")
-                                        success = apply_fix(workflow_file, step_name, step_code, error, push_changes_func, iteration, branch, history_file)
-                                        if not success:
-                                            print("[ERROR] 推送失败，停止后续操作")
-                                            fix_history["errors"][error]["failed_attempts"].append({"fix": step_name, "reason": "推送失败"})
-                                            with open(history_file, "w") as f:
-                                                json.dump(fix_history, f, ensure_ascii=False, indent=2)
-                                            return False
-                                        fix_history["errors"][error]["successful_fix"] = step_code
-                                        fix_history["errors"][error]["timestamp"] = datetime.now().isoformat()
-                                        with open(history_file, "w") as f:
-                                            json.dump(fix_history, f, ensure_ascii=False, indent=2)
-                                        fixed_errors.add(error)
-                                        history.update_step_status(step_name, True)
-                                        return True
-                                        print(f"[DEBUG] 修复 '{step_name}' 失败，尝试下一个方案")
-                        elif isinstance(fixes, dict):
-                            step_name = fixes.get("step_name")
-                            step_code = fixes.get("step_code")
-                            if step_name in error_step_mapping.get(error, "") or not error_step_mapping.get(error):
-                                if step_code and not history.is_section_protected(step_name):
-                                    failed_attempts = fix_history.get("errors", {}).get(error, {}).get("failed_attempts", [])
-                                    failed_fixes = [attempt["fix"] for attempt in failed_attempts]
-                                    if step_name in failed_fixes:
-                                        print(f"[DEBUG] 修复 '{step_name}' 之前已失败，跳过...")
-                                        continue
-                                    print(f"[DEBUG] 找到匹配的修复: {step_name}")
-                                    success = apply_fix(workflow_file, step_name, step_code, error, push_changes_func, iteration, branch, history_file)
-                                    if not success:
-                                        print("[ERROR] 推送失败，停止后续操作")
-                                        fix_history["errors"][error]["failed_attempts"].append({"fix": step_name, "reason": "推送失败"})
-                                        with open(history_file, "w") as f:
-                                            json.dump(fix_history, f, ensure_ascii=False, indent=2)
-                                        return False
-                                    fix_history["errors"][error]["successful_fix"] = step_code
-                                    fix_history["errors"][error]["timestamp"] = datetime.now().isoformat()
-                                    with open(history_file, "w") as f:
-                                        json.dump(fix_history, f, ensure_ascii=False, indent=2)
-                                    fixed_errors.add(error)
-                                    history.update_step_status(step_name, True)
-                                    return True
+        # 检查错误模式并应用修复（字面量预过滤：每个错误只扫描一次，仅对候选模式运行正则）
+        # 每个错误匹配到的修复按历史成功率排序后依次尝试，而不是按 error_patterns 的列表顺序
+        pattern_registry = get_pattern_registry(error_patterns)
+        for error in cleaned_errors:
+            candidates = set(pattern_registry.candidates(error))
+            matched_fixes = []
+            for pattern_index, pattern_info in enumerate(error_patterns):
+                if pattern_index in candidates and pattern_registry.search(pattern_index, error):
+                    print(f"[DEBUG] 错误 '{error}' 匹配模式 '{pattern_info['pattern']}'")
+                    matched_fixes.extend(fix_entries(pattern_info))
+            for fix in scheduler.rank([error], matched_fixes, key=lambda fix: fix.get("step_name")):
+                step_name = fix.get("step_name")
+                step_code = fix.get("step_code")
+                if step_name in error_step_mapping.get(error, "") or not error_step_mapping.get(error):
+                    if step_code and not history.is_section_protected(step_name):
+                        failed_attempts = fix_history.get("errors", {}).get(error, {}).get("failed_attempts", [])
+                        failed_fixes = [attempt["fix"] for attempt in failed_attempts]
+                        if step_name in failed_fixes:
+                            print(f"[DEBUG] 修复 '{step_name}' 之前已失败，跳过...")
+                            continue
+                        print(f"[DEBUG] 尝试修复: {step_name}")
+                        success = apply_fix(workflow_file, step_name, step_code, error, push_changes_func, iteration, branch, history_file, document=document)
+                        if not success:
+                            print("[ERROR] 推送失败，停止后续操作")
+                            fix_history["errors"][error]["failed_attempts"].append({"fix": step_name, "reason": "推送失败"})
+                            with open(history_file, "w") as f:
+                                json.dump(fix_history, f, ensure_ascii=False, indent=2)
+                            return False
+                        fix_history["errors"][error]["successful_fix"] = step_code
+                        fix_history["errors"][error]["timestamp"] = datetime.now().isoformat()
+                        with open(history_file, "w") as f:
+                            json.dump(fix_history, f, ensure_ascii=False, indent=2)
+                        fixed_errors.add(error)
+                        history.update_step_status(step_name, True)
+                        scheduler.mark_applied(error, step_name, run_id)
+                        return True
 
-        # 处理附加修复
+        # 处理附加修复（同样按历史成功率排序）
         if additional_fixes:
+            additional_fixes = scheduler.rank(cleaned_errors, additional_fixes, key=lambda fix: fix.get("name"))
             for fix in additional_fixes:
                 step_name = fix.get("name")
                 step_code = fix.get("step")
@@ -743,7 +723,7 @@ def fix_workflow(workflow_file, errors, error_patterns, push_changes_func, itera
                     if action == "add_step":
                         if (step_name in error_step_mapping.get(error, "") or not error_step_mapping.get(error)) and not history.is_section_protected(step_name):
                             print(f"[DEBUG] 尝试附加修复: {step_name}")
-                            success = apply_fix(workflow_file, step_name, step_code, error, push_changes_func, iteration, branch, history_file)
+                            success = apply_fix(workflow_file, step_name, step_code, error, push_changes_func, iteration, branch, history_file, document=document)
                             if not success:
                                 print("[ERROR] 推送失败，停止后续操作")
                                 fix_history["errors"][error]["failed_attempts"].append({"fix": step_name, "reason": "推送失败"})
@@ -756,11 +736,12 @@ def fix_workflow(workflow_file, errors, error_patterns, push_changes_func, itera
                                 json.dump(fix_history, f, ensure_ascii=False, indent=2)
                             fixed_errors.add(error)
                             history.update_step_status(step_name, True)
+                            scheduler.mark_applied(error, step_name, run_id)
                             return True
                     elif action == "modify_step" and target:
                         if (target in error_step_mapping.get(error, "") or not error_step_mapping.get(error)) and not history.is_section_protected(target):
                             print(f"[DEBUG] 尝试修改步骤 {target} 以修复: {step_name}")
-                            success = apply_fix(workflow_file, target, step_code, error, push_changes_func, iteration, branch, history_file)
+                            success = apply_fix(workflow_file, target, step_code, error, push_changes_func, iteration, branch, history_file, document=document)
                             if not success:
                                 print("[ERROR] 推送失败，停止后续操作")
                                 fix_history["errors"][error]["failed_attempts"].append({"fix": step_name, "reason": "推送失败"})
@@ -773,6 +754,7 @@ def fix_workflow(workflow_file, errors, error_patterns, push_changes_func, itera
                                 json.dump(fix_history, f, ensure_ascii=False, indent=2)
                             fixed_errors.add(error)
                             history.update_step_status(target, True)
+                            scheduler.mark_applied(error, step_name, run_id)
                             return True
 
         # 尝试 DeepSeek API 修复
@@ -791,8 +773,7 @@ def fix_workflow(workflow_file, errors, error_patterns, push_changes_func, itera
             max_consecutive_failures = 3
             start_time = time.time()
 
-            with open(workflow_file, "r") as f:
-                original_workflow = yaml.safe_load(f)
+            original_workflow = document.snapshot()
 
             project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
             autodebug_dir = os.path.join(project_root, "autodebug")
@@ -822,6 +803,8 @@ def fix_workflow(workflow_file, errors, error_patterns, push_changes_func, itera
                 else:
                     key_log_parts.append(f"错误 {idx + 1}: {error}\n上下文:\n{error_details[idx]['context']}")
             key_log_content = "\n\n".join(key_log_parts)
+            # main 已把 log_content 缩小为与最近成功运行首次出现差异的区域
+            log_label = "与最近成功运行对比的首个差异区域" if config.get('divergent_region') else "完整的日志内容"
             if len(key_log_content) > max_log_length:
                 key_log_content = key_log_content[:max_log_length]
 
@@ -843,8 +826,7 @@ def fix_workflow(workflow_file, errors, error_patterns, push_changes_func, itera
                 else:
                     failed_attempts_context[error] = "无失败尝试"
 
-            with open(workflow_file, "r") as f:
-                current_workflow = yaml.safe_load(f)
+            current_workflow = document.data if isinstance(document.data, dict) else {}
 
             incorrect_modifications = fix_history.get("incorrect_modifications", [])
             current_steps = current_workflow.get("jobs", {}).get("build", {}).get("steps", [])
@@ -886,8 +868,10 @@ def fix_workflow(workflow_file, errors, error_patterns, push_changes_func, itera
 ```yaml
 {yaml.dump(current_workflow, sort_keys=False, indent=2, allow_unicode=True)}
 ```
-- 完整的日志内容（前 {max_log_length} 字符）：
+- {log_label}（前 {max_log_length} 字符）：
 {log_content[:max_log_length] if log_content else '无日志内容'}
+- 构建耗时（可在修复的同时缩短最慢的步骤）：
+{config.get('step_timing_report') or '无耗时数据'}
 - 正确的步骤（必须保留）：
 {', '.join(correct_steps)}
 - 受保护的步骤（不得修改）：
@@ -970,10 +954,9 @@ def fix_workflow(workflow_file, errors, error_patterns, push_changes_func, itera
                                 new_workflow = yaml.safe_load(yaml_content)
                                 fixed_workflow = fix_yaml_nesting(new_workflow)
                                 if fixed_workflow:
-                                    with open(workflow_file, "w") as f:
-                                        yaml.dump(fixed_workflow, f, sort_keys=False, indent=2, allow_unicode=True)
+                                    document.replace(fixed_workflow, reason="deepseek_fix")
                                     print("[DEBUG] 已自动修复 DeepSeek 返回的 YAML 嵌套问题")
-                                    if validate_yaml_content(workflow_file, yaml_content):
+                                    if document.flush():
                                         print("[DEBUG] DeepSeek 修复后的 YAML 语法验证通过")
                                         fix_history["successful_fix"] = "DeepSeek API fix with nesting correction"
                                         fix_history["timestamp"] = datetime.now().isoformat()
@@ -1003,8 +986,8 @@ def fix_workflow(workflow_file, errors, error_patterns, push_changes_func, itera
                                             return False
                                         return True
                                 print("[DEBUG] 自动修复失败，回退到原始文件")
-                                with open(workflow_file, "w") as f:
-                                    yaml.dump(original_workflow, f, sort_keys=False, indent=2, allow_unicode=True)
+                                document.replace(original_workflow, reason="rollback")
+                                document.flush()
                                 for error in cleaned_errors:
                                     history.add_deepseek_attempt(error, yaml_content, "YAML syntax error after DeepSeek fix", False)
                                 consecutive_failures += 1
@@ -1019,8 +1002,8 @@ def fix_workflow(workflow_file, errors, error_patterns, push_changes_func, itera
                                 new_workflow = fix_yaml_true_field(new_workflow)
                                 if new_workflow is None:
                                     print("[DEBUG] 修复 'true' 字段失败，回退到原始文件")
-                                    with open(workflow_file, "w") as f:
-                                        yaml.dump(original_workflow, f, sort_keys=False, indent=2, allow_unicode=True)
+                                    document.replace(original_workflow, reason="rollback")
+                                    document.flush()
                                     for error in cleaned_errors:
                                         history.add_deepseek_attempt(error, yaml_content, "Contains 'true' field error", False)
                                     consecutive_failures += 1
@@ -1072,34 +1055,37 @@ def fix_workflow(workflow_file, errors, error_patterns, push_changes_func, itera
                                 time.sleep(5 * (attempt + 1))
                                 continue
 
-                            # 移除功能重复的步骤
-                            seen_functionalities = set()
+                            # 移除功能重复的步骤（按核心操作指纹哈希查找，避免两两比较）
+                            functionality_index = StepIndex()
                             unique_steps = []
                             for step in steps:
+                                if not isinstance(step, dict):
+                                    continue
                                 step_identifier = step.get("uses", step.get("name", "unnamed"))
-                                # 检查功能重复
-                                functionality_key = None
-                                if "run" in step:
-                                    run_content = step["run"].lower()
-                                    if "df -h" in run_content and "du -h" in run_content:
-                                        functionality_key = "check_disk_space"
-                                    elif "ping" in run_content:
-                                        functionality_key = "check_network"
-                                    elif "rm -rf" in run_content or "apt-get clean" in run_content:
-                                        functionality_key = "clean_disk_space"
-                                if functionality_key:
-                                    # 检查是否已经存在类似功能的步骤
-                                    for existing_step in unique_steps:
-                                        if check_step_functionality_similarity(step, existing_step):
-                                            print(f"[DEBUG] 检测到功能重复步骤: {step_identifier}（功能: {functionality_key}），移除重复项")
-                                            for error in cleaned_errors:
-                                                history.add_deepseek_attempt(error, yaml_content, f"Duplicate functionality detected: {functionality_key}", False)
-                                            break
-                                    else:
-                                        seen_functionalities.add(functionality_key)
-                                        unique_steps.append(step)
-                                else:
-                                    unique_steps.append(step)
+                                # 只对磁盘检查、网络检查、清理这几类步骤查重，索引只用于查找
+                                functionality_key = step_functionality_key(step)
+                                if functionality_key and functionality_index.find_similar(step) != -1:
+                                    print(f"[DEBUG] 检测到功能重复步骤: {step_identifier}（功能: {functionality_key}），移除重复项")
+                                    for error in cleaned_errors:
+                                        history.add_deepseek_attempt(error, yaml_content, f"Duplicate functionality detected: {functionality_key}", False)
+                                    continue
+                                functionality_index.add(step)
+                                unique_steps.append(step)
+
+                            # 基于 MinHash 的近似重复检测（一次批量完成，不做两两比较）
+                            near_duplicates = step_similarity.duplicate_positions(unique_steps)
+                            if near_duplicates:
+                                for position, (kept, score) in sorted(near_duplicates.items()):
+                                    step_identifier = step_key(unique_steps[position])
+                                    print(f"[DEBUG] 检测到近似重复步骤: {step_identifier} ≈ {step_key(unique_steps[kept])}（相似度 {score:.2f}），移除重复项")
+                                    for error in cleaned_errors:
+                                        history.add_deepseek_attempt(error, yaml_content, f"Near-duplicate step detected: {step_identifier}", False)
+                                unique_steps = [step for i, step in enumerate(unique_steps) if i not in near_duplicates]
+
+                            # 与历史推送版本中的步骤比对，便于追踪重复出现的修复
+                            history_matches = step_similarity.match_history(unique_steps, load_history_steps(config.get("PUSH_HISTORY_FILE", "push_history.json")))
+                            for position, matched in history_matches.items():
+                                print(f"[DEBUG] 步骤 {step_key(unique_steps[position])} 与历史步骤相似: {matched[:3]}")
 
                             # 移除名称重复的步骤
                             seen_steps = set()
@@ -1118,8 +1104,8 @@ def fix_workflow(workflow_file, errors, error_patterns, push_changes_func, itera
                             final_steps = reorder_steps(final_steps, correct_steps)
 
                             # 确保必要步骤存在
-                            current_steps = [step.get("name", step.get("uses", "unnamed")) for step in final_steps]
-                            missing_required_steps = [step for step in correct_steps if step not in current_steps]
+                            final_index = StepIndex(final_steps)
+                            missing_required_steps = [step for step in correct_steps if step not in final_index]
                             if missing_required_steps:
                                 print(f"[DEBUG] DeepSeek 建议的 debug.yml 缺少必要步骤: {missing_required_steps}，自动补充")
                                 required_steps_definitions = {
@@ -1346,9 +1332,17 @@ fi"""
                                         print(f"[DEBUG] 修改工件名称以避免冲突: {artifact_name} -> {step['with']['name']}")
 
                             # 写入文件并规范化格式
-                            yaml_content = yaml.dump(new_workflow, sort_keys=False, indent=2, allow_unicode=True).rstrip() + '\n'
-                            with open(workflow_file, "w") as f:
-                                f.write(yaml_content)
+                            document.replace(new_workflow, reason="deepseek_fix")
+                            yaml_content = document.dump()
+                            if not document.flush():
+                                print("[ERROR] DeepSeek 修复后的 debug.yml 未通过验证，回退到原始文件")
+                                document.replace(original_workflow, reason="rollback")
+                                document.flush()
+                                for error in cleaned_errors:
+                                    history.add_deepseek_attempt(error, yaml_content, "Workflow validation failed", False)
+                                consecutive_failures += 1
+                                time.sleep(5 * (attempt + 1))
+                                continue
                             print("[DEBUG] DeepSeek 修复已应用到 debug.yml（已保留受保护步骤并补充缺失步骤）")
 
                             fix_history["successful_fix"] = "DeepSeek API fix with preserved steps"
@@ -1374,4 +1368,41 @@ fi"""
                             if not success:
                                 print("[ERROR] 推送失败，停止后续操作")
                                 fix_history["errors"][cleaned_errors[0] if cleaned_errors else "unknown_error"]["failed_attempts"].append({"fix": "DeepSeek API fix", "reason": "推送失败"})
-                                with open(history
\ No newline at end of file
+                                with open(history_file, "w") as f:
+                                    json.dump(fix_history, f, ensure_ascii=False, indent=2)
+                                return False
+                            return True
+
+                        print("[ERROR] DeepSeek 返回内容中未找到 YAML 代码块")
+                        for error in cleaned_errors:
+                            history.add_deepseek_attempt(error, suggestion, "No YAML block in response", False)
+                        consecutive_failures += 1
+                        time.sleep(5 * (attempt + 1))
+                        continue
+
+                    print(f"[ERROR] DeepSeek API 请求失败: {response.status_code} {response.text}")
+                    consecutive_failures += 1
+                    time.sleep(5 * (attempt + 1))
+                except Exception as e:
+                    print(f"[ERROR] DeepSeek API 调用异常 (尝试 {attempt + 1}/{max_retries}): {e}")
+                    consecutive_failures += 1
+                    time.sleep(5 * (attempt + 1))
+
+            print(f"[ERROR] DeepSeek API 修复经过 {max_retries} 次尝试仍未成功")
+            return False
+
+        print("[DEBUG] 未找到可用的修复方案")
+        return False
+
+    except Exception as e:
+        print(f"[ERROR] 修复工作流失败: {e}")
+        return False
+
+def analyze_and_fix(workflow_file, errors, error_patterns, push_changes_func, iteration, branch, history_file, run_id, job_id, annotations_error, error_details, successful_steps, config, log_content, additional_fixes=None, document=None):
+    """分析日志并应用修复（包装 fix_workflow）"""
+    print("[DEBUG] 开始分析并修复...")
+    return fix_workflow(
+        workflow_file, errors, error_patterns, push_changes_func, iteration, branch, history_file,
+        run_id, job_id, annotations_error, error_details, successful_steps, config, log_content,
+        additional_fixes=additional_fixes, document=document
+    )
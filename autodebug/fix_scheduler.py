@@ -0,0 +1,346 @@
+import argparse
+import json
+import math
+import os
+import random
+import re
+import sys
+from datetime import datetime
+
+# 动态添加项目根目录到 sys.path（支持直接运行脚本）
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from autodebug.log_template_miner import tokenize
+
+POLICIES = ("thompson", "ucb", "order")
+MAX_SIGNATURE_LENGTH = 200
+# 同一修复在其他错误签名上的统计按此权重折算为先验，新错误也能借用全局经验
+GLOBAL_WEIGHT = 0.5
+# 没有任何统计的修复取先验均值，彼此之间保持原有顺序
+PRIOR_MEAN = 0.5
+# 合成回放：每个签名上真正有效的修复的成功率，以及默认的签名数与回合数
+EFFECTIVE_RATE = 0.85
+SYNTHETIC_SIGNATURES = 12
+SYNTHETIC_EPISODES = 300
+
+def error_signature(error):
+    """错误签名：去掉时间戳、数字、路径等变量后的行模板，同类错误在不同运行中得到相同签名"""
+    return " ".join(tokenize(error))[:MAX_SIGNATURE_LENGTH]
+
+def _empty_stats():
+    return {"arms": {}, "pending": []}
+
+class FixScheduler:
+    """按历史成功率为候选修复排序（多臂老虎机）：每个 (错误签名, 修复) 记录成功/失败次数。
+
+    thompson 从 Beta(1+成功, 1+失败) 中采样，ucb 取均值加置信上界，order 保持原有顺序。
+    修复应用后记为待定，下一次完成的运行中该签名的错误消失（或运行成功）记为成功，仍出现记为失败。
+    """
+
+    def __init__(self, stats_file, policy="thompson", history_file=None, seed=None):
+        if policy not in POLICIES:
+            print(f"[WARNING] 未知的修复排序策略 {policy}，改用 thompson")
+            policy = "thompson"
+        self.stats_file = stats_file
+        self.policy = policy
+        self.random = random.Random(seed)
+        self.stats = self.load()
+        if self.stats is None:
+            self.stats = _empty_stats()
+            if history_file and os.path.exists(history_file):
+                self.bootstrap(history_file)
+
+    def load(self):
+        if not self.stats_file or not os.path.exists(self.stats_file):
+            return None
+        try:
+            with open(self.stats_file, "r", encoding="utf-8") as f:
+                stats = json.load(f)
+            stats.setdefault("arms", {})
+            stats.setdefault("pending", [])
+            return stats
+        except Exception as e:
+            print(f"[WARNING] 读取修复统计失败: {e}")
+            return None
+
+    def save(self):
+        if not self.stats_file:
+            return
+        try:
+            with open(self.stats_file, "w", encoding="utf-8") as f:
+                json.dump(self.stats, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            print(f"[WARNING] 保存修复统计失败: {e}")
+
+    def bootstrap(self, history_file):
+        """首次使用时从 fix_history.json 推断已有的修复结果"""
+        try:
+            with open(history_file, "r", encoding="utf-8") as f:
+                events = events_from_history(json.load(f))
+        except Exception as e:
+            print(f"[WARNING] 从修复历史初始化统计失败: {e}")
+            return
+        for event in events:
+            self._update(event["signature"], event["fix"], event["success"])
+        if events:
+            print(f"[DEBUG] 已从修复历史导入 {len(events)} 条修复结果")
+            self.save()
+
+    def _counts(self, signature, fix):
+        arm = self.stats["arms"].get(signature, {}).get(fix)
+        return (arm["success"], arm["failure"]) if arm else (0, 0)
+
+    def _global_counts(self, signature, fix):
+        success = failure = 0
+        for other, arms in self.stats["arms"].items():
+            if other != signature and fix in arms:
+                success += arms[fix]["success"]
+                failure += arms[fix]["failure"]
+        return success, failure
+
+    def _update(self, signature, fix, success):
+        arm = self.stats["arms"].setdefault(signature, {}).setdefault(fix, {"success": 0, "failure": 0})
+        arm["success" if success else "failure"] += 1
+
+    def score(self, signature, fix, total=None):
+        success, failure = self._counts(signature, fix)
+        global_success, global_failure = self._global_counts(signature, fix)
+        alpha = 1 + success + GLOBAL_WEIGHT * global_success
+        beta = 1 + failure + GLOBAL_WEIGHT * global_failure
+        if self.policy == "order" or alpha + beta == 2:
+            return PRIOR_MEAN
+        if self.policy == "thompson":
+            return self.random.betavariate(alpha, beta)
+        # UCB1：样本数取折算后的次数，total 为该签名下所有修复的尝试总数
+        n = alpha + beta - 2
+        mean = (alpha - 1) / n
+        return mean + math.sqrt(2 * math.log(max(total or n, 1) + 1) / n)
+
+    def rank(self, errors, fixes, key=lambda fix: fix):
+        """按策略对候选修复重新排序（稳定排序，得分相同时保持原顺序）；多个错误时取各签名中的最高分"""
+        signatures = list(dict.fromkeys(error_signature(error) for error in errors)) or [""]
+        totals = {signature: sum(arm["success"] + arm["failure"] for arm in self.stats["arms"].get(signature, {}).values())
+                  for signature in signatures}
+        scored = []
+        for fix in fixes:
+            name = key(fix)
+            scored.append((max(self.score(signature, name, totals[signature]) for signature in signatures), fix))
+        ranked = [fix for _, fix in sorted(scored, key=lambda item: -item[0])]
+        if self.policy != "order" and [key(fix) for fix in ranked] != [key(fix) for fix in fixes]:
+            print(f"[DEBUG] 修复排序（{self.policy}）: {[key(fix) for fix in ranked][:5]}")
+        return ranked
+
+    def mark_applied(self, error, fix, run_id=None):
+        """记录已应用、尚待验证的修复；run_id 为触发修复的运行"""
+        self.stats["pending"].append({
+            "signature": error_signature(error),
+            "fix": fix,
+            "run_id": str(run_id) if run_id is not None else None,
+            "applied_at": datetime.now().isoformat()
+        })
+        self.save()
+
+    def resolve(self, run_id, conclusion, errors):
+        """用一次完成的运行结果验证待定修复，返回 [(签名, 修复, 是否成功)]；触发修复的那次运行本身不参与验证"""
+        run_id = str(run_id) if run_id is not None else None
+        signatures = {error_signature(error) for error in errors}
+        resolved = []
+        remaining = []
+        for item in self.stats["pending"]:
+            if run_id is not None and item.get("run_id") == run_id:
+                remaining.append(item)
+                continue
+            success = conclusion == "success" or item["signature"] not in signatures
+            self._update(item["signature"], item["fix"], success)
+            resolved.append((item["signature"], item["fix"], success))
+        if resolved:
+            self.stats["pending"] = remaining
+            self.save()
+        return resolved
+
+    def record(self, errors, results):
+        """直接记录已知的运行结果 [(修复, 是否成功)]（例如推测执行中各候选的运行），计入每个错误的签名"""
+        signatures = list(dict.fromkeys(error_signature(error) for error in errors))
+        for fix, success in results:
+            for signature in signatures:
+                self._update(signature, fix, success)
+        if signatures and results:
+            self.save()
+
+    def summary(self, top=10):
+        rows = []
+        for signature, arms in self.stats["arms"].items():
+            for fix, arm in arms.items():
+                rows.append((signature, fix, arm["success"], arm["failure"]))
+        return sorted(rows, key=lambda row: -(row[2] + row[3]))[:top]
+
+def events_from_history(fix_history):
+    """从 fix_history.json 推断按时间排序的修复结果 [{'signature', 'fix', 'success'}]。
+
+    history 中每次应用修复都有一条记录（应用时 success 为 False，并非运行结果）：同一签名之后又应用了
+    其他修复，说明这次修复没有解决问题，否则视为成功。errors[*].failed_attempts 中的修复记为失败
+    （推送失败的除外，那不是运行结果）。
+    """
+    if not isinstance(fix_history, dict):
+        return []
+    attempts = [entry for entry in fix_history.get("history", [])
+                if isinstance(entry, dict) and entry.get("step_name") and entry.get("error_message")]
+    attempts.sort(key=lambda entry: entry.get("timestamp") or "")
+    signatures = [error_signature(entry["error_message"]) for entry in attempts]
+    events = []
+    for i, entry in enumerate(attempts):
+        events.append({"signature": signatures[i], "fix": entry["step_name"],
+                       "success": signatures[i] not in signatures[i + 1:], "timestamp": entry.get("timestamp")})
+    for error, info in fix_history.get("errors", {}).items():
+        if not isinstance(info, dict):
+            continue
+        for attempt in info.get("failed_attempts", []):
+            if isinstance(attempt, dict) and attempt.get("fix") and attempt.get("reason") != "推送失败":
+                events.append({"signature": error_signature(error), "fix": attempt["fix"], "success": False,
+                               "timestamp": None})
+    return events
+
+def episodes_from_events(events):
+    """把修复结果按签名切分为若干回合：同一签名的连续尝试直到第一次成功为止。
+
+    回合只包含历史上实际试过的修复，成功的那个总是最后试的；因此评估时基准顺序取 fix_order
+    （error_patterns 的列表顺序），而不是历史上的尝试顺序，否则任何重新排序都只会显得更好。
+    """
+    episodes = []
+    open_episodes = {}
+    for event in events:
+        episode = open_episodes.get(event["signature"])
+        if episode is None:
+            episode = open_episodes[event["signature"]] = {"signature": event["signature"], "outcomes": {}}
+            episodes.append(episode)
+        episode["outcomes"].setdefault(event["fix"], event["success"])
+        if event["success"]:
+            del open_episodes[event["signature"]]
+    return episodes
+
+def fix_order(error_patterns):
+    """error_patterns 中各修复按列表顺序去重，即 order 策略（原有逻辑）的尝试顺序"""
+    names = []
+    for pattern in error_patterns or []:
+        fixes = pattern.get("fix")
+        for fix in fixes if isinstance(fixes, list) else [fixes]:
+            if isinstance(fix, dict) and fix.get("step_name"):
+                names.append(fix["step_name"])
+    return list(dict.fromkeys(names))
+
+def push_history_fixes(push_history):
+    """push_history.json 中 "Apply fix 'X'" / "Apply local fix 'X'" 形式的修复推送（只有修复名与时间，没有错误与运行结果）"""
+    applied = []
+    for message, entry in push_history.items() if isinstance(push_history, dict) else []:
+        match = re.search(r"Apply (?:local )?fix '(.+?)'", message)
+        if match and isinstance(entry, dict):
+            applied.append({"fix": match.group(1), "timestamp": entry.get("timestamp")})
+    return sorted(applied, key=lambda item: item["timestamp"] or "")
+
+def synthetic_episodes(order, seed=0, signatures=SYNTHETIC_SIGNATURES, episodes=SYNTHETIC_EPISODES):
+    """可复现的合成回放数据（同一 seed 结果相同）。
+
+    每个签名匹配 order 中 3~6 个修复（保持 order 中的顺序），其中随机一个真正有效（成功率 EFFECTIVE_RATE），
+    其余取该修复在所有签名上共享的基础成功率（多数很低）。每个回合按这些概率生成全部候选修复的结果，
+    结果表与尝试顺序无关，各策略在同一张表上比较。
+    """
+    rng = random.Random(seed)
+    base = {fix: rng.betavariate(0.5, 4) for fix in order}
+    worlds = []
+    for k in range(signatures):
+        fixes = sorted(rng.sample(order, rng.randint(3, min(6, len(order)))), key=order.index)
+        effective = rng.choice(fixes)
+        worlds.append((f"synthetic-{k}", {fix: EFFECTIVE_RATE if fix == effective else base[fix] for fix in fixes}))
+    replay = []
+    for _ in range(episodes):
+        signature, rates = rng.choice(worlds)
+        replay.append({"signature": signature, "outcomes": {fix: rng.random() < rate for fix, rate in rates.items()}})
+    return replay
+
+def evaluate(episodes, policy, seed=None, order=None):
+    """离线回放：按顺序逐个回合，策略只在该回合的候选修复中排序（结果表之外的修复结果未知），
+    依次尝试直到遇到成功的修复，统计需要的 CI 迭代次数；每个回合结束后只用试过的结果更新统计。
+    候选修复先按 order 排列（不在 order 中的排在最后），order 策略即按该顺序尝试。
+    """
+    scheduler = FixScheduler(None, policy=policy, seed=seed)
+    scheduler.stats = _empty_stats()
+    position = {fix: i for i, fix in enumerate(order or [])}
+    solved = []
+    runs = 0
+    for episode in episodes:
+        fixes = sorted(episode["outcomes"], key=lambda fix: position.get(fix, len(position)))
+        for n, fix in enumerate(_rank_signature(scheduler, episode["signature"], fixes), 1):
+            success = episode["outcomes"][fix]
+            scheduler._update(episode["signature"], fix, success)
+            runs += 1
+            if success:
+                solved.append(n)
+                break
+    return {
+        "policy": policy,
+        "episodes": len(episodes),
+        "solved": len(solved),
+        "runs": runs,
+        "mean_iterations": round(sum(solved) / len(solved), 3) if solved else None
+    }
+
+def _rank_signature(scheduler, signature, fixes):
+    totals = sum(arm["success"] + arm["failure"] for arm in scheduler.stats["arms"].get(signature, {}).values())
+    scored = [(scheduler.score(signature, fix, totals), fix) for fix in fixes]
+    return [fix for _, fix in sorted(scored, key=lambda item: -item[0])]
+
+def _report(episodes, order, trials):
+    for policy in POLICIES:
+        results = [evaluate(episodes, policy, seed=seed, order=order) for seed in range(trials if policy == "thompson" else 1)]
+        means = [r["mean_iterations"] for r in results if r["mean_iterations"] is not None]
+        mean = f"{sum(means) / len(means):.2f}" if means else "-"
+        runs = sum(r["runs"] for r in results) / len(results)
+        print(f"  {policy:9s} 解决 {results[0]['solved']}/{results[0]['episodes']} 个回合，"
+              f"平均需要 {mean} 次迭代，共 {runs:.0f} 次 CI 运行")
+
+def main():
+    parser = argparse.ArgumentParser(description="修复排序统计：查看各 (错误签名, 修复) 的成功率，或离线评估排序策略")
+    parser.add_argument("--history-file", default=os.path.join(project_root, "fix_history.json"), help="fix_history.json 路径")
+    parser.add_argument("--push-history-file", default=os.path.join(project_root, "push_history.json"), help="push_history.json 路径")
+    parser.add_argument("--stats-file", default=os.path.join(project_root, "fix_stats.json"), help="修复统计文件路径")
+    parser.add_argument("--evaluate", action="store_true", help="在历史记录与合成回放上离线评估各策略")
+    parser.add_argument("--trials", type=int, default=20, help="thompson 策略的随机重复次数")
+    parser.add_argument("--seed", type=int, default=0, help="合成回放的随机种子")
+    parser.add_argument("--episodes", type=int, default=SYNTHETIC_EPISODES, help="合成回放的回合数")
+    parser.add_argument("--signatures", type=int, default=SYNTHETIC_SIGNATURES, help="合成回放的错误签名数")
+    args = parser.parse_args()
+
+    if not args.evaluate:
+        scheduler = FixScheduler(args.stats_file, history_file=args.history_file)
+        print(f"[INFO] 待验证的修复 {len(scheduler.stats['pending'])} 个")
+        for signature, fix, success, failure in scheduler.summary(20):
+            print(f"  {success:3d}/{success + failure:<3d} {fix[:40]:40s} {signature[:80]}")
+        return
+
+    from autodebug.error_patterns import load_error_patterns
+    order = fix_order(load_error_patterns())
+    events = []
+    if os.path.exists(args.history_file):
+        with open(args.history_file, "r", encoding="utf-8") as f:
+            events = events_from_history(json.load(f))
+    episodes = episodes_from_events(events)
+    print(f"[INFO] fix_history.json 中共 {len(events)} 条修复结果，{len(episodes)} 个回合")
+    if os.path.exists(args.push_history_file):
+        with open(args.push_history_file, "r", encoding="utf-8") as f:
+            applied = push_history_fixes(json.load(f))
+        print(f"[INFO] push_history.json 中有 {len(applied)} 次修复推送，但没有记录错误信息和运行结果，无法用于评估")
+    if episodes:
+        print("[INFO] 历史回放（基准顺序为 error_patterns 的顺序）:")
+        _report(episodes, order, args.trials)
+    else:
+        print("[INFO] 没有可用于评估的历史修复结果")
+
+    replay = synthetic_episodes(order, args.seed, args.signatures, args.episodes)
+    print(f"[INFO] 合成回放（seed={args.seed}，{args.signatures} 个签名，{args.episodes} 个回合，"
+          f"候选修复 {len(order)} 个，基准顺序为 error_patterns 的顺序）:")
+    _report(replay, order, args.trials)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+# 动态添加项目根目录到 sys.path（支持直接运行脚本）
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from autodebug.log_template_miner import TemplateMiner, tokenize
+from autodebug.traceback_extractor import strip_timestamp
+
+STEP_PREFIX = "##[group]Run "
+# 差异区域起点之前保留的上下文行数
+CONTEXT_BEFORE = 3
+# 连续多少行与成功日志一致时认为差异区域结束
+SETTLE_LINES = 5
+MAX_REGION_LINES = 300
+# 行能套用成功日志模板的最低吻合比例（通配符位置视为吻合）
+BASELINE_FIT = 0.8
+
+def line_key(line):
+    """行模板的哈希：去掉时间戳、数字、路径等变量后比较，避免每次运行都不同的内容造成误差异"""
+    return hash(" ".join(tokenize(line)))
+
+def split_steps(lines):
+    """按 ##[group]Run 把日志切分为步骤，返回 [(步骤名, 起始行, 结束行)]；第一个步骤之前的内容记为 (setup)"""
+    steps = []
+    name = "(setup)"
+    start = 0
+    for i, line in enumerate(lines):
+        text = strip_timestamp(line)
+        if text.startswith(STEP_PREFIX):
+            if i > start:
+                steps.append((name, start, i))
+            name = text[len(STEP_PREFIX):].strip()
+            start = i
+    if len(lines) > start:
+        steps.append((name, start, len(lines)))
+    return steps
+
+class Baseline:
+    """成功日志中一段内容的行模板：先按模板哈希精确查找，找不到再按 Drain 模板相似度匹配（容忍镜像名、包名等小差异）"""
+
+    def __init__(self):
+        self.keys = set()
+        self.miner = TemplateMiner()
+
+    def add(self, line):
+        self.keys.add(line_key(line))
+        self.miner.add_line(line)
+
+    def __contains__(self, line):
+        return line_key(line) in self.keys or self.miner.match(line, BASELINE_FIT) is not None
+
+def _baselines(lines):
+    """成功日志中每个步骤的基准（同名步骤按出现次序区分），以及整份日志的基准"""
+    per_step = {}
+    whole = Baseline()
+    seen = {}
+    for name, start, end in split_steps(lines):
+        occurrence = seen.get(name, 0)
+        seen[name] = occurrence + 1
+        baseline = per_step[(name, occurrence)] = Baseline()
+        for line in lines[start:end]:
+            baseline.add(line)
+            whole.add(line)
+    return per_step, whole
+
+def _is_marker(line):
+    return strip_timestamp(line).startswith(("##[group]", "##[endgroup]"))
+
+def first_divergence(failing_lines, green_lines):
+    """定位失败日志中第一个与成功日志不一致的区域。
+
+    两份日志都按步骤切分，行按模板比较（O(n+m)）：同名步骤只与成功日志中对应步骤的行比较，
+    成功日志中没有的步骤（例如被修复改动过的步骤）与成功日志的全部行比较。返回区域信息，完全一致时返回 None。
+    """
+    green_steps, green_all = _baselines(green_lines)
+    seen = {}
+    for name, start, end in split_steps(failing_lines):
+        occurrence = seen.get(name, 0)
+        seen[name] = occurrence + 1
+        known = green_steps.get((name, occurrence), green_all)
+        for i in range(start, end):
+            if _is_marker(failing_lines[i]) or failing_lines[i] in known:
+                continue
+            region_end = _region_end(failing_lines, i, end, known)
+            region_start = max(start, i - CONTEXT_BEFORE)
+            return {
+                "step": name,
+                "step_matched": (name, occurrence) in green_steps,
+                "start": region_start,
+                "divergence": i,
+                "end": region_end,
+                "lines": failing_lines[region_start:region_end]
+            }
+    return None
+
+def _region_end(lines, divergence, step_end, known):
+    settled = 0
+    limit = min(step_end, divergence + MAX_REGION_LINES)
+    i = divergence + 1
+    while i < limit:
+        if lines[i] in known:
+            settled += 1
+            if settled >= SETTLE_LINES:
+                return i - settled + 1
+        else:
+            settled = 0
+        i += 1
+    return i
+
+def green_log_path(green_dir, workflow_file):
+    name = os.path.splitext(os.path.basename(workflow_file))[0]
+    return os.path.join(green_dir, f"{name}.txt"), os.path.join(green_dir, f"{name}.json")
+
+def save_green_log(green_dir, workflow_file, run_id, log_content):
+    """记录工作流最近一次成功运行的日志，作为之后失败日志的对比基准"""
+    if not log_content:
+        return False
+    log_path, meta_path = green_log_path(green_dir, workflow_file)
+    try:
+        os.makedirs(green_dir, exist_ok=True)
+        with open(log_path, "w", encoding="utf-8") as f:
+            f.write(log_content)
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump({"run_id": run_id, "saved_at": time.time()}, f)
+        print(f"[DEBUG] 已保存成功运行 {run_id} 的日志作为对比基准: {log_path}")
+        return True
+    except Exception as e:
+        print(f"[WARNING] 保存成功运行日志失败: {e}")
+        return False
+
+def load_green_log(green_dir, workflow_file):
+    """返回 (日志内容, run_id)，没有成功运行记录时返回 (None, None)"""
+    log_path, meta_path = green_log_path(green_dir, workflow_file)
+    if not os.path.exists(log_path):
+        return None, None
+    try:
+        with open(log_path, "r", encoding="utf-8", errors="replace") as f:
+            log_content = f.read()
+        run_id = None
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                run_id = json.load(f).get("run_id")
+        return log_content, run_id
+    except Exception as e:
+        print(f"[WARNING] 读取成功运行日志失败: {e}")
+        return None, None
+
+def localize_failure(log_content, workflow_file, config):
+    """与最近一次成功运行对比，返回 (用于错误提取的日志, 差异信息)。
+
+    没有成功日志或找不到差异时返回完整日志和 None。
+    """
+    green_dir = config.get("GREEN_LOG_DIR")
+    if not log_content or not green_dir:
+        return log_content, None
+    green_content, green_run_id = load_green_log(green_dir, workflow_file)
+    if not green_content:
+        print("[DEBUG] 没有成功运行的日志记录，使用完整日志分析")
+        return log_content, None
+    start = time.perf_counter()
+    failing_lines = log_content.splitlines()
+    region = first_divergence(failing_lines, green_content.splitlines())
+    elapsed = time.perf_counter() - start
+    if region is None:
+        print(f"[DEBUG] 与成功运行 {green_run_id} 的日志没有差异（{elapsed:.3f}s），使用完整日志分析")
+        return log_content, None
+    region["green_run_id"] = green_run_id
+    region["total_lines"] = len(failing_lines)
+    header = (f"# 与最近成功运行 {green_run_id} 对比的首个差异区域："
+              f"步骤 {region['step']}，行 {region['start'] + 1}-{region['end']}（共 {len(failing_lines)} 行）")
+    print(f"[DEBUG] {header[2:]}，耗时 {elapsed:.3f}s")
+    return "\n".join([header] + region["lines"]), region
+
+def main():
+    parser = argparse.ArgumentParser(description="对比失败日志与成功日志，输出首个差异区域")
+    parser.add_argument("failing_log", help="失败运行的日志文件")
+    parser.add_argument("green_log", help="成功运行的日志文件")
+    args = parser.parse_args()
+    with open(args.failing_log, "r", encoding="utf-8", errors="replace") as f:
+        failing_lines = f.read().splitlines()
+    with open(args.green_log, "r", encoding="utf-8", errors="replace") as f:
+        green_lines = f.read().splitlines()
+    start = time.perf_counter()
+    region = first_divergence(failing_lines, green_lines)
+    elapsed = time.perf_counter() - start
+    if region is None:
+        print(f"[INFO] 未发现差异（{elapsed:.3f}s）")
+        return
+    print(f"[INFO] 首个差异: 步骤 {region['step']}{'' if region['step_matched'] else '（成功日志中无此步骤）'}，"
+          f"行 {region['start'] + 1}-{region['end']} / {len(failing_lines)}（{elapsed:.3f}s）")
+    for line in region["lines"]:
+        print(f"  {strip_timestamp(line)[:160]}")
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,14 @@ import re
 import yaml
 from datetime import datetime
 from autodebug.error_patterns import load_error_patterns
+from autodebug.pattern_registry import get_pattern_registry
+from autodebug.traceback_extractor import extract_tracebacks, first_traceback
+from autodebug.log_template_miner import suggest_patterns
+
+# 每次解析最多记录的新错误模式候选数
+MAX_PATTERN_SUGGESTIONS = 20
+# config['new_error_patterns'] 最多保留的模式数
+MAX_NEW_ERROR_PATTERNS = 100
 
 def extract_context(log_content, error_line, context_lines=5):
     """提取错误行的前后上下文，增强特定错误的上下文提取"""
@@ -56,6 +64,7 @@ def parse_log_content(log_content, workflow_file, annotations_error, error_detai
     
     # 从 error_patterns.py 加载错误模式
     error_patterns = load_error_patterns()
+    pattern_registry = get_pattern_registry(error_patterns)
     
     # 处理日志编码，去除 BOM 标记
     try:
@@ -70,10 +79,10 @@ def parse_log_content(log_content, workflow_file, annotations_error, error_detai
         print(f"[ERROR] 日志内容分割失败: {e}")
         return [], [], [], [], [], error_patterns
 
-    current_error = []
-    current_context = []
-    in_traceback = False
-    error_start_line = 0
+    # 堆栈块由提取器一次扫描得到（按内容缓存），主循环按起始行号消费
+    tracebacks = {block["start"]: block for block in extract_tracebacks(log_content) if block["complete"]}
+    traceback_end = -1
+    first_pattern_line = None  # 第一条匹配 error_patterns 的行号（-1 表示没有），按需计算一次
     current_step = None
     warning_lines = []
     successful_steps_list = []
@@ -91,25 +100,46 @@ def parse_log_content(log_content, workflow_file, annotations_error, error_detai
             print(f"[DEBUG] 当前步骤: {current_step}")
             continue
 
-        # 优先提取堆栈跟踪（增强：支持更灵活的堆栈格式）
-        if "Traceback (most recent call last):" in line or (line.strip().startswith("File ") and ".py" in line and not in_traceback):
-            in_traceback = True
-            error_start_line = i
-            current_error.append(line)
-            current_context.append(line)
-            print(f"[DEBUG] 检测到堆栈跟踪（{'Traceback' if 'Traceback' in line else 'File 开头'}），起始行: {error_start_line}")
+        # 堆栈跟踪内部的行已随堆栈块一起处理
+        if i <= traceback_end:
             continue
 
-        # 处理堆栈跟踪内容
-        if in_traceback:
-            current_error.append(line)
-            current_context.append(line)
-            # 检查是否到达堆栈跟踪的末尾（以具体的错误类型开头，如 ValueError: 或 Error:）
-            if line.strip() and not line.startswith("  File") and (line.strip().startswith("ValueError:") or line.strip().startswith("Error:") or line.strip().startswith("Exception:")):
-                # 优先匹配 error_patterns 中的模式
-                error_message = "\n".join(current_error)
-                for pattern_info in error_patterns:
-                    pattern = pattern_info["pattern"]
+        # 优先提取堆栈跟踪（增强：支持更灵活的堆栈格式）
+        block = tracebacks.get(i)
+        if block is not None:
+            traceback_end = block["end"]
+            error_start_line = block["start"]
+            line = block["lines"][-1]
+            print(f"[DEBUG] 检测到堆栈跟踪（{'Traceback' if 'Traceback' in block['lines'][0] else 'File 开头'}），起始行: {error_start_line}，异常: {block['exception_type']}")
+            # 优先匹配 error_patterns 中的模式
+            error_message = block["text"]
+            if pattern_registry.first_match(error_message):
+                errors.append(error_message)
+                context = extract_context(log_content, line)
+                error_contexts.append({
+                    "error_line": error_message,
+                    "context": context,
+                    "step": current_step,
+                    "line_number": error_start_line,
+                    "type": "error"
+                })
+                print(f"[DEBUG] 匹配 error_patterns 提取堆栈错误: {error_message}")
+                print(f"[DEBUG] 错误上下文: {context}")
+                specific_error_found = True
+            # 如果未匹配到 error_patterns，则使用 specific_error_patterns
+            if not specific_error_found:
+                specific_error_patterns = [
+                    r"ValueError: read of closed file",  # 优先匹配具体错误
+                    r"ValueError:.*",
+                    r"Exception:.*",
+                    r"FileNotFoundError:.*",
+                    r"ModuleNotFoundError:.*",
+                    r"TimeoutError:.*",
+                    r"Connection refused",
+                    r"TypeError:.*",
+                    r"ImportError:.*"
+                ]
+                for pattern in specific_error_patterns:
                     if re.search(pattern, error_message, re.IGNORECASE):
                         errors.append(error_message)
                         context = extract_context(log_content, line)
@@ -120,48 +150,17 @@ def parse_log_content(log_content, workflow_file, annotations_error, error_detai
                             "line_number": error_start_line,
                             "type": "error"
                         })
-                        print(f"[DEBUG] 匹配 error_patterns 提取堆栈错误: {error_message}")
+                        print(f"[DEBUG] 提取具体堆栈错误: {error_message}")
                         print(f"[DEBUG] 错误上下文: {context}")
+                        # 动态添加 ValueError: read of closed file 到 new_error_patterns
+                        if "valueerror: read of closed file" in error_message.lower():
+                            new_pattern = r"ValueError: read of closed file"
+                            if new_pattern not in [p["pattern"] for p in error_patterns] and new_pattern not in new_error_patterns:
+                                new_error_patterns.append(new_pattern)
+                                print(f"[DEBUG] 动态添加错误模式: {new_pattern}")
+                                config['new_error_patterns'] = new_error_patterns
                         specific_error_found = True
                         break
-                # 如果未匹配到 error_patterns，则使用 specific_error_patterns
-                if not specific_error_found:
-                    specific_error_patterns = [
-                        r"ValueError: read of closed file",  # 优先匹配具体错误
-                        r"ValueError:.*",
-                        r"Exception:.*",
-                        r"FileNotFoundError:.*",
-                        r"ModuleNotFoundError:.*",
-                        r"TimeoutError:.*",
-                        r"Connection refused",
-                        r"TypeError:.*",
-                        r"ImportError:.*"
-                    ]
-                    for pattern in specific_error_patterns:
-                        if re.search(pattern, error_message, re.IGNORECASE):
-                            errors.append(error_message)
-                            context = extract_context(log_content, line)
-                            error_contexts.append({
-                                "error_line": error_message,
-                                "context": context,
-                                "step": current_step,
-                                "line_number": error_start_line,
-                                "type": "error"
-                            })
-                            print(f"[DEBUG] 提取具体堆栈错误: {error_message}")
-                            print(f"[DEBUG] 错误上下文: {context}")
-                            # 动态添加 ValueError: read of closed file 到 new_error_patterns
-                            if "valueerror: read of closed file" in error_message.lower():
-                                new_pattern = r"ValueError: read of closed file"
-                                if new_pattern not in [p["pattern"] for p in error_patterns] and new_pattern not in new_error_patterns:
-                                    new_error_patterns.append(new_pattern)
-                                    print(f"[DEBUG] 动态添加错误模式: {new_pattern}")
-                                    config['new_error_patterns'] = new_error_patterns
-                            specific_error_found = True
-                            break
-                in_traceback = False
-                current_error = []
-                current_context = []
             continue
 
         # 如果未找到堆栈跟踪，检查是否存在任何 ValueError（即使没有 Traceback）
@@ -190,23 +189,20 @@ def parse_log_content(log_content, workflow_file, annotations_error, error_detai
         # 提取所有错误相关信息（ERROR、WARNING、exit、failed）
         error_detected = False
         # 优先匹配 error_patterns 中的模式
-        for pattern_info in error_patterns:
-            pattern = pattern_info["pattern"]
-            if re.search(pattern, line, re.IGNORECASE):
-                errors.append(line.strip())
-                context = extract_context(log_content, line)
-                error_contexts.append({
-                    "error_line": line.strip(),
-                    "context": context,
-                    "step": current_step,
-                    "line_number": i,
-                    "type": "error"
-                })
-                print(f"[DEBUG] 匹配 error_patterns 检测到错误行 {i}: {line}")
-                print(f"[DEBUG] 错误上下文: {context}")
-                specific_error_found = True
-                error_detected = True
-                break
+        if pattern_registry.first_match(line):
+            errors.append(line.strip())
+            context = extract_context(log_content, line)
+            error_contexts.append({
+                "error_line": line.strip(),
+                "context": context,
+                "step": current_step,
+                "line_number": i,
+                "type": "error"
+            })
+            print(f"[DEBUG] 匹配 error_patterns 检测到错误行 {i}: {line}")
+            print(f"[DEBUG] 错误上下文: {context}")
+            specific_error_found = True
+            error_detected = True
 
         # 如果未匹配到 error_patterns，则使用 specific_error_patterns
         if not error_detected:
@@ -300,58 +296,45 @@ def parse_log_content(log_content, workflow_file, annotations_error, error_detai
             start_index = max(0, i - context_lines)
             end_index = min(len(log_lines), i + context_lines + 1)
             context = "\n".join(log_lines[start_index:end_index])
-            # 在整个日志中查找具体错误（如 ValueError）
+            # 在整个日志中查找具体错误（如 ValueError），全日志扫描只做一次
             specific_error = None
-            for j in range(len(log_lines)):
-                for pattern_info in error_patterns:
-                    pattern = pattern_info["pattern"]
-                    if re.search(pattern, log_lines[j], re.IGNORECASE):
-                        specific_error = log_lines[j].strip()
-                        errors.append(specific_error)
-                        error_contexts.append({
-                            "error_line": specific_error,
-                            "context": extract_context(log_content, specific_error),
-                            "step": current_step,
-                            "line_number": j,
-                            "type": "error"
-                        })
-                        print(f"[DEBUG] 在 'Failed to generate APK' 上下文中检测到具体错误: {specific_error}，行 {j}")
-                        specific_error_found = True
-                        break
-                if specific_error_found:
-                    break
+            if first_pattern_line is None:
+                first_pattern_line = next((j for j, log_line in enumerate(log_lines) if pattern_registry.first_match(log_line)), -1)
+            if first_pattern_line >= 0:
+                j = first_pattern_line
+                specific_error = log_lines[j].strip()
+                errors.append(specific_error)
+                error_contexts.append({
+                    "error_line": specific_error,
+                    "context": extract_context(log_content, specific_error),
+                    "step": current_step,
+                    "line_number": j,
+                    "type": "error"
+                })
+                print(f"[DEBUG] 在 'Failed to generate APK' 上下文中检测到具体错误: {specific_error}，行 {j}")
+                specific_error_found = True
             if not specific_error_found:
-                # 二次扫描，查找任何堆栈跟踪
-                traceback_found = False
-                for j in range(len(log_lines)):
-                    if "Traceback (most recent call last):" in log_lines[j] or (log_lines[j].strip().startswith("File ") and ".py" in log_lines[j]):
-                        traceback_lines = []
-                        k = j
-                        while k < len(log_lines) and not log_lines[k].startswith("Exception:") and not log_lines[k].startswith("ValueError:") and not log_lines[k].startswith("Error:"):
-                            traceback_lines.append(log_lines[k])
-                            k += 1
-                        if k < len(log_lines):
-                            traceback_lines.append(log_lines[k])
-                            error_message = "\n".join(traceback_lines)
-                            errors.append(error_message)
-                            error_contexts.append({
-                                "error_line": error_message,
-                                "context": extract_context(log_content, error_message),
-                                "step": current_step,
-                                "line_number": j,
-                                "type": "error"
-                            })
-                            print(f"[DEBUG] 二次扫描检测到堆栈错误: {error_message}，行 {j}")
-                            # 动态添加 ValueError: read of closed file 到 new_error_patterns
-                            if "valueerror: read of closed file" in error_message.lower():
-                                new_pattern = r"ValueError: read of closed file"
-                                if new_pattern not in [p["pattern"] for p in error_patterns] and new_pattern not in new_error_patterns:
-                                    new_error_patterns.append(new_pattern)
-                                    print(f"[DEBUG] 动态添加错误模式: {new_pattern}")
-                                    config['new_error_patterns'] = new_error_patterns
-                            specific_error_found = True
-                            traceback_found = True
-                            break
+                # 使用已提取的堆栈块，不再重新扫描整个日志
+                block = first_traceback(log_content)
+                if block is not None:
+                    error_message = block["text"]
+                    errors.append(error_message)
+                    error_contexts.append({
+                        "error_line": error_message,
+                        "context": extract_context(log_content, block["lines"][-1]),
+                        "step": current_step,
+                        "line_number": block["start"],
+                        "type": "error"
+                    })
+                    print(f"[DEBUG] 二次扫描检测到堆栈错误: {error_message}，行 {block['start']}")
+                    # 动态添加 ValueError: read of closed file 到 new_error_patterns
+                    if "valueerror: read of closed file" in error_message.lower():
+                        new_pattern = r"ValueError: read of closed file"
+                        if new_pattern not in [p["pattern"] for p in error_patterns] and new_pattern not in new_error_patterns:
+                            new_error_patterns.append(new_pattern)
+                            print(f"[DEBUG] 动态添加错误模式: {new_pattern}")
+                            config['new_error_patterns'] = new_error_patterns
+                    specific_error_found = True
             if not specific_error_found:
                 failed_messages.append(line.strip())
                 error_contexts.append({
@@ -390,69 +373,50 @@ def parse_log_content(log_content, workflow_file, annotations_error, error_detai
         })
         print(f"[DEBUG] 处理 annotations_error: {annotations_error}")
 
-    # 检测新错误模式并更新 config
-    for line in log_lines:
-        matched = False
-        for pattern_info in error_patterns:
-            pattern = pattern_info["pattern"]
-            if re.search(pattern, line, re.IGNORECASE):
-                matched = True
-                break
-        if not matched:
-            new_pattern = None
-            if "not found" in line.lower():
-                new_pattern = r"not found"
-            elif "failed to execute" in line.lower():
-                new_pattern = r"failed to execute"
-            elif "permission denied" in line.lower():
-                new_pattern = r"permission denied"
-            elif "failed: " in line.lower():
-                new_pattern = r"failed: "
-            elif "cannot " in line.lower():
-                new_pattern = r"cannot "
-            # 添加对 ValueError: read of closed file 的动态检测
-            elif "valueerror: read of closed file" in line.lower():
-                new_pattern = r"ValueError: read of closed file"
-            if new_pattern and new_pattern not in [p["pattern"] for p in error_patterns] and new_pattern not in new_error_patterns:
-                new_error_patterns.append(new_pattern)
-                print(f"[DEBUG] 检测到新错误模式: {new_pattern}")
-                config['new_error_patterns'] = new_error_patterns
+    # 检测新错误模式并更新 config：未被现有模式覆盖的行做模板挖掘，错误相关模板转换为紧凑的候选模式
+    known_patterns = {p["pattern"] for p in error_patterns}
+    suggestions = suggest_patterns(
+        log_lines,
+        known=lambda line: pattern_registry.first_match(line) is not None,
+        limit=MAX_PATTERN_SUGGESTIONS
+    )
+    for suggestion in suggestions:
+        new_pattern = suggestion["pattern"]
+        if new_pattern not in known_patterns and new_pattern not in new_error_patterns:
+            new_error_patterns.append(new_pattern)
+            print(f"[DEBUG] 检测到新错误模式: {new_pattern}（出现 {suggestion['count']} 次）")
+    # 跨多次运行累积时只保留最近的候选，避免列表无限增长
+    del new_error_patterns[:-MAX_NEW_ERROR_PATTERNS]
+    config['new_error_patterns'] = new_error_patterns
+    config['pattern_suggestions'] = suggestions
 
     # 提取隐式错误（例如未生成 APK），仅在未找到其他错误时添加
     if not specific_error_found:  # 只有在未提取到具体错误时才执行 inverse_check
-        for pattern_info in error_patterns:
+        for pattern_index, pattern_info in enumerate(error_patterns):
             pattern = pattern_info["pattern"]
             inverse_check = pattern_info.get("inverse_check", False)
             if inverse_check:
                 matched = False
                 for i, line in enumerate(log_lines):
-                    if re.search(pattern, line, re.IGNORECASE):
+                    if pattern_index in pattern_registry.candidates(line) and pattern_registry.search(pattern_index, line):
                         matched = True
                         print(f"[DEBUG] 匹配到隐式错误模式: {pattern}")
                         break
                 if not matched:
                     # 再次尝试提取具体错误，避免默认生成 "Failed to generate APK"
-                    for j in range(len(log_lines)):
-                        if "Traceback (most recent call last):" in log_lines[j] or (log_lines[j].strip().startswith("File ") and ".py" in log_lines[j]):
-                            traceback_lines = []
-                            k = j
-                            while k < len(log_lines) and not log_lines[k].startswith("Exception:") and not log_lines[k].startswith("ValueError:") and not log_lines[k].startswith("Error:"):
-                                traceback_lines.append(log_lines[k])
-                                k += 1
-                            if k < len(log_lines):
-                                traceback_lines.append(log_lines[k])
-                                error_message = "\n".join(traceback_lines)
-                                errors.append(error_message)
-                                error_contexts.append({
-                                    "error_line": error_message,
-                                    "context": extract_context(log_content, error_message),
-                                    "step": None,
-                                    "line_number": j,
-                                    "type": "error"
-                                })
-                                print(f"[DEBUG] 在 inverse_check 中提取到堆栈错误: {error_message}，行 {j}")
-                                specific_error_found = True
-                                break
+                    block = first_traceback(log_content)
+                    if block is not None:
+                        error_message = block["text"]
+                        errors.append(error_message)
+                        error_contexts.append({
+                            "error_line": error_message,
+                            "context": extract_context(log_content, block["lines"][-1]),
+                            "step": None,
+                            "line_number": block["start"],
+                            "type": "error"
+                        })
+                        print(f"[DEBUG] 在 inverse_check 中提取到堆栈错误: {error_message}，行 {block['start']}")
+                        specific_error_found = True
                     if not specific_error_found:
                         errors.append(f"Pattern not matched: {pattern}")
                         error_contexts.append({
@@ -471,16 +435,6 @@ def parse_log_content(log_content, workflow_file, annotations_error, error_detai
     print(f"[DEBUG] 提取的退出代码: {exit_codes}")
     print(f"[DEBUG] 错误上下文: {error_contexts}")
 
-    # 如果没有提取到错误，检查是否存在未定义的错误模式
-    if not errors:
-        print("[DEBUG] 未从日志中提取到错误，检查是否存在未定义的错误模式")
-        for line in log_lines:
-            if "error" in line.lower() or "failed" in line.lower() or "exception" in line.lower():
-                new_pattern = {"pattern": re.escape(line), "fix": []}
-                if new_pattern not in new_error_patterns:
-                    new_error_patterns.append(new_pattern)
-                    print(f"[DEBUG] 检测到未定义错误模式: {new_pattern}")
-
     return errors, error_contexts, exit_codes, new_error_patterns, warnings, error_patterns
 
 def extract_successful_steps(log_content, workflow_file):
@@ -0,0 +1,221 @@
+import argparse
+import json
+import os
+import re
+import sys
+
+# 动态添加项目根目录到 sys.path（支持直接运行脚本）
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from autodebug.traceback_extractor import strip_timestamp
+
+WILDCARD = "<*>"
+ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;]*[A-Za-z]")
+# 预先替换为通配符的变量片段：URL、路径、十六进制、带数字的词、进度条（含按 latin-1 解码后的乱码形式）
+MASKS = [
+    re.compile(r"(?:[\u2500-\u257f]|\u00e2[\u0094\u0095][\u0080-\u00bf])+"),
+    re.compile(r"https?://\S+"),
+    re.compile(r"(?:[\w.\-~]*/){2,}[\w.\-~]*"),
+    re.compile(r"\b0x[0-9a-fA-F]+\b"),
+    re.compile(r"\b[0-9a-fA-F]{8,}\b"),
+]
+# 只为包含这些关键词的模板生成候选错误模式
+ERROR_KEYWORDS = re.compile(r"\b(?:errors?|failed|failure|exception|cannot|not found|denied|fatal|refused)\b", re.IGNORECASE)
+# GitHub Actions 回显的步骤脚本（##[group]Run 及其后青色显示的脚本行）不是运行输出
+SCRIPT_ECHO = re.compile(r"^(?:##\[group\]Run |\x1b\[36;1m)")
+
+def clean_line(line):
+    """去掉时间戳与颜色控制符"""
+    return ANSI_ESCAPE.sub("", strip_timestamp(line)).strip()
+
+def tokenize(line):
+    """替换变量片段后按空白切分；含数字或变量片段的词整体视为通配符"""
+    line = clean_line(line)
+    for mask in MASKS:
+        line = mask.sub(WILDCARD, line)
+    return [WILDCARD if WILDCARD in token or any(ch.isdigit() for ch in token) else token for token in line.split()]
+
+class LogCluster:
+    def __init__(self, cluster_id, tokens, line_number, sample):
+        self.cluster_id = cluster_id
+        self.tokens = list(tokens)
+        self.size = 1
+        self.first_line = line_number
+        self.sample = sample
+
+    @property
+    def template(self):
+        return " ".join(self.tokens)
+
+    def similarity(self, tokens):
+        """相同位置上相同词的比例（模板中的通配符不计入），以及通配符个数"""
+        same = 0
+        wildcards = 0
+        for template_token, token in zip(self.tokens, tokens):
+            if template_token == WILDCARD:
+                wildcards += 1
+            elif template_token == token:
+                same += 1
+        return same / len(self.tokens), wildcards
+
+    def merge(self, tokens):
+        self.tokens = [t if t == token else WILDCARD for t, token in zip(self.tokens, tokens)]
+        self.size += 1
+
+class TemplateMiner:
+    """Drain 风格的在线日志模板挖掘：按词数和前几个词构成固定深度的解析树，叶子中按相似度归并为模板"""
+
+    def __init__(self, depth=4, similarity_threshold=0.5, max_children=100, max_clusters=5000):
+        self.prefix_depth = max(1, depth - 2)
+        self.similarity_threshold = similarity_threshold
+        self.max_children = max_children
+        self.max_clusters = max_clusters
+        self.root = {}
+        self.clusters = []
+        self.lines = 0
+
+    def add_line(self, line, line_number=None):
+        """把一行归入已有模板或新建模板，返回所属的 LogCluster（空行返回 None）"""
+        tokens = tokenize(line)
+        if not tokens:
+            return None
+        self.lines += 1
+        leaf = self._leaf(tokens)
+        best = None
+        best_key = None
+        for cluster in leaf:
+            score, wildcards = cluster.similarity(tokens)
+            if score >= self.similarity_threshold and (best_key is None or (score, wildcards) > best_key):
+                best, best_key = cluster, (score, wildcards)
+        if best is not None:
+            best.merge(tokens)
+            return best
+        if len(self.clusters) >= self.max_clusters:
+            return None
+        cluster = LogCluster(len(self.clusters), tokens, line_number if line_number is not None else self.lines - 1, line.strip())
+        self.clusters.append(cluster)
+        leaf.append(cluster)
+        return cluster
+
+    def match(self, line, threshold=None):
+        """只查找不归并：返回该行能套用的已有模板（通配符位置视为吻合，且至少一个字面词相同），没有时返回 None"""
+        tokens = tokenize(line)
+        if not tokens:
+            return None
+        threshold = self.similarity_threshold if threshold is None else threshold
+        node = self.root.get(len(tokens))
+        for token in tokens[:self.prefix_depth]:
+            if node is None:
+                return None
+            node = node.get(token, node.get(WILDCARD))
+        if node is None:
+            return None
+        best = None
+        best_score = 0
+        for cluster in node.get(None, ()):
+            score, wildcards = cluster.similarity(tokens)
+            fit = score + wildcards / len(tokens)
+            if score > 0 and fit >= threshold and fit > best_score:
+                best, best_score = cluster, fit
+        return best
+
+    def _leaf(self, tokens):
+        # 第一层按词数分组，之后逐层按前缀词分支；子节点过多时归入通配符分支
+        node = self.root.setdefault(len(tokens), {})
+        for token in tokens[:self.prefix_depth]:
+            if token not in node:
+                if WILDCARD in node or len(node) >= self.max_children:
+                    token = WILDCARD
+            node = node.setdefault(token, {})
+        return node.setdefault(None, [])
+
+    def add_lines(self, lines):
+        for i, line in enumerate(lines):
+            self.add_line(line, i)
+        return self
+
+    def templates(self, min_size=1):
+        return sorted((c for c in self.clusters if c.size >= min_size), key=lambda c: c.size, reverse=True)
+
+def template_to_pattern(template, max_tokens=8):
+    """把模板转换为紧凑的正则：去掉首尾通配符，字面词转义，通配符替换为 \\S+，最多保留 max_tokens 个词"""
+    tokens = template.split()
+    while tokens and tokens[0] == WILDCARD:
+        tokens.pop(0)
+    while tokens and tokens[-1] == WILDCARD:
+        tokens.pop()
+    tokens = tokens[:max_tokens]
+    while tokens and tokens[-1] == WILDCARD:
+        tokens.pop()
+    if not tokens:
+        return None
+    return r"\s+".join(r"\S+" if token == WILDCARD else re.escape(token) for token in tokens)
+
+def is_error_template(template):
+    return ERROR_KEYWORDS.search(template) is not None
+
+def suggest_patterns(lines, known=None, min_count=1, limit=20, miner=None):
+    """对日志行做模板挖掘，返回错误相关模板的候选模式：[{'pattern', 'template', 'count', 'sample', 'line_number'}]
+
+    known(line) 返回 True 的行（已被现有 error_patterns 覆盖）不参与挖掘
+    """
+    miner = miner or TemplateMiner()
+    for i, line in enumerate(lines):
+        if SCRIPT_ECHO.match(strip_timestamp(line)) or (known is not None and known(line)):
+            continue
+        miner.add_line(line, i)
+    suggestions = []
+    seen = set()
+    for cluster in miner.templates(min_count):
+        if not is_error_template(cluster.template):
+            continue
+        pattern = template_to_pattern(cluster.template)
+        if not pattern or pattern in seen or not re.search(pattern, clean_line(cluster.sample)):
+            continue
+        seen.add(pattern)
+        suggestions.append({
+            "pattern": pattern,
+            "template": cluster.template,
+            "count": cluster.size,
+            "sample": cluster.sample,
+            "line_number": cluster.first_line
+        })
+        if len(suggestions) >= limit:
+            break
+    return suggestions
+
+def main():
+    parser = argparse.ArgumentParser(description="从日志中挖掘错误模板，给出可加入 error_patterns.py 的候选模式")
+    parser.add_argument("logs", nargs="+", help="日志文件")
+    parser.add_argument("--min-count", type=int, default=1, help="模板最少出现次数")
+    parser.add_argument("--limit", type=int, default=30, help="最多输出的候选模式数")
+    parser.add_argument("--all", action="store_true", help="不过滤已被 error_patterns 覆盖的行")
+    parser.add_argument("--output", default=None, help="将候选模式写入 JSON 文件")
+    args = parser.parse_args()
+
+    known = None
+    if not args.all:
+        from autodebug.error_patterns import load_error_patterns
+        from autodebug.pattern_registry import get_pattern_registry
+        registry = get_pattern_registry(load_error_patterns())
+        known = lambda line: registry.first_match(line) is not None
+
+    miner = TemplateMiner()
+    lines = []
+    for log_file in args.logs:
+        with open(log_file, "r", encoding="utf-8", errors="replace") as f:
+            lines.extend(f.read().splitlines())
+    suggestions = suggest_patterns(lines, known=known, min_count=args.min_count, limit=args.limit, miner=miner)
+    print(f"[INFO] {miner.lines} 行日志归并为 {len(miner.clusters)} 个模板，错误相关候选模式 {len(suggestions)} 个:")
+    for item in suggestions:
+        print(f"  {item['count']:5d}  {item['pattern']}")
+        print(f"         例: {item['sample'][:120]}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(suggestions, f, indent=2, ensure_ascii=False)
+        print(f"[INFO] 候选模式已写入 {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,25 @@ from autodebug.fix_applier import analyze_and_fix
 from autodebug.history import load_processed_runs, save_processed_runs, load_fix_history, save_fix_history
 from autodebug.workflow_validator import validate_and_fix_debug_yml
 from autodebug.git_utils import push_changes
+from autodebug.workflow_document import WorkflowDocument
+from autodebug.log_differ import localize_failure, save_green_log
+from autodebug.step_timing import format_report, record_run
+from autodebug.fix_scheduler import FixScheduler
+from autodebug.speculative import GitHubRunReporter, SpeculativeRunner, candidate_workflows, pattern_fixes
+
+def parse_fix_step(step_yaml):
+    """解析修复步骤的 YAML 片段（形如 '- name: ...'），返回单个步骤字典"""
+    step = yaml.safe_load(step_yaml)
+    if isinstance(step, list):
+        step = step[0] if step else None
+    return step
+
+def flush_and_push(document, message, run_id, branch, config):
+    """推送前把工作流文档中记录的所有改动一次性写入 debug.yml；写入失败时不推送"""
+    if not document.flush():
+        print(f"[ERROR] debug.yml 写入失败，取消推送: {message}")
+        return False
+    return push_changes(message, run_id, branch, config)
 
 def main():
     """主函数，仅负责协调各个模块的调用"""
@@ -36,7 +55,8 @@ def main():
     last_push_time = 0  # 新增：记录上次推送时间
     push_interval = 600  # 新增：推送间隔，10分钟（600秒）
 
-    if not validate_and_fix_debug_yml(workflow_file_path):
+    document = WorkflowDocument(workflow_file_path)
+    if not validate_and_fix_debug_yml(workflow_file_path, document=document) or not document.flush():
         print("[ERROR] 无法修复 debug.yml，退出")
         return
 
@@ -68,19 +88,15 @@ def main():
 
         log_content, state, conclusion, annotations_error, has_critical_error, successful_steps, error_details, run_id, annotations = result
 
+        # 每次迭代只加载一次 debug.yml，修改在内存中完成，推送前统一写入
+        document = WorkflowDocument(workflow_file_path)
+
         print(f"[DEBUG] 工作流状态: {state}, 结果: {conclusion}")
 
         # 如果没有日志或没有运行，触发新运行
         if not log_content or not run_id:
             print("[DEBUG] 未找到工作流运行日志，触发新运行...")
-            with open(workflow_file_path, "r") as f:
-                workflow_content = yaml.safe_load(f)
-            steps = workflow_content["jobs"]["build"]["steps"]
-            step_exists = any(step.get("name") == "Initial Trigger Step" if isinstance(step, dict) else False for step in steps)
-            if not step_exists:
-                steps.append({"name": "Initial Trigger Step", "run": "echo 'Initial trigger to start a new workflow'"})
-                with open(workflow_file_path, "w") as f:
-                    yaml.safe_dump(workflow_content, f)
+            if document.add_step({"name": "Initial Trigger Step", "run": "echo 'Initial trigger to start a new workflow'"}):
                 print("[DEBUG] 已添加初始触发步骤: Initial Trigger Step")
             else:
                 print("[DEBUG] Initial Trigger Step 已存在，跳过添加")
@@ -89,7 +105,7 @@ def main():
             if current_time - last_push_time < push_interval:
                 print(f"[DEBUG] 推送频率过高，等待 {push_interval - (current_time - last_push_time)} 秒...")
                 time.sleep(push_interval - (current_time - last_push_time))
-            if not push_changes(f"AutoDebug: Trigger new run (iteration {iteration})", None, branch, config):
+            if not flush_and_push(document, f"AutoDebug: Trigger new run (iteration {iteration})", None, branch, config):
                 print("[ERROR] 推送初始触发更改失败，但已保存更改到本地，继续执行后续逻辑...")
             last_push_time = time.time()  # 更新推送时间
             iteration += 1
@@ -124,7 +140,7 @@ def main():
                 if current_time - last_push_time < push_interval:
                     print(f"[DEBUG] 推送频率过高，等待 {push_interval - (current_time - last_push_time)} 秒...")
                     time.sleep(push_interval - (current_time - last_push_time))
-                if not push_changes(f"AutoDebug: Push changes after successful fix for run {run_id}", run_id, branch, config):
+                if not flush_and_push(document, f"AutoDebug: Push changes after successful fix for run {run_id}", run_id, branch, config):
                     print("[ERROR] 推送失败，但已保存更改到本地，继续执行后续逻辑...")
                 last_push_time = time.time()  # 更新推送时间
                 break
@@ -152,24 +168,13 @@ def main():
                 {"name": "Clean Build Cache", "action": "add_step", "step": "- name: Clean Build Cache\n  run: rm -rf ~/.buildozer/cache && buildozer android clean"}
             ]
             for fix in additional_fixes:
-                with open(workflow_file_path, "r") as f:
-                    workflow_content = yaml.safe_load(f)
-                steps = workflow_content["jobs"]["build"]["steps"]
-                new_steps = []
-                for step in steps:
-                    if isinstance(step, dict) and step.get("name") == fix["name"]:
-                        continue
-                    new_steps.append(step)
-                new_steps.append(yaml.safe_load(fix["step"]))
-                workflow_content["jobs"]["build"]["steps"] = new_steps
-                with open(workflow_file_path, "w") as f:
-                    yaml.safe_dump(workflow_content, f)
+                document.add_step(parse_fix_step(fix["step"]), replace=True)
                 print(f"[DEBUG] 已重新应用通用修复: {fix['name']}")
                 current_time = time.time()
                 if current_time - last_push_time < push_interval:
                     print(f"[DEBUG] 推送频率过高，等待 {push_interval - (current_time - last_push_time)} 秒...")
                     time.sleep(push_interval - (current_time - last_push_time))
-                if not push_changes(f"AutoDebug: Apply fix '{fix['name']}' for run {run_id} (iteration {iteration})", run_id, branch, config):
+                if not flush_and_push(document, f"AutoDebug: Apply fix '{fix['name']}' for run {run_id} (iteration {iteration})", run_id, branch, config):
                     print("[ERROR] 推送失败，但已保存更改到本地，继续执行后续逻辑...")
                 last_push_time = time.time()  # 更新推送时间
                 break
@@ -181,9 +186,34 @@ def main():
             iteration += 1
             continue
 
+        # 记录各步骤耗时，标出最慢与明显变慢的步骤，供修复时兼顾构建时间
+        try:
+            _, timing_report = record_run(log_content, run_id, conclusion, config['STEP_TIMINGS_FILE'])
+            config['step_timing_report'] = format_report(timing_report)
+            print(f"[INFO] 运行 {run_id} 耗时分析:\n{config['step_timing_report']}")
+            for item in timing_report["regressions"]:
+                print(f"[WARNING] {item['name'][:80]} 耗时 {item['seconds']:.0f}s，明显慢于此前中位数 {item['baseline']:.0f}s")
+        except Exception as e:
+            print(f"[WARNING] 步骤耗时分析失败: {e}")
+
+        # 成功运行的日志作为基准；失败时只分析与基准首次出现差异的区域
+        analysis_log = log_content
+        config['divergent_region'] = None
+        if conclusion == "success":
+            save_green_log(config['GREEN_LOG_DIR'], workflow_file_path, run_id, log_content)
+        elif conclusion == "failure":
+            analysis_log, config['divergent_region'] = localize_failure(log_content, workflow_file_path, config)
+
         errors, error_contexts, exit_codes, new_error_patterns, warnings, error_patterns = parse_log_content(
-            log_content, workflow_file_path, annotations_error, error_details, successful_steps, config
+            analysis_log, workflow_file_path, annotations_error, error_details, successful_steps, config
         )
+        if not errors and analysis_log is not log_content:
+            print("[DEBUG] 差异区域中未提取到错误，改为分析完整日志")
+            analysis_log = log_content
+            config['divergent_region'] = None
+            errors, error_contexts, exit_codes, new_error_patterns, warnings, error_patterns = parse_log_content(
+                log_content, workflow_file_path, annotations_error, error_details, successful_steps, config
+            )
 
         if not errors and not annotations_error:
             errors = ["No errors extracted from log"]
@@ -192,6 +222,11 @@ def main():
         else:
             default_error_count = 0
 
+        # 用本次运行的结果验证此前应用的修复，更新修复排序统计
+        scheduler = FixScheduler(config['FIX_STATS_FILE'], config['FIX_POLICY'], history_file=fix_history_file)
+        for signature, fix_name, fixed in scheduler.resolve(run_id, conclusion, errors + ([annotations_error] if annotations_error else [])):
+            print(f"[DEBUG] 修复 '{fix_name}' {'已解决' if fixed else '未解决'}错误: {signature[:80]}")
+
         # 如果工作流失败但未生成 APK，即使未提取到错误，也触发修复逻辑
         if conclusion == "failure" and not apk_generated:
             apk_failure_count += 1
@@ -212,8 +247,8 @@ def main():
                 # 尝试 DeepSeek API 修复
                 success = analyze_and_fix(
                     workflow_file_path, errors, error_patterns, lambda msg, run_id, branch: push_changes(msg, run_id, branch, config),
-                    iteration, branch, fix_history_file, last_run_id, job_id, annotations_error, error_contexts, successful_steps, config, log_content,
-                    additional_fixes=additional_fixes
+                    iteration, branch, fix_history_file, last_run_id, job_id, annotations_error, error_contexts, successful_steps, config, analysis_log,
+                    additional_fixes=additional_fixes, document=document
                 )
                 if success:
                     print("[DEBUG] DeepSeek API 或本地修复成功，推送新 debug.yml...")
@@ -221,27 +256,20 @@ def main():
                     if current_time - last_push_time < push_interval:
                         print(f"[DEBUG] 推送频率过高，等待 {push_interval - (current_time - last_push_time)} 秒...")
                         time.sleep(push_interval - (current_time - last_push_time))
-                    if not push_changes("AutoDebug: Apply fix for APK generation", None, branch, config):
+                    if not flush_and_push(document, "AutoDebug: Apply fix for APK generation", None, branch, config):
                         print("[ERROR] 推送修复失败，但已保存更改到本地，继续执行后续逻辑...")
                     last_push_time = time.time()  # 更新推送时间
                 else:
                     print("[DEBUG] DeepSeek API 修复失败，尝试本地网络修复...")
                     local_fix_applied = False
                     for fix in additional_fixes:
-                        with open(workflow_file_path, "r") as f:
-                            workflow_content = yaml.safe_load(f)
-                        steps = workflow_content["jobs"]["build"]["steps"]
-                        if not any(step.get("name") == fix["name"] for step in steps if isinstance(step, dict)):
-                            steps.append(yaml.safe_load(fix["step"]))
-                            workflow_content["jobs"]["build"]["steps"] = steps
-                            with open(workflow_file_path, "w") as f:
-                                yaml.safe_dump(workflow_content, f)
+                        if document.add_step(parse_fix_step(fix["step"])):
                             print(f"[DEBUG] 已应用本地修复: {fix['name']}")
                             current_time = time.time()
                             if current_time - last_push_time < push_interval:
                                 print(f"[DEBUG] 推送频率过高，等待 {push_interval - (current_time - last_push_time)} 秒...")
                                 time.sleep(push_interval - (current_time - last_push_time))
-                            if push_changes(f"AutoDebug: Apply local fix '{fix['name']}' for run {run_id} (iteration {iteration})", run_id, branch, config):
+                            if flush_and_push(document, f"AutoDebug: Apply local fix '{fix['name']}' for run {run_id} (iteration {iteration})", run_id, branch, config):
                                 local_fix_applied = True
                                 last_push_time = time.time()  # 更新推送时间
                                 break
@@ -413,14 +441,13 @@ fi"""
                                 }
                             }
                         }
-                        with open(workflow_file_path, "w") as f:
-                            yaml.safe_dump(complete_workflow, f, sort_keys=False, indent=2, allow_unicode=True)
+                        document.replace(complete_workflow, reason="complete_workflow")
                         print("[DEBUG] 已更新本地 debug.yml 文件")
                         current_time = time.time()
                         if current_time - last_push_time < push_interval:
                             print(f"[DEBUG] 推送频率过高，等待 {push_interval - (current_time - last_push_time)} 秒...")
                             time.sleep(push_interval - (current_time - last_push_time))
-                        if not push_changes("AutoDebug: Force push complete debug.yml to resolve startup_failure or APK failure", None, branch, config):
+                        if not flush_and_push(document, "AutoDebug: Force push complete debug.yml to resolve startup_failure or APK failure", None, branch, config):
                             print("[ERROR] 推送完整 debug.yml 失败，但已保存到本地，继续执行后续逻辑...")
                         last_push_time = time.time()  # 更新推送时间
                         fix_history["untried_errors"] = []
@@ -435,14 +462,14 @@ fi"""
             if current_time - last_push_time < push_interval:
                 print(f"[DEBUG] 推送频率过高，等待 {push_interval - (current_time - last_push_time)} 秒...")
                 time.sleep(push_interval - (current_time - last_push_time))
-            if not push_changes(f"AutoDebug: Trigger new run after non-failure (iteration {iteration})", run_id, branch, config):
+            if not flush_and_push(document, f"AutoDebug: Trigger new run after non-failure (iteration {iteration})", run_id, branch, config):
                 print("[ERROR] 推送失败，但已保存更改到本地，继续执行后续逻辑...")
             last_push_time = time.time()  # 更新推送时间
             iteration += 1
             continue
 
         errors, error_contexts, exit_codes, new_error_patterns, warnings, error_patterns = parse_log_content(
-            log_content, workflow_file_path, annotations_error, error_details, successful_steps, config
+            analysis_log, workflow_file_path, annotations_error, error_details, successful_steps, config
         )
 
         if not errors and not annotations_error:
@@ -489,14 +516,46 @@ fi"""
             {"name": "Update Package Index", "action": "add_step", "step": "- name: Update Package Index\n  run: sudo apt-get update --allow-insecure-repositories"}
         ]
 
+        # 推测执行：把 top-K 候选修复推送到各自的 scratch 分支同时验证，第一个成功的快进到主分支
+        speculative_k = config.get('SPECULATIVE_FIXES', 0)
+        if speculative_k >= 2:
+            # 候选按历史成功率排序后取前 K 个，各候选的运行结果计入修复排序统计
+            candidates = candidate_workflows(
+                document.snapshot(),
+                scheduler.rank(errors, pattern_fixes(errors, error_patterns) + [fix for fix in additional_fixes if fix["action"] == "add_step"],
+                               key=lambda fix: fix["name"]),
+                speculative_k
+            )
+            if len(candidates) >= 2:
+                runner = SpeculativeRunner(project_root, workflow_file_path, branch,
+                                           GitHubRunReporter(repo, github_token, os.path.basename(workflow_file_path)))
+                outcome = runner.run(candidates, tag=f"{run_id}-{iteration}")
+                scheduler.record(errors, [(candidate["name"], state == "success")
+                                          for candidate, state in zip(candidates, outcome["states"]) if state in ("success", "failure")])
+                if outcome["winner"] is not None:
+                    fix_history.setdefault("speculative", []).append({
+                        "run_id": run_id,
+                        "winner": outcome["winner"]["name"],
+                        "sha": outcome["sha"],
+                        "results": outcome["results"]
+                    })
+                    processed_runs[run_id]["success"] = True
+                    last_push_time = time.time()  # 快进推送也计入推送频率
+                    save_processed_runs(processed_runs, processed_runs_file)
+                    save_fix_history(fix_history, fix_history_file)
+                    break
+                print("[INFO] 推测执行没有找到成功的候选修复，回退到逐个修复")
+            else:
+                print(f"[DEBUG] 可推测执行的候选修复不足 2 个（{len(candidates)} 个），按顺序修复")
+
         all_fixed = True
         for error in errors:
             try:
                 print(f"[DEBUG] 正在分析和修复错误: {error}")
                 fixed = analyze_and_fix(
                     workflow_file_path, [error], error_patterns, lambda msg, run_id, branch: push_changes(msg, run_id, branch, config),
-                    iteration, branch, fix_history_file, run_id, job_id, annotations_error, error_contexts, successful_steps, config, log_content,
-                    additional_fixes=additional_fixes
+                    iteration, branch, fix_history_file, run_id, job_id, annotations_error, error_contexts, successful_steps, config, analysis_log,
+                    additional_fixes=additional_fixes, document=document
                 )
                 print(f"[DEBUG] 修复结果: {'成功' if fixed else '失败'}")
                 if not fixed:
@@ -512,24 +571,13 @@ fi"""
                             print(f"[DEBUG] 默认错误处理次数达到上限 ({DEFAULT_ERROR_LIMIT})，强制应用通用修复")
                             for fix in additional_fixes:
                                 if fix["name"] == "Check Network Connectivity":
-                                    with open(workflow_file_path, "r") as f:
-                                        workflow_content = yaml.safe_load(f)
-                                    steps = workflow_content["jobs"]["build"]["steps"]
-                                    new_steps = []
-                                    for step in steps:
-                                        if isinstance(step, dict) and step.get("name") == fix["name"]:
-                                            continue
-                                        new_steps.append(step)
-                                    new_steps.append(yaml.safe_load(fix["step"]))
-                                    workflow_content["jobs"]["build"]["steps"] = new_steps
-                                    with open(workflow_file_path, "w") as f:
-                                        yaml.safe_dump(workflow_content, f)
+                                    document.add_step(parse_fix_step(fix["step"]), replace=True)
                                     print(f"[DEBUG] 已重新应用通用修复: {fix['name']}")
                                     current_time = time.time()
                                     if current_time - last_push_time < push_interval:
                                         print(f"[DEBUG] 推送频率过高，等待 {push_interval - (current_time - last_push_time)} 秒...")
                                         time.sleep(push_interval - (current_time - last_push_time))
-                                    if not push_changes(f"AutoDebug: Apply fix '{fix['name']}' for run {run_id} (iteration {iteration})", run_id, branch, config):
+                                    if not flush_and_push(document, f"AutoDebug: Apply fix '{fix['name']}' for run {run_id} (iteration {iteration})", run_id, branch, config):
                                         print("[ERROR] 推送失败，但已保存更改到本地，继续执行后续逻辑...")
                                     last_push_time = time.time()  # 更新推送时间
                                     all_fixed = True
@@ -539,21 +587,13 @@ fi"""
                                     print(f"[DEBUG] Check Network Connectivity 已存在，尝试其他修复")
                                     for alt_fix in additional_fixes:
                                         if alt_fix["name"] == "Clean Build Cache":
-                                            new_steps = []
-                                            for step in steps:
-                                                if isinstance(step, dict) and step.get("name") == alt_fix["name"]:
-                                                    continue
-                                                new_steps.append(step)
-                                            new_steps.append(yaml.safe_load(alt_fix["step"]))
-                                            workflow_content["jobs"]["build"]["steps"] = new_steps
-                                            with open(workflow_file_path, "w") as f:
-                                                yaml.safe_dump(workflow_content, f)
+                                            document.add_step(parse_fix_step(alt_fix["step"]), replace=True)
                                             print(f"[DEBUG] 已重新应用通用修复: {alt_fix['name']}")
                                             current_time = time.time()
                                             if current_time - last_push_time < push_interval:
                                                 print(f"[DEBUG] 推送频率过高，等待 {push_interval - (current_time - last_push_time)} 秒...")
                                                 time.sleep(push_interval - (current_time - last_push_time))
-                                            if not push_changes(f"AutoDebug: Apply fix '{alt_fix['name']}' for run {run_id} (iteration {iteration})", run_id, branch, config):
+                                            if not flush_and_push(document, f"AutoDebug: Apply fix '{alt_fix['name']}' for run {run_id} (iteration {iteration})", run_id, branch, config):
                                                 print("[ERROR] 推送失败，但已保存更改到本地，继续执行后续逻辑...")
                                             last_push_time = time.time()  # 更新推送时间
                                             all_fixed = True
@@ -579,7 +619,7 @@ fi"""
             if current_time - last_push_time < push_interval:
                 print(f"[DEBUG] 推送频率过高，等待 {push_interval - (current_time - last_push_time)} 秒...")
                 time.sleep(push_interval - (current_time - last_push_time))
-            if not push_changes(f"AutoDebug: Push changes after successful fix for run {run_id} (iteration {iteration})", run_id, branch, config):
+            if not flush_and_push(document, f"AutoDebug: Push changes after successful fix for run {run_id} (iteration {iteration})", run_id, branch, config):
                 print("[ERROR] 推送失败，但已保存更改到本地，继续执行后续逻辑...")
             last_push_time = time.time()  # 更新推送时间
             processed_runs[run_id]["success"] = True
@@ -589,7 +629,7 @@ fi"""
             if current_time - last_push_time < push_interval:
                 print(f"[DEBUG] 推送频率过高，等待 {push_interval - (current_time - last_push_time)} 秒...")
                 time.sleep(push_interval - (current_time - last_push_time))
-            if not push_changes(f"AutoDebug: Push changes after partial fix for run {run_id} (iteration {iteration})", run_id, branch, config):
+            if not flush_and_push(document, f"AutoDebug: Push changes after partial fix for run {run_id} (iteration {iteration})", run_id, branch, config):
                 print("[ERROR] 推送失败，但已保存更改到本地，继续执行后续逻辑...")
             last_push_time = time.time()  # 更新推送时间
         save_processed_runs(processed_runs, processed_runs_file)
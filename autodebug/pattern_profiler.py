@@ -0,0 +1,166 @@
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+import time
+
+# 动态添加项目根目录到 sys.path（支持直接运行脚本）
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from autodebug.error_patterns import load_error_patterns
+from autodebug.pattern_registry import extract_required_literals
+
+TIMESTAMP_PREFIX = re.compile(r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d+Z ")
+# 距离 ##[error] 超过该行数且不在失败步骤内的匹配视为误报
+ERROR_PROXIMITY = 50
+# 命中超过该比例日志行的模式视为“兜底”模式
+CATCH_ALL_RATE = 0.02
+# 误报率超过该值（且命中数足够）的模式需要关注
+FALSE_POSITIVE_RATE = 0.8
+MIN_MATCHES_FOR_RATE = 10
+# 单个模式占总耗时的比例超过该值视为热点
+HOT_SHARE = 0.1
+
+def load_log_lines(log_file):
+    """读取日志文件，返回去掉时间戳前缀的行"""
+    with open(log_file, "r", encoding="utf-8", errors="replace") as f:
+        return [TIMESTAMP_PREFIX.sub("", line) for line in f.read().splitlines()]
+
+def label_lines(lines):
+    """为每一行标注是否属于失败步骤，以及与最近 ##[error] 行的距离"""
+    error_lines = [i for i, line in enumerate(lines) if line.startswith("##[error]")]
+    # 步骤以 "##[group]Run " 开始，到下一个步骤开始为止；包含 ##[error] 的步骤视为失败步骤
+    step_starts = [i for i, line in enumerate(lines) if line.startswith("##[group]Run ")]
+    boundaries = step_starts + [len(lines)]
+    in_failed_step = [False] * len(lines)
+    for start, end in zip(boundaries, boundaries[1:]):
+        if any(start <= e < end for e in error_lines):
+            for i in range(start, end):
+                in_failed_step[i] = True
+
+    error_set = set(error_lines)
+    distance = [len(lines)] * len(lines)
+    last = None
+    for i in range(len(lines)):
+        if i in error_set:
+            last = i
+        if last is not None:
+            distance[i] = i - last
+    last = None
+    for i in range(len(lines) - 1, -1, -1):
+        if i in error_set:
+            last = i
+        if last is not None:
+            distance[i] = min(distance[i], last - i)
+    return in_failed_step, distance
+
+def pattern_flags(pattern, row, total_lines, total_time):
+    """根据模式文本与统计数据给出问题标记"""
+    flags = []
+    if pattern.startswith(".*"):
+        flags.append("leading_wildcard")
+    if pattern.endswith(".*") and not pattern.endswith("\\.*"):
+        flags.append("trailing_wildcard")
+    if row["literals"] is None:
+        flags.append("no_literal_prefilter")
+    if total_lines and row["matches"] / total_lines > CATCH_ALL_RATE:
+        flags.append("catch_all")
+    if row["matches"] >= MIN_MATCHES_FOR_RATE and row["false_positive_rate"] > FALSE_POSITIVE_RATE:
+        flags.append("high_false_positive")
+    if total_time and row["time_ms"] / (total_time * 1000) > HOT_SHARE:
+        flags.append("hot")
+    if row["matches"] == 0:
+        flags.append("never_matched")
+    return flags
+
+def profile_patterns(log_files, error_patterns=None):
+    """对每个错误模式在所有日志行上计时运行，统计命中数与误报率，返回按耗时排序的报告"""
+    error_patterns = error_patterns or load_error_patterns()
+    rows = []
+    for pattern_info in error_patterns:
+        pattern = pattern_info["pattern"]
+        rows.append({
+            "pattern": pattern,
+            "literals": extract_required_literals(pattern),
+            "compiled": re.compile(pattern, re.IGNORECASE),
+            "time": 0.0,
+            "matches": 0,
+            "false_positives": 0,
+            "examples": []
+        })
+
+    total_lines = 0
+    for log_file in log_files:
+        lines = load_log_lines(log_file)
+        in_failed_step, distance = label_lines(lines)
+        total_lines += len(lines)
+        print(f"[DEBUG] 分析日志 {log_file}，共 {len(lines)} 行")
+        for row in rows:
+            search = row["compiled"].search
+            start = time.perf_counter()
+            hits = [i for i, line in enumerate(lines) if search(line)]
+            row["time"] += time.perf_counter() - start
+            row["matches"] += len(hits)
+            for i in hits:
+                if not in_failed_step[i] and distance[i] > ERROR_PROXIMITY:
+                    row["false_positives"] += 1
+                    if len(row["examples"]) < 3:
+                        row["examples"].append(lines[i][:200])
+
+    total_time = sum(row["time"] for row in rows)
+    report = []
+    for row in rows:
+        entry = {
+            "pattern": row["pattern"],
+            "literals": row["literals"],
+            "time_ms": round(row["time"] * 1000, 3),
+            "time_share": round(row["time"] / total_time, 4) if total_time else 0.0,
+            "matches": row["matches"],
+            "false_positives": row["false_positives"],
+            "false_positive_rate": round(row["false_positives"] / row["matches"], 4) if row["matches"] else 0.0,
+            "false_positive_examples": row["examples"]
+        }
+        entry["flags"] = pattern_flags(row["pattern"], entry, total_lines, total_time)
+        report.append(entry)
+    report.sort(key=lambda entry: entry["time_ms"], reverse=True)
+    for rank, entry in enumerate(report, 1):
+        entry["rank"] = rank
+    return {
+        "log_files": [os.path.basename(f) for f in log_files],
+        "total_lines": total_lines,
+        "total_time_ms": round(total_time * 1000, 3),
+        "flagged": [entry["pattern"] for entry in report if {"leading_wildcard", "catch_all", "high_false_positive", "hot"} & set(entry["flags"])],
+        "patterns": report
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="分析错误模式在已记录日志上的耗时、命中数与误报率")
+    parser.add_argument("--logs", default=os.path.join(project_root, "logs"), help="日志目录（默认 logs/）")
+    parser.add_argument("--output", default=None, help="报告输出路径（默认 <logs>/pattern_profile.json）")
+    parser.add_argument("--top", type=int, default=10, help="在终端打印耗时最高的前 N 个模式")
+    args = parser.parse_args(argv)
+
+    log_files = sorted(glob.glob(os.path.join(args.logs, "run_*_job_*.txt")))
+    if not log_files:
+        print(f"[ERROR] 在 {args.logs} 中未找到日志文件（run_*_job_*.txt）")
+        return 1
+    report = profile_patterns(log_files)
+    output = args.output or os.path.join(args.logs, "pattern_profile.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"[DEBUG] 模式分析报告已保存到: {output}")
+
+    print(f"[INFO] 共 {len(log_files)} 个日志，{report['total_lines']} 行，模式匹配总耗时 {report['total_time_ms']} ms")
+    for entry in report["patterns"][:args.top]:
+        print(f"[INFO] #{entry['rank']} {entry['pattern']}: {entry['time_ms']} ms ({entry['time_share']:.1%})，"
+              f"命中 {entry['matches']}，误报率 {entry['false_positive_rate']:.0%}，标记 {entry['flags']}")
+    if report["flagged"]:
+        print(f"[WARNING] 需要关注的模式: {report['flagged']}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
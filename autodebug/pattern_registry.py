@@ -0,0 +1,215 @@
+import re
+import time
+
+try:
+    import re._parser as sre_parse  # Python 3.11+
+    import re._constants as sre_constants
+except ImportError:  # Python 3.10 及以下
+    import sre_parse
+    import sre_constants
+
+# 必需字面量的最小长度，过短的字面量几乎每行都会命中，预过滤失去意义
+MIN_LITERAL_LENGTH = 3
+
+def _literal_runs(parsed):
+    """返回解析序列中所有连续字面量片段（小写）"""
+    runs = []
+    current = []
+    for op, av in parsed:
+        if op == sre_constants.LITERAL:
+            current.append(chr(av))
+            continue
+        if current:
+            runs.append("".join(current).lower())
+            current = []
+        if op == sre_constants.SUBPATTERN:
+            # 非分支的分组可以向下继续寻找字面量（分组前后的字面量不连续）
+            sub = av[-1]
+            if not any(sub_op == sre_constants.BRANCH for sub_op, _ in sub):
+                runs.extend(_literal_runs(sub))
+        elif op == sre_constants.MAX_REPEAT or op == sre_constants.MIN_REPEAT:
+            # 至少出现一次的重复，其内部字面量同样是必需的
+            min_count, _, sub = av
+            if min_count >= 1:
+                runs.extend(_literal_runs(sub))
+    if current:
+        runs.append("".join(current).lower())
+    return runs
+
+def extract_required_literals(pattern):
+    """提取模式的必需字面量：返回一组候选字面量（命中任一即需运行正则），无可用字面量时返回 None"""
+    try:
+        parsed = sre_parse.parse(pattern)
+    except Exception as e:
+        print(f"[WARNING] 无法解析错误模式 '{pattern}': {e}")
+        return None
+    items = list(parsed)
+    # 顶层分支（a|b）：每个分支都必须提供字面量，任一分支的字面量命中即为候选
+    if len(items) == 1 and items[0][0] == sre_constants.BRANCH:
+        literals = []
+        for branch in items[0][1][1]:
+            runs = [run for run in _literal_runs(branch) if len(run) >= MIN_LITERAL_LENGTH]
+            if not runs:
+                return None
+            literals.append(max(runs, key=len))
+        return literals
+    runs = [run for run in _literal_runs(items) if len(run) >= MIN_LITERAL_LENGTH]
+    if not runs:
+        return None
+    return [max(runs, key=len)]
+
+class AhoCorasick:
+    """纯 Python 的 Aho-Corasick 自动机，一次扫描找出文本中出现的所有关键字"""
+
+    def __init__(self, keywords):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [set()]
+        for keyword in keywords:
+            self._insert(keyword)
+        self._build()
+
+    def _insert(self, keyword):
+        node = 0
+        for char in keyword:
+            if char not in self.goto[node]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(set())
+                self.goto[node][char] = len(self.goto) - 1
+            node = self.goto[node][char]
+        self.output[node].add(keyword)
+
+    def _build(self):
+        queue = list(self.goto[0].values())
+        head = 0
+        while head < len(queue):
+            node = queue[head]
+            head += 1
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                fallback = self.fail[node]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.output[child] |= self.output[self.fail[child]]
+
+    def search(self, text):
+        """返回文本中出现的关键字集合"""
+        found = set()
+        node = 0
+        goto = self.goto
+        fail = self.fail
+        output = self.output
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if output[node]:
+                found |= output[node]
+        return found
+
+class PatternRegistry:
+    """错误模式注册表：提取必需字面量并构建 Aho-Corasick 预过滤，只在包含候选字面量的文本上运行完整正则"""
+
+    def __init__(self, error_patterns):
+        self.patterns = list(error_patterns)
+        self.compiled = []
+        self.literals = []
+        self.always = []  # 没有可用字面量、必须始终运行的模式
+        literal_owners = {}
+        for i, pattern_info in enumerate(self.patterns):
+            pattern = pattern_info["pattern"]
+            try:
+                self.compiled.append(re.compile(pattern, re.IGNORECASE))
+            except re.error as e:
+                print(f"[WARNING] 错误模式 '{pattern}' 编译失败，已忽略: {e}")
+                self.compiled.append(None)
+                self.literals.append(None)
+                continue
+            literals = extract_required_literals(pattern)
+            self.literals.append(literals)
+            if not literals:
+                self.always.append(i)
+                continue
+            for literal in literals:
+                literal_owners.setdefault(literal, set()).add(i)
+        self.literal_owners = literal_owners
+        self.automaton = AhoCorasick(literal_owners.keys())
+        self.hits = [0] * len(self.patterns)
+        self.evaluations = [0] * len(self.patterns)
+        self.cost = [0.0] * len(self.patterns)
+        self.prefilter_skips = 0
+        print(f"[DEBUG] 错误模式注册表: {len(self.patterns)} 个模式，{len(literal_owners)} 个字面量，{len(self.always)} 个模式无字面量需始终匹配")
+
+    def candidates(self, text):
+        """返回可能匹配文本的模式下标（按原列表顺序）"""
+        found = set(self.always)
+        for literal in self.automaton.search(text.lower()):
+            found |= self.literal_owners[literal]
+        self.prefilter_skips += len(self.patterns) - len(found)
+        return sorted(found)
+
+    def search(self, index, text):
+        """对单个模式运行完整正则并记录命中次数与耗时"""
+        compiled = self.compiled[index]
+        if compiled is None:
+            return None
+        start = time.perf_counter()
+        match = compiled.search(text)
+        self.cost[index] += time.perf_counter() - start
+        self.evaluations[index] += 1
+        if match:
+            self.hits[index] += 1
+        return match
+
+    def first_match(self, text):
+        """按原列表顺序返回第一个匹配的模式 (下标, pattern_info, match)，未匹配返回 None"""
+        for index in self.candidates(text):
+            match = self.search(index, text)
+            if match:
+                return index, self.patterns[index], match
+        return None
+
+    def all_matches(self, text):
+        """返回所有匹配的模式 [(下标, pattern_info, match)]"""
+        results = []
+        for index in self.candidates(text):
+            match = self.search(index, text)
+            if match:
+                results.append((index, self.patterns[index], match))
+        return results
+
+    def stats(self):
+        """返回每个模式的命中次数、正则执行次数与累计耗时（按耗时降序）"""
+        rows = []
+        for i, pattern_info in enumerate(self.patterns):
+            rows.append({
+                "pattern": pattern_info["pattern"],
+                "literals": self.literals[i],
+                "hits": self.hits[i],
+                "evaluations": self.evaluations[i],
+                "cost_ms": round(self.cost[i] * 1000, 3)
+            })
+        rows.sort(key=lambda row: row["cost_ms"], reverse=True)
+        return rows
+
+def fix_entries(pattern_info):
+    """模式的修复列表：fix 可以是单个字典或字典列表，其他值（None、空列表等）视为没有修复"""
+    fixes = pattern_info.get("fix")
+    if isinstance(fixes, dict):
+        fixes = [fixes]
+    return [fix for fix in fixes if isinstance(fix, dict)] if isinstance(fixes, list) else []
+
+_registry_cache = {}
+
+def get_pattern_registry(error_patterns):
+    """按模式列表缓存注册表，同一组模式在多次解析之间复用（统计数据也会累积）"""
+    key = tuple(pattern_info["pattern"] for pattern_info in error_patterns)
+    registry = _registry_cache.get(key)
+    if registry is None:
+        registry = PatternRegistry(error_patterns)
+        _registry_cache[key] = registry
+    else:
+        registry.patterns = list(error_patterns)
+    return registry
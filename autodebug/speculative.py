@@ -0,0 +1,273 @@
+import abc
+import copy
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import textwrap
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import yaml
+
+from autodebug.pattern_registry import get_pattern_registry, fix_entries
+from autodebug.workflow_document import WorkflowDocument
+
+SCRATCH_PREFIX = "autodebug/spec"
+POLL_INTERVAL = 60
+RUN_TIMEOUT = 3600
+
+class RunReporter(abc.ABC):
+    """查询候选分支上的工作流运行；测试时可替换为本地的假实现"""
+
+    @abc.abstractmethod
+    def find_run(self, branch, sha):
+        """返回该分支、该提交触发的运行 {'id', 'status', 'conclusion'}，尚未出现时返回 None"""
+
+    @abc.abstractmethod
+    def cancel(self, run_id):
+        """取消运行，返回是否成功"""
+
+class GitHubRunReporter(RunReporter):
+    def __init__(self, repo, github_token, workflow="debug.yml"):
+        self.repo = repo
+        self.workflow = workflow
+        self.headers = {"Authorization": f"token {github_token}", "Accept": "application/vnd.github.v3+json"}
+
+    def find_run(self, branch, sha):
+        import requests
+        url = f"https://api.github.com/repos/{self.repo}/actions/workflows/{self.workflow}/runs"
+        try:
+            response = requests.get(url, headers=self.headers, params={"branch": branch, "head_sha": sha, "per_page": 1}, timeout=30)
+            response.raise_for_status()
+            runs = response.json().get("workflow_runs", [])
+        except Exception as e:
+            print(f"[WARNING] 查询分支 {branch} 的运行失败: {e}")
+            return None
+        if not runs:
+            return None
+        return {"id": str(runs[0]["id"]), "status": runs[0]["status"], "conclusion": runs[0]["conclusion"]}
+
+    def cancel(self, run_id):
+        import requests
+        url = f"https://api.github.com/repos/{self.repo}/actions/runs/{run_id}/cancel"
+        try:
+            response = requests.post(url, headers=self.headers, timeout=30)
+            return response.status_code in (202, 409)
+        except Exception as e:
+            print(f"[WARNING] 取消运行 {run_id} 失败: {e}")
+            return False
+
+def _git(args, cwd):
+    result = subprocess.run(["git"] + args, cwd=cwd, capture_output=True, text=True, check=True)
+    return result.stdout.strip()
+
+def _slug(name):
+    return re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-")[:40] or "fix"
+
+def pattern_fixes(errors, error_patterns):
+    """与错误匹配的 error_patterns 修复（与 fix_workflow 相同，经模式注册表匹配，fix 可以是字典或列表），
+    按错误、再按 error_patterns 的列表顺序转换为 {'name', 'step'} 形式的候选"""
+    registry = get_pattern_registry(error_patterns or [])
+    fixes = []
+    for error in errors:
+        for _, pattern_info, _ in registry.all_matches(error):
+            for fix in fix_entries(pattern_info):
+                if fix.get("step_name") and fix.get("step_code"):
+                    fixes.append({"name": fix["step_name"], "step": fix["step_code"]})
+    return fixes
+
+def candidate_workflows(base_workflow, fixes, limit):
+    """把修复逐个应用到当前工作流的副本上，返回最多 limit 个 {'name', 'workflow'}；已存在的步骤与重复候选跳过。
+
+    修复可以是 {'name', 'step'}（单个步骤的 YAML）或 {'name', 'workflow'}（例如 DeepSeek 给出的完整工作流）。
+    """
+    candidates = []
+    seen = set()
+    for fix in fixes:
+        if len(candidates) >= limit:
+            break
+        if fix["name"] in seen:
+            continue
+        seen.add(fix["name"])
+        if "workflow" in fix:
+            candidates.append({"name": fix["name"], "workflow": copy.deepcopy(fix["workflow"])})
+            continue
+        step = yaml.safe_load(textwrap.dedent(fix["step"]))
+        if isinstance(step, list):
+            step = step[0] if step else None
+        if not isinstance(step, dict):
+            print(f"[WARNING] 候选修复 '{fix['name']}' 的步骤格式无效，跳过")
+            continue
+        document = WorkflowDocument(None, data=copy.deepcopy(base_workflow))
+        if document.add_step(step):
+            candidates.append({"name": fix["name"], "workflow": document.data})
+    return candidates
+
+def _allow_branch(workflow, pattern):
+    """让候选工作流在 scratch 分支上也能被 push 触发，返回是否有修改"""
+    on_field = workflow.get("on") if isinstance(workflow.get("on"), dict) else None
+    push = on_field.get("push") if on_field else None
+    if isinstance(push, dict) and isinstance(push.get("branches"), list) and pattern not in push["branches"]:
+        push["branches"].append(pattern)
+        return True
+    return False
+
+class SpeculativeRunner:
+    """把 top-K 候选修复分别提交到 scratch 分支并同时推送，等待各自的运行，第一个成功的快进到主分支，其余取消。
+
+    每个候选在独立的 git worktree 中提交，不影响当前工作区；remote 可以是本地裸仓库，reporter 可以是假实现。
+    scratch 分支上的触发条件放在候选提交之上的单独提交里，快进到主分支的只有候选提交本身。
+    evaluate() 只验证不合并，供 workflow_bisect 并行测试多个历史版本。
+    """
+
+    def __init__(self, repo_dir, workflow_file, base_branch, reporter, remote="origin", prefix=SCRATCH_PREFIX,
+                 poll_interval=POLL_INTERVAL, timeout=RUN_TIMEOUT, sleep=time.sleep, clock=time.monotonic):
+        self.repo_dir = repo_dir
+        self.workflow_path = os.path.relpath(os.path.abspath(workflow_file), os.path.abspath(repo_dir))
+        self.base_branch = base_branch
+        self.reporter = reporter
+        self.remote = remote
+        self.prefix = prefix
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.sleep = sleep
+        self.clock = clock
+
+    def materialize(self, candidate, base_sha, branch):
+        """在临时 worktree 中基于 base_sha 提交候选工作流到本地 scratch 分支，返回 (候选提交, 分支顶端提交)。
+
+        工作流只在 push 到指定分支时触发的话，再提交一次把 scratch 分支加入触发条件，运行在这个顶端提交上；
+        候选提交本身不含该触发条件，合并时只快进到候选提交。
+        """
+        worktree = tempfile.mkdtemp(prefix="autodebug-spec-")
+        path = os.path.join(worktree, self.workflow_path)
+
+        def commit(workflow, message):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                f.write(WorkflowDocument(path, data=workflow).dump())
+            _git(["add", self.workflow_path], worktree)
+            _git(["-c", "user.name=AutoDebug", "-c", "user.email=autodebug@example.com", "commit", "-m", message], worktree)
+            return _git(["rev-parse", "HEAD"], worktree)
+
+        try:
+            _git(["worktree", "add", "-B", branch, worktree, base_sha], self.repo_dir)
+            merge_sha = commit(candidate["workflow"], candidate.get("message") or f"AutoDebug: Speculative fix '{candidate['name']}'")
+            trigger = copy.deepcopy(candidate["workflow"])
+            if not _allow_branch(trigger, f"{self.prefix}/**"):
+                return merge_sha, merge_sha
+            return merge_sha, commit(trigger, f"AutoDebug: Trigger {branch} (not merged)")
+        finally:
+            subprocess.run(["git", "worktree", "remove", "--force", worktree], cwd=self.repo_dir, capture_output=True)
+            shutil.rmtree(worktree, ignore_errors=True)
+
+    def _launch(self, candidates, tag):
+        """逐个提交候选到 scratch 分支后并发推送，返回 (基准提交, 候选条目)"""
+        base_sha = _git(["rev-parse", self.base_branch], self.repo_dir)
+        entries = []
+        # worktree 的创建会修改仓库管理文件，逐个提交；推送是网络操作，并发执行
+        for i, candidate in enumerate(candidates):
+            entry = {"candidate": candidate, "branch": f"{self.prefix}/{tag}-{i}-{_slug(candidate['name'])}",
+                     "merge_sha": None, "sha": None, "run": None, "state": "push_failed"}
+            try:
+                entry["merge_sha"], entry["sha"] = self.materialize(candidate, base_sha, entry["branch"])
+            except subprocess.CalledProcessError as e:
+                print(f"[ERROR] 提交候选 '{candidate['name']}' 失败: {e.stderr}")
+            entries.append(entry)
+        print(f"[INFO] 同时推送 {len(entries)} 个候选工作流（基于 {self.base_branch} {base_sha[:8]}）")
+
+        def push(entry):
+            if entry["sha"] is None:
+                return
+            try:
+                _git(["push", "--force", self.remote, f"refs/heads/{entry['branch']}"], self.repo_dir)
+                entry["state"] = "pending"
+                print(f"[DEBUG] 候选 '{entry['candidate']['name']}' 已推送到 {entry['branch']} ({entry['sha'][:8]})")
+            except subprocess.CalledProcessError as e:
+                print(f"[ERROR] 推送候选 '{entry['candidate']['name']}' 失败: {e.stderr}")
+
+        with ThreadPoolExecutor(max_workers=max(1, len(entries))) as executor:
+            list(executor.map(push, entries))
+        return base_sha, entries
+
+    def run(self, candidates, tag=None):
+        """返回 {'winner': 候选或 None, 'sha', 'results': {分支: 状态}, 'states': 按 candidates 顺序的状态}；
+        成功时主分支已快进到获胜的候选提交（sha）"""
+        base_sha, entries = self._launch(candidates, tag or time.strftime("%Y%m%d%H%M%S"))
+        winner = None
+        try:
+            winner = self._watch(entries)
+            if winner is not None and not self._fast_forward(winner, base_sha):
+                winner = None
+        finally:
+            self._cleanup(entries, winner)
+        return {"winner": winner["candidate"] if winner else None,
+                "sha": winner["merge_sha"] if winner else None,
+                "results": {entry["branch"]: entry["state"] for entry in entries},
+                "states": [entry["state"] for entry in entries]}
+
+    def evaluate(self, candidates, tag=None):
+        """只验证不合并：等待所有候选的运行结束，按 candidates 顺序返回状态（success、failure、push_failed、cancelled 等）"""
+        _, entries = self._launch(candidates, tag or time.strftime("%Y%m%d%H%M%S"))
+        try:
+            self._watch(entries, first_success=False)
+        finally:
+            self._cleanup(entries, None)
+        return [entry["state"] for entry in entries]
+
+    def _watch(self, entries, first_success=True):
+        deadline = self.clock() + self.timeout
+        while True:
+            pending = [entry for entry in entries if entry["state"] == "pending"]
+            if not pending:
+                if first_success:
+                    print("[INFO] 推测执行：所有候选修复均未成功")
+                return None
+            for entry in pending:
+                run = self.reporter.find_run(entry["branch"], entry["sha"])
+                if run is None:
+                    continue
+                entry["run"] = run
+                if run.get("status") != "completed":
+                    continue
+                entry["state"] = "success" if run.get("conclusion") == "success" else "failure"
+                print(f"[DEBUG] 候选 '{entry['candidate']['name']}' 运行 {run['id']} 结果: {run.get('conclusion')}")
+                if first_success and entry["state"] == "success":
+                    return entry
+            if self.clock() >= deadline:
+                print(f"[WARNING] 等待候选运行超过 {self.timeout} 秒，放弃剩余候选")
+                return None
+            self.sleep(self.poll_interval)
+
+    def _fast_forward(self, winner, base_sha):
+        """推送获胜的候选提交到主分支（只允许快进，不含 scratch 分支的触发提交）；当前检出的正是主分支时同步快进本地工作区"""
+        try:
+            _git(["push", self.remote, f"{winner['merge_sha']}:refs/heads/{self.base_branch}"], self.repo_dir)
+        except subprocess.CalledProcessError as e:
+            print(f"[ERROR] 主分支 {self.base_branch} 无法快进到候选提交（可能已有新提交）: {e.stderr}")
+            return False
+        try:
+            if _git(["rev-parse", "--abbrev-ref", "HEAD"], self.repo_dir) == self.base_branch:
+                _git(["merge", "--ff-only", winner["merge_sha"]], self.repo_dir)
+            else:
+                _git(["update-ref", f"refs/heads/{self.base_branch}", winner["merge_sha"], base_sha], self.repo_dir)
+        except subprocess.CalledProcessError as e:
+            print(f"[WARNING] 远程主分支已快进，但本地 {self.base_branch} 同步失败: {e.stderr}")
+        print(f"[INFO] 推测执行：候选修复 '{winner['candidate']['name']}' 成功，{self.base_branch} 已快进到 {winner['merge_sha'][:8]}")
+        return True
+
+    def _cleanup(self, entries, winner):
+        for entry in entries:
+            run = entry["run"]
+            if entry is not winner and run and run.get("status") != "completed":
+                if self.reporter.cancel(run["id"]):
+                    entry["state"] = "cancelled"
+                    print(f"[DEBUG] 已取消候选 '{entry['candidate']['name']}' 的运行 {run['id']}")
+            if entry["state"] == "pending":
+                entry["state"] = "abandoned"
+            if entry["state"] != "push_failed":
+                subprocess.run(["git", "push", self.remote, "--delete", entry["branch"]], cwd=self.repo_dir,
+                               capture_output=True)
+            subprocess.run(["git", "branch", "-D", entry["branch"]], cwd=self.repo_dir, capture_output=True)
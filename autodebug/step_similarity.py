@@ -0,0 +1,198 @@
+import hashlib
+import json
+import os
+import random
+import re
+from autodebug.workflow_document import is_build_check_pair, normalize_run, step_key
+
+# MinHash 参数：64 个哈希函数，分成 16 个 band（每个 band 4 行），约 0.5 相似度开始成为候选
+NUM_PERMUTATIONS = 64
+NUM_BANDS = 16
+DEFAULT_THRESHOLD = 0.8
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+def tokenize_run(run):
+    """将 run 脚本按 shell 命令切分（换行、&&、||、;、|），每条命令拆成词元列表"""
+    commands = []
+    for command in re.split(r"\n|&&|\|\||;|\|", normalize_run(run)):
+        tokens = command.strip().split()
+        if tokens and tokens[0] == "sudo":
+            tokens = tokens[1:]
+        if tokens:
+            commands.append(tokens)
+    return commands
+
+def run_shingles(run, size=2):
+    """生成命令级 shingle：每条命令的命令名 + 相邻词元对"""
+    shingles = set()
+    for tokens in tokenize_run(run):
+        shingles.add(tokens[0])
+        if len(tokens) < size:
+            continue
+        for i in range(len(tokens) - size + 1):
+            shingles.add(" ".join(tokens[i:i + size]))
+    return shingles
+
+def _shingle_hash(shingle):
+    return int.from_bytes(hashlib.md5(shingle.encode("utf-8")).digest()[:4], "big")
+
+class StepSimilarity:
+    """基于 MinHash + LSH 的步骤相似度引擎：每个 run 脚本只切分一次，全量查重一次完成"""
+
+    def __init__(self, num_permutations=NUM_PERMUTATIONS, num_bands=NUM_BANDS, threshold=DEFAULT_THRESHOLD, seed=42):
+        if num_permutations % num_bands != 0:
+            raise ValueError("num_permutations 必须能被 num_bands 整除")
+        self.num_permutations = num_permutations
+        self.num_bands = num_bands
+        self.rows = num_permutations // num_bands
+        self.threshold = threshold
+        rng = random.Random(seed)
+        self.permutations = [
+            (rng.randint(1, _MERSENNE_PRIME - 1), rng.randint(0, _MERSENNE_PRIME - 1))
+            for _ in range(num_permutations)
+        ]
+        self._signatures = {}  # 规范化 run → 签名缓存
+        self._history_index = None  # 最近一次建立的历史步骤 band 索引
+
+    def signature(self, run):
+        """计算 run 脚本的 MinHash 签名，相同脚本只计算一次"""
+        key = normalize_run(run)
+        if key in self._signatures:
+            return self._signatures[key]
+        shingles = run_shingles(key)
+        if not shingles:
+            self._signatures[key] = None
+            return None
+        hashes = [_shingle_hash(s) for s in shingles]
+        signature = tuple(
+            min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+            for a, b in self.permutations
+        )
+        self._signatures[key] = signature
+        return signature
+
+    @staticmethod
+    def estimate(sig1, sig2):
+        """由两个签名估计 Jaccard 相似度"""
+        if not sig1 or not sig2:
+            return 0.0
+        return sum(1 for x, y in zip(sig1, sig2) if x == y) / len(sig1)
+
+    def _bands(self, signature):
+        for band in range(self.num_bands):
+            start = band * self.rows
+            yield band, signature[start:start + self.rows]
+
+    def find_near_duplicates(self, steps, threshold=None):
+        """一次批量找出步骤列表中所有近似重复的步骤对，返回 [(i, j, 相似度)]，i < j"""
+        threshold = self.threshold if threshold is None else threshold
+        buckets = {}
+        signatures = {}
+        for i, step in enumerate(steps):
+            if not isinstance(step, dict) or "run" not in step:
+                continue
+            signature = self.signature(step["run"])
+            if signature is None:
+                continue
+            signatures[i] = signature
+            for band in self._bands(signature):
+                buckets.setdefault(band, []).append(i)
+
+        candidates = set()
+        for members in buckets.values():
+            for x in range(len(members)):
+                for y in range(x + 1, len(members)):
+                    candidates.add((members[x], members[y]))
+
+        pairs = []
+        for i, j in sorted(candidates):
+            score = self.estimate(signatures[i], signatures[j])
+            if score < threshold:
+                continue
+            if is_build_check_pair(steps[i], steps[j]):
+                continue
+            pairs.append((i, j, score))
+        return pairs
+
+    def duplicate_positions(self, steps, threshold=None):
+        """返回应移除的近似重复步骤位置（保留每组中最先出现的步骤）"""
+        duplicates = {}
+        for i, j, score in self.find_near_duplicates(steps, threshold):
+            if i in duplicates:
+                continue
+            if j not in duplicates or duplicates[j][1] < score:
+                duplicates[j] = (i, score)
+        return duplicates
+
+    def index_history(self, history_steps):
+        """为历史步骤建立 LSH band 索引 {band: [历史位置]}；同一批历史步骤只建一次，之后直接复用"""
+        key = tuple(normalize_run(step["run"]) if isinstance(step, dict) and "run" in step else None
+                    for step in history_steps)
+        if self._history_index is not None and self._history_index["key"] == key:
+            return self._history_index
+        buckets = {}
+        signatures = {}
+        for j, step in enumerate(history_steps):
+            if key[j] is None:
+                continue
+            signature = self.signature(step["run"])
+            if signature is None:
+                continue
+            signatures[j] = signature
+            for band in self._bands(signature):
+                buckets.setdefault(band, []).append(j)
+        self._history_index = {"key": key, "steps": list(history_steps), "signatures": signatures, "buckets": buckets}
+        return self._history_index
+
+    def match_history(self, steps, history_steps, threshold=None):
+        """将当前步骤与历史版本中的步骤比对，返回 {当前位置: [(历史步骤名, 相似度)]}。
+
+        历史步骤的签名按 band 索引一次，每个当前步骤只查询与自己落在同一 band 的历史步骤。
+        """
+        threshold = self.threshold if threshold is None else threshold
+        index = self.index_history(history_steps)
+        matches = {}
+        for i, step in enumerate(steps):
+            if not isinstance(step, dict) or "run" not in step:
+                continue
+            signature = self.signature(step["run"])
+            if signature is None:
+                continue
+            candidates = set()
+            for band in self._bands(signature):
+                candidates.update(index["buckets"].get(band, ()))
+            for j in sorted(candidates):
+                score = self.estimate(signature, index["signatures"][j])
+                if score < threshold or is_build_check_pair(step, index["steps"][j]):
+                    continue
+                matches.setdefault(i, []).append((step_key(index["steps"][j]), score))
+        return matches
+
+def load_history_steps(push_history_file):
+    """从 push_history.json 中收集所有 'after' 版本工作流的步骤（按 run 去重）"""
+    if not os.path.exists(push_history_file):
+        print(f"[DEBUG] 推送历史文件不存在: {push_history_file}")
+        return []
+    try:
+        with open(push_history_file, "r") as f:
+            push_history = json.load(f)
+    except Exception as e:
+        print(f"[ERROR] 加载推送历史失败: {e}")
+        return []
+    steps = []
+    seen = set()
+    for entry in push_history.values() if isinstance(push_history, dict) else []:
+        after = entry.get("changes", {}).get("after") if isinstance(entry, dict) else None
+        if not isinstance(after, dict):
+            continue
+        for step in after.get("jobs", {}).get("build", {}).get("steps", []) or []:
+            if not isinstance(step, dict) or "run" not in step:
+                continue
+            fingerprint = normalize_run(step["run"])
+            if fingerprint in seen:
+                continue
+            seen.add(fingerprint)
+            steps.append(step)
+    print(f"[DEBUG] 从推送历史中收集到 {len(steps)} 个不同的 run 步骤")
+    return steps
@@ -0,0 +1,208 @@
+import argparse
+import json
+import os
+import re
+import statistics
+import sys
+import time
+from datetime import datetime
+
+# 动态添加项目根目录到 sys.path（支持直接运行脚本）
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from autodebug.log_differ import split_steps
+from autodebug.traceback_extractor import TIMESTAMP_PREFIX, strip_timestamp
+
+EPOCH = datetime(1970, 1, 1)
+POST_JOB = "Post job cleanup."
+# 步骤所属阶段：按步骤的 Run 命令及回显脚本判断，先匹配先得
+STEP_PHASES = [
+    ("apt_install", re.compile(r"\bapt(?:-get)?\s+(?:-\S+\s+)*(?:install|update)\b")),
+    ("buildozer_build", re.compile(r"\bbuildozer\s+(?:-\S+\s+)*android\b")),
+    ("pip_install", re.compile(r"\bpip3?\s+install\b|\bpip\s+config\b")),
+    ("sdk_setup", re.compile(r"setup-android|sdkmanager|cmdline-tools")),
+    ("ndk_download", re.compile(r"android-ndk|\bndk\b", re.IGNORECASE)),
+    ("setup", re.compile(r"^(?:\(setup\)|actions/(?:checkout|setup-\w+|cache)@)")),
+]
+# 步骤内部的子阶段：以这些行开头的时间段单独计入对应阶段（例如 buildozer 或 sdkmanager 中的 NDK 下载）
+LINE_PHASES = [
+    ("ndk_download", re.compile(r"Downloading android-ndk|Installing NDK|android-ndk-r\w+-linux[\w-]*\.zip")),
+    ("apt_install", re.compile(r"^(?:Get|Hit|Ign):\d+ |^(?:Unpacking|Setting up|Selecting previously unselected) ")),
+    ("pip_install", re.compile(r"^\s*(?:Collecting|Downloading|Building wheel|Installing collected) ")),
+    ("buildozer_build", re.compile(r"^\[INFO\]:\s+(?:Building|Prebuild|Compiling|Unpacking|Downloading)\b")),
+]
+MAX_RUNS = 50
+# 与此前多少次运行的中位数比较
+REGRESSION_WINDOW = 5
+# 比中位数慢 50% 且至少慢 30 秒才算变慢，避免短步骤的抖动
+REGRESSION_RATIO = 1.5
+REGRESSION_MIN_SECONDS = 30
+
+def parse_timestamp(line):
+    """行首时间戳转为秒（UTC），没有时间戳时返回 None；7 位小数截断为微秒"""
+    if not TIMESTAMP_PREFIX.match(line):
+        return None
+    return (datetime.fromisoformat(line[:26]) - EPOCH).total_seconds()
+
+def step_phase(name, script):
+    text = "\n".join([name] + script)
+    for phase, pattern in STEP_PHASES:
+        if pattern.search(text):
+            return phase
+    return "other"
+
+def line_phase(text):
+    for phase, pattern in LINE_PHASES:
+        if pattern.search(text):
+            return phase
+    return None
+
+def _split_post(lines, steps):
+    """把最后一个步骤中的 Post job cleanup. 及之后的内容拆为单独的 (post) 步骤"""
+    if not steps:
+        return steps
+    name, start, end = steps[-1]
+    for i in range(start, end):
+        if strip_timestamp(lines[i]).startswith(POST_JOB):
+            return steps[:-1] + ([(name, start, i)] if i > start else []) + [("(post)", i, end)]
+    return steps
+
+def analyze_lines(lines):
+    """计算每个步骤的耗时，以及各阶段的累计耗时（秒）。
+
+    相邻两行时间戳之差计入前一行所属的阶段：前一行匹配 LINE_PHASES 时计入该子阶段，否则计入步骤所属阶段。
+    """
+    steps = []
+    phases = {}
+    timestamps = [parse_timestamp(line) for line in lines]
+    first = next((t for t in timestamps if t is not None), None)
+    last = next((t for t in reversed(timestamps) if t is not None), None)
+    for name, start, end in _split_post(lines, split_steps(lines)):
+        script = []
+        for line in lines[start + 1:end]:
+            text = strip_timestamp(line)
+            if not text.startswith("\x1b[36;1m"):
+                break
+            script.append(text)
+        phase = step_phase(name, script)
+        previous = None
+        previous_phase = phase
+        seconds = 0.0
+        # 步骤时长取到下一个步骤的第一行，包含两步骤之间的空档
+        for i in range(start, end + 1 if end < len(lines) else end):
+            t = timestamps[i]
+            if t is None:
+                continue
+            if previous is not None and t >= previous:
+                phases[previous_phase] = phases.get(previous_phase, 0.0) + t - previous
+                seconds += t - previous
+            previous = t
+            if i < end:
+                previous_phase = line_phase(strip_timestamp(lines[i])) or phase
+        steps.append({
+            "name": name,
+            "phase": phase,
+            "start_line": start,
+            "seconds": round(seconds, 3)
+        })
+    return {
+        "total": round(last - first, 3) if first is not None else 0.0,
+        "steps": steps,
+        "phases": {phase: round(seconds, 3) for phase, seconds in sorted(phases.items(), key=lambda item: -item[1])}
+    }
+
+def load_timings(timings_file):
+    if os.path.exists(timings_file):
+        try:
+            with open(timings_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"[WARNING] 读取步骤耗时记录失败: {e}")
+    return {"runs": []}
+
+def save_timings(timings, timings_file):
+    with open(timings_file, "w", encoding="utf-8") as f:
+        json.dump(timings, f, ensure_ascii=False, indent=2)
+
+def slowest_steps(run, top=5):
+    return sorted(run["steps"], key=lambda step: step["seconds"], reverse=True)[:top]
+
+def regressions(history, run, window=REGRESSION_WINDOW):
+    """与此前 window 次运行中同名步骤/同一阶段的中位数比较，返回明显变慢的项"""
+    index = next((i for i, r in enumerate(history) if r is run), len(history))
+    previous = history[:index][-window:]
+    found = []
+    for kind, current, past in (
+        ("step", {s["name"]: s["seconds"] for s in run["steps"]},
+         [{s["name"]: s["seconds"] for s in r["steps"]} for r in previous]),
+        ("phase", run["phases"], [r["phases"] for r in previous]),
+    ):
+        for name, seconds in current.items():
+            samples = [p[name] for p in past if name in p]
+            if not samples:
+                continue
+            baseline = statistics.median(samples)
+            if seconds >= baseline * REGRESSION_RATIO and seconds - baseline >= REGRESSION_MIN_SECONDS:
+                found.append({"kind": kind, "name": name, "seconds": seconds, "baseline": round(baseline, 3),
+                              "samples": len(samples)})
+    return sorted(found, key=lambda item: item["seconds"] - item["baseline"], reverse=True)
+
+def record_run(log_content, run_id, conclusion, timings_file):
+    """分析一次运行的日志并写入耗时记录（同一 run_id 只记录一次），返回 (本次运行记录, 报告)"""
+    timings = load_timings(timings_file)
+    run_id = str(run_id) if run_id is not None else None
+    run = next((r for r in timings["runs"] if run_id is not None and r.get("run_id") == run_id), None)
+    if run is None:
+        start = time.perf_counter()
+        run = analyze_lines(log_content.splitlines())
+        run.update({"run_id": run_id, "conclusion": conclusion, "recorded_at": datetime.now().isoformat()})
+        timings["runs"] = (timings["runs"] + [run])[-MAX_RUNS:]
+        try:
+            save_timings(timings, timings_file)
+        except Exception as e:
+            print(f"[WARNING] 保存步骤耗时记录失败: {e}")
+        print(f"[DEBUG] 已记录运行 {run_id} 的步骤耗时（{len(run['steps'])} 个步骤，分析耗时 {time.perf_counter() - start:.3f}s）")
+    report = {"total": run["total"], "slowest": slowest_steps(run), "phases": run["phases"],
+              "regressions": regressions(timings["runs"], run)}
+    return run, report
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    return f"{minutes}m{seconds:02d}s" if minutes else f"{seconds}s"
+
+def format_report(report):
+    lines = [f"总耗时 {format_duration(report['total'])}"]
+    lines.append("阶段: " + ", ".join(f"{phase} {format_duration(seconds)}" for phase, seconds in report["phases"].items()))
+    lines.append("最慢步骤: " + "; ".join(f"{step['name'][:60]} {format_duration(step['seconds'])}" for step in report["slowest"]))
+    for item in report["regressions"]:
+        lines.append(f"变慢的{'步骤' if item['kind'] == 'step' else '阶段'}: {item['name'][:60]} "
+                     f"{format_duration(item['seconds'])}（此前中位数 {format_duration(item['baseline'])}）")
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="根据日志时间戳统计 CI 各步骤与各阶段耗时")
+    parser.add_argument("logs", nargs="+", help="日志文件（按运行先后顺序）")
+    parser.add_argument("--timings-file", default=None, help="耗时记录文件，默认不记录，只输出本次分析结果")
+    args = parser.parse_args()
+
+    history = load_timings(args.timings_file)["runs"] if args.timings_file else []
+    for log_file in args.logs:
+        with open(log_file, "r", encoding="utf-8", errors="replace") as f:
+            log_content = f.read()
+        run_id = os.path.splitext(os.path.basename(log_file))[0]
+        if args.timings_file:
+            run, report = record_run(log_content, run_id, None, args.timings_file)
+        else:
+            run = analyze_lines(log_content.splitlines())
+            run["run_id"] = run_id
+            history.append(run)
+            report = {"total": run["total"], "slowest": slowest_steps(run), "phases": run["phases"],
+                      "regressions": regressions(history, run)}
+        print(f"[INFO] {log_file}")
+        for line in format_report(report).splitlines():
+            print(f"  {line}")
+
+if __name__ == "__main__":
+    main()
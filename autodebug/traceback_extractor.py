@@ -0,0 +1,108 @@
+import re
+from functools import lru_cache
+
+# GitHub Actions 日志每行的时间戳前缀
+TIMESTAMP_PREFIX = re.compile(r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d+Z\s?")
+TRACEBACK_HEADER = "Traceback (most recent call last):"
+FRAME_LINE = re.compile(r'^\s*File "?(?P<file>[^",]+)"?, line (?P<line>\d+)(?:, in (?P<function>.+))?')
+# 堆栈末尾的异常行：ValueError: ...、sh.ErrorReturnCode_1: ...、Error: ...、KeyboardInterrupt 等
+EXCEPTION_LINE = re.compile(
+    r"^(?P<type>(?:[A-Za-z_]\w*\.)*(?=[A-Za-z_])\w*(?:Error|Exception|Exit|Interrupt|Warning|Failure)\w*)"
+    r"(?::\s*(?P<message>.*)|\s*$)"
+)
+
+def strip_timestamp(line):
+    return TIMESTAMP_PREFIX.sub("", line, count=1)
+
+def _is_start(stripped):
+    text = stripped.strip()
+    return TRACEBACK_HEADER in stripped or (text.startswith("File ") and ".py" in stripped)
+
+def _new_block(start, line):
+    return {
+        "start": start,
+        "end": start,
+        "lines": [line],
+        "frames": [],
+        "exception_type": None,
+        "message": None,
+        "complete": False
+    }
+
+def _finish(block, blocks):
+    block["text"] = "\n".join(block["lines"])
+    blocks.append(block)
+
+def extract_tracebacks_from_lines(lines):
+    """单次线性扫描，返回所有堆栈块：起止行号、帧列表、异常类型与消息（行内容已去掉时间戳）"""
+    blocks = []
+    block = None
+    after_frame = False
+    for i, raw in enumerate(lines):
+        line = strip_timestamp(raw)
+        if block is None:
+            if _is_start(line):
+                block = _new_block(i, line)
+                frame = FRAME_LINE.match(line)
+                if frame:
+                    block["frames"].append({"file": frame.group("file"), "line": int(frame.group("line")),
+                                            "function": frame.group("function")})
+                after_frame = frame is not None
+            continue
+
+        text = line.strip()
+        frame = FRAME_LINE.match(line)
+        if frame:
+            block["lines"].append(line)
+            block["end"] = i
+            block["frames"].append({"file": frame.group("file"), "line": int(frame.group("line")),
+                                    "function": frame.group("function")})
+            after_frame = True
+            continue
+        # 紧跟在帧后面的缩进行是源码行，不作为异常行（例如 "    raise ValueError(...)"）
+        exception = EXCEPTION_LINE.match(text) if text and not (after_frame and line[:1].isspace()) else None
+        after_frame = False
+        if exception:
+            block["lines"].append(line)
+            block["end"] = i
+            block["exception_type"] = exception.group("type")
+            block["message"] = (exception.group("message") or "").strip()
+            block["complete"] = True
+            _finish(block, blocks)
+            block = None
+            continue
+        if not text or line[:1].isspace():
+            # 帧下方的源码行与空行属于堆栈内容
+            block["lines"].append(line)
+            block["end"] = i
+            continue
+        # 遇到无关的顶格行，堆栈没有以异常行结束（日志被截断或格式异常）
+        _finish(block, blocks)
+        block = None
+        if _is_start(line):
+            block = _new_block(i, line)
+            after_frame = FRAME_LINE.match(line) is not None
+    if block is not None:
+        _finish(block, blocks)
+    return blocks
+
+@lru_cache(maxsize=8)
+def _extract_cached(log_content):
+    return tuple(extract_tracebacks_from_lines(log_content.splitlines()))
+
+def extract_tracebacks(log_content):
+    """返回日志中的所有堆栈块（按内容缓存，多个调用方共享同一次扫描的结果，调用方不应修改返回的块）"""
+    if not log_content:
+        return ()
+    return _extract_cached(log_content)
+
+def complete_tracebacks(log_content):
+    """以异常行结束的堆栈块"""
+    return [block for block in extract_tracebacks(log_content) if block["complete"]]
+
+def first_traceback(log_content, predicate=None):
+    """第一个完整的堆栈块，可选按条件过滤；没有时返回 None"""
+    for block in complete_tracebacks(log_content):
+        if predicate is None or predicate(block):
+            return block
+    return None
@@ -0,0 +1,245 @@
+import argparse
+import copy
+import glob
+import json
+import os
+import re
+import sys
+import time
+
+import yaml
+
+# 动态添加项目根目录到 sys.path（支持直接运行脚本）
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from autodebug.workflow_document import step_key
+
+BISECT_PREFIX = "autodebug/bisect"
+# 每轮同时测试的版本数为 k-1，区间缩小为原来的约 1/k
+DEFAULT_WAYS = 4
+
+def _string_keys(value):
+    if isinstance(value, dict):
+        return {str(key): _string_keys(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_string_keys(item) for item in value]
+    return value
+
+def _canonical(workflow):
+    return json.dumps(_string_keys(workflow), sort_keys=True, ensure_ascii=False, default=str)
+
+def _restore_on(workflow):
+    """YAML 把 on 解析为 True，写入 push_history.json 后又变成 "true"；还原为 on 并保持键的顺序"""
+    if "on" in workflow or not (True in workflow or "true" in workflow):
+        return workflow
+    return {("on" if key is True or key == "true" else key): value for key, value in workflow.items()}
+
+def _raw_steps(workflow):
+    jobs = workflow.get("jobs") if isinstance(workflow, dict) else None
+    build = jobs.get("build") if isinstance(jobs, dict) else None
+    steps = build.get("steps") if isinstance(build, dict) else None
+    return steps if isinstance(steps, list) else []
+
+def _steps(workflow):
+    return [step for step in _raw_steps(workflow) if isinstance(step, dict)]
+
+def _backup_number(path):
+    match = re.search(r"\.bak\.(\d+)$", path)
+    return int(match.group(1)) if match else -1
+
+def load_versions(push_history_file, backup_dir, workflow_file=None):
+    """按时间顺序收集记录过的工作流版本 [{'label', 'source', 'timestamp', 'workflow'}]。
+
+    backup/debug.yml.bak.N 早于推送历史（按修改时间、再按 N 排序）；push_history.json 按时间戳排序，
+    第一条取 before 与 after，其余取 after；最后追加当前的工作流文件。连续相同的版本只保留第一个。
+    """
+    versions = []
+
+    def add(label, source, timestamp, workflow):
+        if not isinstance(workflow, dict) or not _steps(workflow):
+            return
+        workflow = _restore_on(workflow)
+        if versions and _canonical(versions[-1]["workflow"]) == _canonical(workflow):
+            return
+        versions.append({"label": label, "source": source, "timestamp": timestamp, "workflow": workflow})
+
+    backups = glob.glob(os.path.join(backup_dir, "*.bak.*")) if backup_dir and os.path.isdir(backup_dir) else []
+    for path in sorted(backups, key=lambda path: (os.path.getmtime(path), _backup_number(path))):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                workflow = yaml.safe_load(f)
+        except Exception as e:
+            print(f"[WARNING] 读取备份 {path} 失败: {e}")
+            continue
+        add(os.path.basename(path), "backup", time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(os.path.getmtime(path))), workflow)
+
+    push_history = {}
+    if push_history_file and os.path.exists(push_history_file):
+        try:
+            with open(push_history_file, "r", encoding="utf-8") as f:
+                push_history = json.load(f)
+        except Exception as e:
+            print(f"[WARNING] 读取推送历史失败: {e}")
+    entries = sorted((item for item in push_history.items() if isinstance(item[1], dict)) if isinstance(push_history, dict) else [],
+                     key=lambda item: item[1].get("timestamp") or "")
+    for i, (message, entry) in enumerate(entries):
+        changes = entry.get("changes") or {}
+        if i == 0:
+            add(f"before: {message}", "push_history", entry.get("timestamp"), changes.get("before"))
+        add(message, "push_history", entry.get("timestamp"), changes.get("after"))
+
+    if workflow_file and os.path.exists(workflow_file):
+        try:
+            with open(workflow_file, "r", encoding="utf-8") as f:
+                add("current", "workflow_file", None, yaml.safe_load(f))
+        except Exception as e:
+            print(f"[WARNING] 读取当前工作流失败: {e}")
+    return versions
+
+def probe_points(good, bad, ways):
+    """在 (good, bad) 开区间内均匀取至多 ways-1 个测试点"""
+    span = bad - good
+    return sorted({good + (span * i) // ways for i in range(1, ways)} - {good, bad})
+
+def bisect_versions(count, test, good=0, bad=None, ways=DEFAULT_WAYS):
+    """k 路二分：已知第 good 个版本成功、第 bad 个版本失败，每轮并行测试 ways-1 个中间版本，
+    返回 (最后确认成功的版本, 第一个失败的版本, 各轮记录)；两者相邻时结论成立。
+
+    test(indices) 返回与 indices 对应的结果：True 成功、False 失败、None 无法判断（推送失败、超时等）。
+    假设结果随版本单调（某个版本之后一直失败）；出现失败之后又成功的情况时以最早的失败为准。
+    """
+    bad = count - 1 if bad is None else bad
+    rounds = []
+    while bad - good > 1:
+        indices = probe_points(good, bad, max(2, ways))
+        results = test(indices)
+        rounds.append(dict(zip(indices, results)))
+        decided = [(index, result) for index, result in zip(indices, results) if result is not None]
+        if not decided:
+            print(f"[ERROR] 本轮测试的版本 {indices} 均无结果，停止二分")
+            break
+        failing = [index for index, result in decided if result is False]
+        if failing and any(result for index, result in decided if index > failing[0]):
+            print(f"[WARNING] 版本 {failing[0]} 失败但之后的版本成功，结果可能不稳定，按最早的失败继续")
+        if failing:
+            bad = failing[0]
+        passing = [index for index, result in decided if result and index < bad]
+        if passing:
+            good = max(passing)
+        print(f"[INFO] 第 {len(rounds)} 轮: 测试 {indices} -> {results}，区间缩小为 ({good}, {bad}]")
+    return good, bad, rounds
+
+def _fields(workflow):
+    """步骤以外的字段：顶层字段与 build 作业的其他字段"""
+    fields = {str(key): value for key, value in workflow.items() if key != "jobs"}
+    build = (workflow.get("jobs") or {}).get("build")
+    if isinstance(build, dict):
+        fields.update({f"jobs.build.{key}": value for key, value in build.items() if key != "steps"})
+    return fields
+
+def _keyed_steps(workflow):
+    """步骤按 step_key 编号；没有名称的步骤用 run 的第一行，格式无效的步骤（例如嵌套列表）单独标出，重复的加序号"""
+    keyed = {}
+    for step in _raw_steps(workflow):
+        key = step_key(step)
+        if not isinstance(step, dict):
+            key = f"invalid: {_canonical(step)[:60]}"
+        elif key == "unnamed" and isinstance(step.get("run"), str) and step["run"].strip():
+            key = f"run: {step['run'].strip().splitlines()[0][:60]}"
+        label = key
+        occurrence = 1
+        while label in keyed:
+            occurrence += 1
+            label = f"{key} #{occurrence}"
+        keyed[label] = step
+    return keyed
+
+def diff_steps(before, after):
+    """两个版本之间按步骤比较：新增、删除、修改的步骤名，以及步骤以外有变化的字段"""
+    old = _keyed_steps(before)
+    new = _keyed_steps(after)
+    old_fields = _fields(before)
+    new_fields = _fields(after)
+    return {
+        "added": [key for key in new if key not in old],
+        "removed": [key for key in old if key not in new],
+        "changed": [key for key in new if key in old and _canonical(new[key]) != _canonical(old[key])],
+        "reordered": [key for key in new if key in old] != [key for key in old if key in new],
+        "fields": [key for key in dict.fromkeys(list(old_fields) + list(new_fields))
+                   if _canonical(old_fields.get(key)) != _canonical(new_fields.get(key))]
+    }
+
+def run_bisect(versions, runner, good=0, bad=None, ways=DEFAULT_WAYS, verify=False, tag=None):
+    """在 scratch 分支上测试历史版本的工作流（应用代码保持为当前提交），找出第一个失败的版本"""
+    tag = tag or time.strftime("%Y%m%d%H%M%S")
+    bad = len(versions) - 1 if bad is None else bad
+    round_number = [0]
+
+    def test(indices):
+        round_number[0] += 1
+        candidates = [{"name": f"v{index}", "workflow": copy.deepcopy(versions[index]["workflow"]),
+                       "message": f"AutoDebug: Bisect workflow version {index} ({versions[index]['label'][:60]})"}
+                      for index in indices]
+        states = runner.evaluate(candidates, tag=f"{tag}-r{round_number[0]}")
+        return [True if state == "success" else False if state == "failure" else None for state in states]
+
+    if verify:
+        good_result, bad_result = test([good, bad])
+        if good_result is not True or bad_result is not False:
+            print(f"[ERROR] 端点验证不符合预期：版本 {good} 结果 {good_result}，版本 {bad} 结果 {bad_result}")
+            return None
+    last_good, first_bad, rounds = bisect_versions(len(versions), test, good, bad, ways)
+    if first_bad - last_good > 1:
+        return None
+    return {
+        "first_bad": first_bad,
+        "version": versions[first_bad],
+        "previous": versions[first_bad - 1] if first_bad > 0 else None,
+        "diff": diff_steps(versions[first_bad - 1]["workflow"], versions[first_bad]["workflow"]) if first_bad > 0 else None,
+        "runs": sum(len(r) for r in rounds) + (2 if verify else 0),
+        "rounds": rounds
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="在记录过的工作流版本上做 k 路二分，找出导致构建失败的那次改动")
+    parser.add_argument("--list", action="store_true", help="只列出记录过的版本")
+    parser.add_argument("--good", type=int, default=0, help="已知成功的版本序号（默认最早的版本）")
+    parser.add_argument("--bad", type=int, default=None, help="已知失败的版本序号（默认当前版本）")
+    parser.add_argument("--ways", type=int, default=DEFAULT_WAYS, help="每轮把区间分成几段（并行测试 ways-1 个版本）")
+    parser.add_argument("--verify", action="store_true", help="先验证 good 确实成功、bad 确实失败")
+    args = parser.parse_args()
+
+    from autodebug.config import load_config
+    config = load_config()
+    versions = load_versions(config['PUSH_HISTORY_FILE'], config['BACKUP_DIR'], config['WORKFLOW_FILE'])
+    if args.list or len(versions) < 2:
+        print(f"[INFO] 共 {len(versions)} 个工作流版本:")
+        for i, version in enumerate(versions):
+            print(f"  {i:3d}  {version['timestamp'] or '-':32s} [{version['source']}] {version['label'][:80]}")
+        return
+    bad = len(versions) - 1 if args.bad is None else args.bad
+    if not 0 <= args.good < bad < len(versions):
+        print(f"[ERROR] 版本序号无效: good={args.good}, bad={bad}（共 {len(versions)} 个版本）")
+        return
+
+    from autodebug.speculative import GitHubRunReporter, SpeculativeRunner
+    reporter = GitHubRunReporter(config['REPO'], config['GITHUB_TOKEN'], os.path.basename(config['WORKFLOW_FILE']))
+    runner = SpeculativeRunner(project_root, config['WORKFLOW_FILE'], config['GITHUB_BRANCH'], reporter, prefix=BISECT_PREFIX)
+    print(f"[INFO] 在版本 {args.good}..{bad} 之间做 {args.ways} 路二分")
+    result = run_bisect(versions, runner, args.good, bad, args.ways, args.verify)
+    if result is None:
+        print("[ERROR] 二分未能得出结论")
+        return
+    version = result["version"]
+    print(f"[INFO] 第一个失败的版本: {result['first_bad']} [{version['source']}] {version['label']}（共 {result['runs']} 次运行）")
+    if result["diff"]:
+        for kind in ("added", "removed", "changed", "fields"):
+            for key in result["diff"][kind]:
+                print(f"  {kind:8s} {key}")
+        if result["diff"]["reordered"]:
+            print("  步骤顺序有变化")
+
+if __name__ == "__main__":
+    main()
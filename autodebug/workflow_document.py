@@ -0,0 +1,340 @@
+import copy
+import re
+import yaml
+
+# 功能指纹使用的核心操作（与 check_step_functionality_similarity 保持一致）
+FUNCTIONAL_OPERATIONS = ["df -h", "du -h", "ping", "rm -rf", "apt-get clean"]
+
+def step_key(step):
+    """返回步骤的标识（name 优先，其次 uses）"""
+    if not isinstance(step, dict):
+        return "unnamed"
+    return step.get("name", step.get("uses", "unnamed"))
+
+def normalize_run(run):
+    """规范化 run 命令：小写、去掉注释行、合并空白，用作功能指纹"""
+    if not isinstance(run, str):
+        return ""
+    lines = []
+    for line in run.lower().splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        lines.append(re.sub(r"\s+", " ", line))
+    return "\n".join(lines)
+
+def functional_operations(step):
+    """返回步骤 run 命令中包含的核心操作集合"""
+    if not isinstance(step, dict) or "run" not in step:
+        return frozenset()
+    run = str(step["run"]).lower()
+    return frozenset(op for op in FUNCTIONAL_OPERATIONS if op in run)
+
+def is_build_check_pair(step1, step2):
+    """'before build' 与 'after build' 成对的排查步骤允许功能重复"""
+    name1 = str(step1.get("name", "")).lower()
+    name2 = str(step2.get("name", "")).lower()
+    return ("before build" in name1 and "after build" in name2) or \
+           ("before build" in name2 and "after build" in name1)
+
+class StepIndex:
+    """步骤索引：标识（name/uses）→ 位置，run 命令指纹 → 位置，核心操作 → 位置；查重为哈希查找"""
+
+    def __init__(self, steps=None):
+        self.rebuild(steps or [])
+
+    def rebuild(self, steps):
+        """根据步骤列表重建索引"""
+        self.keys = {}
+        self.uses = {}
+        self.fingerprints = {}
+        self.operations = {}
+        self.steps = []
+        for step in steps:
+            self.add(step)
+        return self
+
+    def add(self, step):
+        """将步骤追加到索引末尾，返回其位置"""
+        position = len(self.steps)
+        self.steps.append(step)
+        if not isinstance(step, dict):
+            return position
+        self.keys.setdefault(step_key(step), position)
+        if "uses" in step:
+            self.uses.setdefault(step["uses"], position)
+        fingerprint = normalize_run(step.get("run"))
+        if fingerprint:
+            self.fingerprints.setdefault(fingerprint, position)
+        for op in functional_operations(step):
+            self.operations.setdefault(op, []).append(position)
+        return position
+
+    def position(self, key):
+        """按标识查找步骤位置（先 name/uses 标识，再 uses），未找到返回 -1"""
+        if key in self.keys:
+            return self.keys[key]
+        return self.uses.get(key, -1)
+
+    def __contains__(self, key):
+        return self.position(key) != -1
+
+    def find_duplicate_run(self, step):
+        """查找 run 命令指纹相同的步骤位置，未找到返回 -1"""
+        fingerprint = normalize_run(step.get("run")) if isinstance(step, dict) else ""
+        return self.fingerprints.get(fingerprint, -1) if fingerprint else -1
+
+    def find_similar(self, step):
+        """查找与给定步骤功能相似（共享核心操作）的步骤位置，未找到返回 -1"""
+        for op in functional_operations(step):
+            for position in self.operations.get(op, []):
+                existing = self.steps[position]
+                if existing is step:
+                    continue
+                if is_build_check_pair(step, existing):
+                    print(f"[DEBUG] 允许功能重复步骤（用于磁盘空间排查）: {step.get('name', '')} 和 {existing.get('name', '')}")
+                    continue
+                return position
+        return -1
+
+class WorkflowDocument:
+    """debug.yml 的内存文档：每次迭代只加载一次，修改以操作形式记录，最后统一写入并验证一次"""
+
+    def __init__(self, workflow_file, data=None):
+        self.workflow_file = workflow_file
+        self.operations = []
+        self.load_error = None
+        self._index = None
+        self._index_source = None
+        if data is not None:
+            self.data = data
+        else:
+            self.load()
+
+    def load(self):
+        """从磁盘加载工作流文件，丢弃未写入的操作"""
+        self.operations = []
+        self.load_error = None
+        self._index = None
+        try:
+            with open(self.workflow_file, "r") as f:
+                self.data = yaml.safe_load(f)
+            print(f"[DEBUG] 已加载工作流文档: {self.workflow_file}")
+        except FileNotFoundError:
+            print(f"[WARNING] 工作流文件不存在: {self.workflow_file}")
+            self.data = None
+        except yaml.YAMLError as e:
+            print(f"[ERROR] 工作流文件 YAML 语法错误: {e}")
+            self.data = None
+            self.load_error = str(e)
+        return self.data
+
+    step_key = staticmethod(step_key)
+
+    @property
+    def dirty(self):
+        """是否存在尚未写入磁盘的操作"""
+        return bool(self.operations)
+
+    @property
+    def build_job(self):
+        """返回 build 作业，缺失时自动补齐结构"""
+        if not isinstance(self.data, dict):
+            self.data = {}
+        jobs = self.data.setdefault("jobs", {})
+        if not isinstance(jobs, dict):
+            jobs = {}
+            self.data["jobs"] = jobs
+        build_job = jobs.setdefault("build", {})
+        if not isinstance(build_job, dict):
+            build_job = {}
+            jobs["build"] = build_job
+        return build_job
+
+    @property
+    def steps(self):
+        """返回 build 作业的步骤列表（原地引用；直接修改后需调用 invalidate_index）"""
+        build_job = self.build_job
+        steps = build_job.get("steps")
+        if not isinstance(steps, list):
+            steps = []
+            build_job["steps"] = steps
+            self._index = None
+        return steps
+
+    @property
+    def index(self):
+        """步骤索引，按需重建"""
+        steps = self.steps
+        if self._index is None or self._index_source is not steps or len(self._index.steps) != len(steps):
+            self._index = StepIndex(steps)
+            self._index_source = steps
+        return self._index
+
+    def invalidate_index(self):
+        """步骤列表被外部直接修改后使索引失效"""
+        self._index = None
+
+    def _record(self, op, target=None, **details):
+        entry = {"op": op, "target": target}
+        entry.update(details)
+        self.operations.append(entry)
+        print(f"[DEBUG] 记录工作流操作: {op} {target if target is not None else ''}")
+
+    def find_step(self, key):
+        """查找步骤位置（哈希查找 name/uses 标识），未找到返回 -1"""
+        return self.index.keys.get(key, -1)
+
+    def has_step(self, key):
+        """检查步骤是否存在"""
+        return self.find_step(key) != -1
+
+    def has_step_for(self, key):
+        """检查是否存在以 key 为 name 或 uses 的步骤"""
+        return key in self.index
+
+    def find_similar_step(self, step):
+        """按功能指纹查找与 step 相似的已有步骤，未找到返回 None"""
+        position = self.index.find_similar(step)
+        return self.steps[position] if position != -1 else None
+
+    def get_step(self, key):
+        """按名称获取步骤，未找到返回 None"""
+        index = self.find_step(key)
+        return self.steps[index] if index != -1 else None
+
+    def add_step(self, step, replace=False, index=None):
+        """添加步骤；replace=True 时先移除同名步骤再追加"""
+        key = self.step_key(step)
+        if self.has_step(key):
+            if not replace:
+                print(f"[DEBUG] 步骤 '{key}' 已存在，跳过添加")
+                return False
+            self.remove_step(key)
+        if index is None:
+            step_index = self.index
+            self.steps.append(step)
+            step_index.add(step)
+        else:
+            self.steps.insert(index, step)
+            self._index = None
+        self._record("add_step", key, replace=replace)
+        return True
+
+    def remove_step(self, key):
+        """移除所有同名步骤"""
+        steps = self.steps
+        if key not in self.index.keys:
+            return False
+        steps[:] = [step for step in steps if self.step_key(step) != key]
+        self._index = None
+        self._record("remove_step", key)
+        return True
+
+    def set_steps(self, steps, op="set_steps"):
+        """整体替换步骤列表（用于重排、嵌套修复等），内容未变化时不记录操作"""
+        steps = list(steps)
+        if steps == self.steps:
+            return False
+        self.build_job["steps"] = steps
+        self._index = None
+        self._record(op, None, count=len(steps))
+        return True
+
+    def reorder_steps(self, ordered_steps):
+        """按给定顺序重排步骤"""
+        self.set_steps(ordered_steps, op="reorder")
+
+    def dedupe_steps(self):
+        """按步骤标识去重，保留首次出现的步骤"""
+        seen = set()
+        unique = []
+        for step in self.steps:
+            key = self.step_key(step)
+            if key in seen:
+                print(f"[DEBUG] 移除重复步骤: {key}")
+                continue
+            seen.add(key)
+            unique.append(step)
+        if len(unique) != len(self.steps):
+            self.set_steps(unique, op="dedupe")
+            return True
+        return False
+
+    def set_field(self, path, value):
+        """设置字段，path 可以是顶层键或键路径元组，例如 ("jobs", "build", "runs-on")"""
+        if not isinstance(path, (tuple, list)):
+            path = (path,)
+        if not isinstance(self.data, dict):
+            self.data = {}
+        node = self.data
+        for key in path[:-1]:
+            if not isinstance(node.get(key), dict):
+                node[key] = {}
+            node = node[key]
+        if path[-1] in node and node[path[-1]] == value:
+            return False
+        node[path[-1]] = value
+        self._index = None
+        self._record("set_field", ".".join(str(p) for p in path))
+        return True
+
+    def pop_field(self, key):
+        """移除顶层字段并返回其值"""
+        if not isinstance(self.data, dict) or key not in self.data:
+            return None
+        value = self.data.pop(key)
+        self._index = None
+        self._record("pop_field", str(key))
+        return value
+
+    def replace(self, workflow, reason="replace"):
+        """整体替换工作流内容（重置、DeepSeek 建议等）"""
+        self.data = workflow
+        self.load_error = None
+        self._index = None
+        self._record(reason)
+
+    def snapshot(self):
+        """返回当前内容的深拷贝，用于失败回退"""
+        return copy.deepcopy(self.data)
+
+    def dump(self):
+        """序列化为 YAML 文本，末尾只保留一个换行符"""
+        return yaml.safe_dump(self.data, sort_keys=False, indent=2, allow_unicode=True).rstrip() + "\n"
+
+    def validate(self, content=None):
+        """验证 YAML 文本能否解析，且每个步骤都是包含 'run' 或 'uses' 的字典"""
+        try:
+            content = self.dump() if content is None else content
+            workflow = yaml.safe_load(content)
+        except yaml.YAMLError as e:
+            print(f"[ERROR] YAML 语法错误: {e}")
+            return False
+        if not isinstance(workflow, dict):
+            print("[ERROR] 工作流内容不是字典")
+            return False
+        steps = workflow.get("jobs", {}).get("build", {}).get("steps", []) if isinstance(workflow.get("jobs"), dict) else []
+        for step in steps or []:
+            if not isinstance(step, dict):
+                print(f"[ERROR] 步骤格式无效，必须是字典：{step}")
+                return False
+            if "run" not in step and "uses" not in step:
+                print(f"[ERROR] 步骤缺少必要字段（需要 'run' 或 'uses'）：{step}")
+                return False
+        return True
+
+    def flush(self, force=False):
+        """将所有记录的操作一次性写入磁盘，写入前只验证一次"""
+        if not self.operations and not force:
+            print("[DEBUG] 工作流文档无改动，跳过写入")
+            return True
+        content = self.dump()
+        if not self.validate(content):
+            print(f"[ERROR] 工作流文档验证失败，放弃写入（待写入操作 {len(self.operations)} 个）")
+            return False
+        with open(self.workflow_file, "w") as f:
+            f.write(content)
+        print(f"[DEBUG] 已将 {len(self.operations)} 个操作一次性写入 {self.workflow_file}")
+        self.operations = []
+        return True
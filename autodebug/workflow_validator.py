@@ -1,6 +1,9 @@
+import copy
+import hashlib
 import yaml
 import re
 from autodebug.history import load_fix_history
+from autodebug.workflow_document import WorkflowDocument, step_key
 
 def validate_yaml_syntax(file_path):
     """验证 YAML 文件的语法是否正确"""
@@ -90,51 +93,51 @@ def fix_yaml_nesting(steps, history_data):
             print(f"[DEBUG] 忽略无效步骤: {step}")
     return fixed_steps
 
-def validate_and_fix_debug_yml(workflow_file, default_fixes_applied=None, history_file=None):
-    """验证并修复 debug.yml 的语法错误，确保包含所有必要步骤"""
+def validate_and_fix_debug_yml(workflow_file, default_fixes_applied=None, history_file=None, document=None):
+    """验证并修复 debug.yml 的语法错误，确保包含所有必要步骤
+
+    传入 document 时只在内存中记录修改，由调用方在迭代结束时统一写入；
+    未传入时自行加载文档并在最后写入、验证一次。
+    """
     default_fixes_applied = default_fixes_applied or set()
     history_data = load_fix_history(history_file) if history_file else {"history": [], "step_status": {}}
+    owns_document = document is None
+    if owns_document:
+        document = WorkflowDocument(workflow_file)
 
     try:
-        if not validate_yaml_syntax(workflow_file):
-            print("[DEBUG] 检测到 YAML 语法错误，尝试加载并修复...")
-            with open(workflow_file, "r") as f:
-                content = f.read()
-            workflow_content = None
-            try:
-                workflow_content = yaml.safe_load(content)
-            except yaml.YAMLError:
-                print("[DEBUG] 无法直接加载 YAML，使用默认结构...")
-                workflow_content = {
-                    "name": "WeatherApp CI",
-                    "on": {
-                        "push": {"branches": ["main"]},
-                        "pull_request": {"branches": ["main"]}
-                    },
-                    "permissions": {"contents": "write"},
-                    "jobs": {
-                        "build": {
-                            "runs-on": "Ubuntu-latest",
-                            "steps": [
-                                {"uses": "actions/checkout@v4"},
-                                {
-                                    "name": "Set up JDK 17",
-                                    "uses": "actions/setup-java@v3",
-                                    "with": {
-                                        "distribution": "temurin",
-                                        "java-version": "17"
-                                    }
-                                },
-                                {
-                                    "name": "Set up Python",
-                                    "uses": "actions/setup-python@v5",
-                                    "with": {
-                                        "python-version": "3.10"
-                                    }
-                                },
-                                {
-                                    "name": "Install missing libtinfo package",
-                                    "run": """Ubuntu_version=$(lsb_release -rs)
+        if document.load_error:
+            print("[DEBUG] 检测到 YAML 语法错误，无法直接加载 YAML，使用默认结构...")
+            workflow_content = {
+                "name": "WeatherApp CI",
+                "on": {
+                    "push": {"branches": ["main"]},
+                    "pull_request": {"branches": ["main"]}
+                },
+                "permissions": {"contents": "write"},
+                "jobs": {
+                    "build": {
+                        "runs-on": "Ubuntu-latest",
+                        "steps": [
+                            {"uses": "actions/checkout@v4"},
+                            {
+                                "name": "Set up JDK 17",
+                                "uses": "actions/setup-java@v3",
+                                "with": {
+                                    "distribution": "temurin",
+                                    "java-version": "17"
+                                }
+                            },
+                            {
+                                "name": "Set up Python",
+                                "uses": "actions/setup-python@v5",
+                                "with": {
+                                    "python-version": "3.10"
+                                }
+                            },
+                            {
+                                "name": "Install missing libtinfo package",
+                                "run": """Ubuntu_version=$(lsb_release -rs)
 if [[ "$Ubuntu_version" == "22.04" || "$Ubuntu_version" == "24.04" ]]; then
   sudo apt-get update -y
   sudo apt-get install -y libtinfo6
@@ -142,43 +145,43 @@ else
   sudo apt-get update -y
   sudo apt-get install -y libtinfo5
 fi"""
-                                },
-                                {
-                                    "name": "Install system dependencies",
-                                    "run": """sudo apt-get update -y
+                            },
+                            {
+                                "name": "Install system dependencies",
+                                "run": """sudo apt-get update -y
 sudo apt-get install -y git zip unzip python3-pip autoconf libtool pkg-config
 sudo apt-get install -y zlib1g-dev libncurses5-dev libncursesw5-dev
 sudo apt-get install -y cmake libffi-dev libssl-dev
 sudo apt-get install -y libltdl-dev build-essential python3-dev python3-venv
 sudo apt-get install -y libnss3-dev libnss3-tools"""
-                                },
-                                {
-                                    "name": "Configure pip mirror",
-                                    "run": """pip config set global.index-url https://pypi.org/simple/
+                            },
+                            {
+                                "name": "Configure pip mirror",
+                                "run": """pip config set global.index-url https://pypi.org/simple/
 pip config set global.trusted-host pypi.org"""
-                                },
-                                {
-                                    "name": "Install Python dependencies",
-                                    "run": """python -m pip install --upgrade pip setuptools
+                            },
+                            {
+                                "name": "Install Python dependencies",
+                                "run": """python -m pip install --upgrade pip setuptools
 pip install buildozer==1.5.1 kivy==2.3.1 requests==2.25.1 cython==0.29.36 certifi
 pip install python-for-android"""
-                                },
-                                {
-                                    "name": "Set up Android SDK",
-                                    "uses": "android-actions/setup-android@v3",
-                                    "with": {
-                                        "accept-android-sdk-licenses": True,
-                                        "cmdline-tools-version": "latest",
-                                        "packages": "build-tools;34.0.0 platform-tools platforms;android-34 ndk;25.2.9519653"
-                                    }
-                                },
-                                {
-                                    "name": "Accept Android SDK Licenses",
-                                    "run": """yes | $ANDROID_HOME/cmdline-tools/latest/bin/sdkmanager --licenses || true"""
-                                },
-                                {
-                                    "name": "Download Android NDK with Retry",
-                                    "run": """NDK_URL="https://dl.google.com/android/repository/android-ndk-r25b-linux.zip"
+                            },
+                            {
+                                "name": "Set up Android SDK",
+                                "uses": "android-actions/setup-android@v3",
+                                "with": {
+                                    "accept-android-sdk-licenses": True,
+                                    "cmdline-tools-version": "latest",
+                                    "packages": "build-tools;34.0.0 platform-tools platforms;android-34 ndk;25.2.9519653"
+                                }
+                            },
+                            {
+                                "name": "Accept Android SDK Licenses",
+                                "run": """yes | $ANDROID_HOME/cmdline-tools/latest/bin/sdkmanager --licenses || true"""
+                            },
+                            {
+                                "name": "Download Android NDK with Retry",
+                                "run": """NDK_URL="https://dl.google.com/android/repository/android-ndk-r25b-linux.zip"
 NDK_PATH="$HOME/android-ndk-r25b.zip"
 NDK_INSTALL_DIR="$HOME/.buildozer/android/platform/android-ndk-r25b"
 EXPECTED_MD5="c7e5b3c4b9e7d8f9a1b2c3d4e5f6a7b"  # 替换为实际的 MD5 校验和
@@ -219,10 +222,10 @@ else
 fi
 export ANDROID_NDK_HOME="$NDK_INSTALL_DIR"
 echo "ANDROID_NDK_HOME=$ANDROID_NDK_HOME" >> $GITHUB_ENV"""
-                                },
-                                {
-                                    "name": "Initialize Buildozer",
-                                    "run": """buildozer init
+                            },
+                            {
+                                "name": "Initialize Buildozer",
+                                "run": """buildozer init
 cat << 'EOF' > buildozer.spec
 [app]
 title = WeatherApp
@@ -244,34 +247,34 @@ fullscreen = 0
 log_level = 2
 p4a.branch = master
 EOF"""
-                                },
-                                {
-                                    "name": "Prepare python-for-android",
-                                    "run": """mkdir -p .buildozer/android/platform
+                            },
+                            {
+                                "name": "Prepare python-for-android",
+                                "run": """mkdir -p .buildozer/android/platform
 git clone https://github.com/kivy/python-for-android.git .buildozer/android/platform/python-for-android
 cd .buildozer/android/platform/python-for-android
 git checkout master"""
-                                },
-                                {
-                                    "name": "Set Custom Temp Directory",
-                                    "run": """mkdir -p $HOME/tmp
+                            },
+                            {
+                                "name": "Set Custom Temp Directory",
+                                "run": """mkdir -p $HOME/tmp
 echo "TMPDIR=$HOME/tmp" >> $GITHUB_ENV
 echo "TEMP=$HOME/tmp" >> $GITHUB_ENV
 echo "TMP=$HOME/tmp" >> $GITHUB_ENV
 export TMPDIR=$HOME/tmp
 export TEMP=$HOME/tmp
 export TMP=$HOME/tmp"""
+                            },
+                            {
+                                "name": "Build APK",
+                                "env": {
+                                    "OPENWEATHER_API_KEY": "${{ secrets.OPENWEATHER_API_KEY }}",
+                                    "P4A_RELEASE_KEYALIAS": "${{ secrets.P4A_RELEASE_KEYALIAS }}",
+                                    "P4A_RELEASE_KEYALIAS_PASSWD": "${{ secrets.P4A_RELEASE_KEYALIAS_PASSWD }}",
+                                    "P4A_RELEASE_KEYSTORE": "${{ secrets.P4A_RELEASE_KEYSTORE }}",
+                                    "P4A_RELEASE_KEYSTORE_PASSWD": "${{ secrets.P4A_RELEASE_KEYSTORE_PASSWD }}"
                                 },
-                                {
-                                    "name": "Build APK",
-                                    "env": {
-                                        "OPENWEATHER_API_KEY": "${{ secrets.OPENWEATHER_API_KEY }}",
-                                        "P4A_RELEASE_KEYALIAS": "${{ secrets.P4A_RELEASE_KEYALIAS }}",
-                                        "P4A_RELEASE_KEYALIAS_PASSWD": "${{ secrets.P4A_RELEASE_KEYALIAS_PASSWD }}",
-                                        "P4A_RELEASE_KEYSTORE": "${{ secrets.P4A_RELEASE_KEYSTORE }}",
-                                        "P4A_RELEASE_KEYSTORE_PASSWD": "${{ secrets.P4A_RELEASE_KEYSTORE_PASSWD }}"
-                                    },
-                                    "run": """export CFLAGS="-Wno-error=implicit-function-declaration -Wno-error=array-bounds -Wno-error=deprecated-declarations"
+                                "run": """export CFLAGS="-Wno-error=implicit-function-declaration -Wno-error=array-bounds -Wno-error=deprecated-declarations"
 export CPPFLAGS="-D_GNU_SOURCE -D_DEFAULT_SOURCE -D_XOPEN_SOURCE=700"
 export LDFLAGS="-lnsl -lresolv -lgssapi_krb5"
 buildozer android clean
@@ -280,11 +283,11 @@ if [ ${PIPESTATUS[0]} -ne 0 ]; then
   cat build.log
   exit 1
 fi"""
-                                },
-                                {
-                                    "name": "Verify Build Log",
-                                    "if": "always()",
-                                    "run": """if [ -f build.log ]; then
+                            },
+                            {
+                                "name": "Verify Build Log",
+                                "if": "always()",
+                                "run": """if [ -f build.log ]; then
   echo "Build log exists, checking for errors..."
   if grep -q -E "ERROR:|FAILED" build.log; then
     echo "Errors found in build log:"
@@ -297,36 +300,35 @@ else
   echo "No build log found"
   exit 1
 fi"""
-                                },
-                                {
-                                    "name": "Save Build Log",
-                                    "if": "always()",
-                                    "uses": "actions/upload-artifact@v4",
-                                    "with": {
-                                        "name": "build-log",
-                                        "path": "build.log",
-                                        "retention-days": 1
-                                    }
-                                },
-                                {
-                                    "name": "Upload APK",
-                                    "if": "success()",
-                                    "uses": "actions/upload-artifact@v4",
-                                    "with": {
-                                        "if-no-files-found": "error",
-                                        "name": "weatherapp-apk",
-                                        "path": "bin/weatherapp-*.apk",
-                                        "retention-days": 1
-                                    }
+                            },
+                            {
+                                "name": "Save Build Log",
+                                "if": "always()",
+                                "uses": "actions/upload-artifact@v4",
+                                "with": {
+                                    "name": "build-log",
+                                    "path": "build.log",
+                                    "retention-days": 1
                                 }
-                            ]
-                        }
+                            },
+                            {
+                                "name": "Upload APK",
+                                "if": "success()",
+                                "uses": "actions/upload-artifact@v4",
+                                "with": {
+                                    "if-no-files-found": "error",
+                                    "name": "weatherapp-apk",
+                                    "path": "bin/weatherapp-*.apk",
+                                    "retention-days": 1
+                                }
+                            }
+                        ]
                     }
                 }
-        
+            }
+            document.replace(workflow_content, reason="reset")
         else:
-            with open(workflow_file, "r") as f:
-                workflow_content = yaml.safe_load(f)
+            workflow_content = document.data
 
         print(f"[DEBUG] 原始 workflow_content: {workflow_content}")
 
@@ -550,20 +552,21 @@ fi"""
                     }
                 }
             }
+            document.replace(workflow_content, reason="reset")
 
-        if not workflow_content["jobs"]["build"].get("runs-on"):
+        if not document.build_job.get("runs-on"):
             print("[ERROR] debug.yml 的 build 作业缺少 runs-on，设置为默认值")
-            workflow_content["jobs"]["build"]["runs-on"] = "Ubuntu-latest"
+            document.set_field(("jobs", "build", "runs-on"), "Ubuntu-latest")
         valid_runners = ["Ubuntu-latest", "Ubuntu-22.04", "Ubuntu-20.04"]
-        runs_on = workflow_content["jobs"]["build"].get("runs-on", "").lower()
+        runs_on = document.build_job.get("runs-on", "").lower()
         if runs_on not in [r.lower() for r in valid_runners]:
             print(f"[WARNING] runs-on: {runs_on} 可能无效，强制设置为 Ubuntu-latest")
-            workflow_content["jobs"]["build"]["runs-on"] = "Ubuntu-latest"
+            document.set_field(("jobs", "build", "runs-on"), "Ubuntu-latest")
 
-        steps = workflow_content["jobs"]["build"].get("steps", [])
+        steps = document.build_job.get("steps", [])
         if not steps:
             print("[ERROR] debug.yml 的 steps 列表为空，添加必要步骤")
-            workflow_content["jobs"]["build"]["steps"] = [
+            document.set_steps([
                 {"uses": "actions/checkout@v4"},
                 {
                     "name": "Set up JDK 17",
@@ -767,11 +770,11 @@ fi"""
                         "retention-days": 1
                     }
                 }
-            ]
+            ], op="default_steps")
 
         # 验证每个步骤的格式，允许 'uses' 步骤没有 'name'
         validated_steps = []
-        for step in workflow_content["jobs"]["build"]["steps"]:
+        for step in document.steps:
             if not isinstance(step, dict):
                 print(f"[DEBUG] 忽略无效步骤（非字典对象）: {step}")
                 continue
@@ -782,7 +785,7 @@ fi"""
                 print(f"[DEBUG] 忽略无效步骤（缺少 'run' 或 'uses' 字段）：{step}")
                 continue
 
-        workflow_content["jobs"]["build"]["steps"] = fix_yaml_nesting(validated_steps, history_data)
+        document.set_steps(fix_yaml_nesting(validated_steps, history_data), op="fix_nesting")
 
         # 确保 steps 包含所有必要步骤
         required_steps = [
@@ -804,8 +807,7 @@ fi"""
             "Save Build Log",
             "Upload APK"
         ]
-        current_steps = [step.get("uses", step.get("name", "unnamed")) for step in workflow_content["jobs"]["build"]["steps"]]
-        missing_steps = [step for step in required_steps if step not in current_steps]
+        missing_steps = [step for step in required_steps if not document.has_step_for(step)]
         if missing_steps:
             print(f"[DEBUG] 检测到缺少必要步骤: {missing_steps}，自动补充...")
             full_steps = [
@@ -1014,42 +1016,44 @@ fi"""
                 }
             ]
             # 保留已有的非必要步骤（如 Initial Trigger Step）
-            for step in workflow_content["jobs"]["build"]["steps"]:
+            required_index = set(required_steps)
+            for step in document.steps:
                 step_name = step.get("name", step.get("uses", "unnamed"))
-                if step_name not in required_steps:
+                if step_name not in required_index:
                     full_steps.append(step)
-            workflow_content["jobs"]["build"]["steps"] = fix_yaml_nesting(full_steps, history_data)
+            document.set_steps(fix_yaml_nesting(full_steps, history_data), op="add_required_steps")
 
+        workflow_content = document.data
         if True in workflow_content or "true" in workflow_content:
             print("[DEBUG] 发现 debug.yml 中存在 'true:' 语法错误，修复为 'on:'")
-            true_field = workflow_content.pop(True, None) or workflow_content.pop("true", None)
+            true_field = document.pop_field(True) or document.pop_field("true")
             if true_field:
                 if isinstance(true_field, list):
                     print("[DEBUG] 'true:' 字段为列表形式，转换为标准格式")
                     new_on = {}
                     for trigger in true_field:
                         new_on[trigger] = {"branches": ["main"]}
-                    workflow_content["on"] = new_on
+                    document.set_field("on", new_on)
                 else:
-                    workflow_content["on"] = {
+                    document.set_field("on", {
                         "push": {"branches": ["main"]},
                         "pull_request": {"branches": ["main"]}
-                    }
+                    })
             else:
                 print("[DEBUG] 未成功提取 true 字段，强制添加 on 字段")
-                workflow_content["on"] = {
+                document.set_field("on", {
                     "push": {"branches": ["main"]},
                     "pull_request": {"branches": ["main"]}
-                }
+                })
 
         if "on" not in workflow_content or not workflow_content["on"]:
             print("[DEBUG] debug.yml 中缺少有效的 'on' 字段，添加默认触发器")
-            workflow_content["on"] = {
+            document.set_field("on", {
                 "push": {"branches": ["main"]},
                 "pull_request": {"branches": ["main"]}
-            }
+            })
         else:
-            on_field = workflow_content["on"]
+            on_field = copy.deepcopy(workflow_content["on"])
             if isinstance(on_field, list):
                 print("[DEBUG] 检测到 on 字段的简写格式，转换为标准格式")
                 new_on = {}
@@ -1071,44 +1075,440 @@ fi"""
             for trigger in on_field:
                 if not isinstance(on_field[trigger], dict):
                     on_field[trigger] = {"branches": ["main"]}
-            workflow_content["on"] = on_field
+            document.set_field("on", on_field)
 
         if "permissions" not in workflow_content or workflow_content["permissions"] != {"contents": "write"}:
             print("[DEBUG] 添加或更新 debug.yml 的 permissions 为 contents: write")
-            workflow_content["permissions"] = {"contents": "write"}
+            document.set_field("permissions", {"contents": "write"})
 
-        with open(workflow_file, "w") as f:
-            yaml.safe_dump(workflow_content, f, sort_keys=False, indent=2, allow_unicode=True)
-        print("[DEBUG] 已修复 debug.yml 语法")
+        consolidate_package_installs(document)
+        optimize_workflow_caching(document)
 
-        if not validate_yaml_syntax(workflow_file):
-            print("[ERROR] 修复后的 debug.yml 仍存在语法错误，停止程序")
-            with open(workflow_file, "r") as f:
-                content = f.read()
-            print(f"[DEBUG] 修复后的 debug.yml 内容:\n{content}")
-            raise Exception("修复后的 debug.yml 语法错误")
+        if owns_document:
+            if not document.flush():
+                print("[ERROR] 修复后的 debug.yml 仍存在语法错误，停止程序")
+                print(f"[DEBUG] 修复后的 debug.yml 内容:\n{document.dump()}")
+                raise Exception("修复后的 debug.yml 语法错误")
+            print("[DEBUG] 已修复 debug.yml 语法")
+        else:
+            print(f"[DEBUG] debug.yml 修复已记录到工作流文档，待写入操作 {len(document.operations)} 个")
 
-        print(f"[DEBUG] 修复后的 workflow_content: {workflow_content}")
+        print(f"[DEBUG] 修复后的 workflow_content: {document.data}")
         return True
     except Exception as e:
         print(f"[ERROR] 验证并修复 debug.yml 失败: {e}")
         return False
 
-def clean_workflow(workflow_file, default_fixes_applied):
+def clean_workflow(workflow_file, default_fixes_applied, document=None):
     """清理工作流文件中的错误字段（已整合到 validate_and_fix_debug_yml）"""
-    return validate_and_fix_debug_yml(workflow_file, default_fixes_applied)
+    return validate_and_fix_debug_yml(workflow_file, default_fixes_applied, document=document)
 
-def ensure_on_field(workflow_file):
+def ensure_on_field(workflow_file, document=None):
     """确保工作流文件包含有效的 on 字段（已整合到 validate_and_fix_debug_yml）"""
-    return validate_and_fix_debug_yml(workflow_file)
+    return validate_and_fix_debug_yml(workflow_file, document=document)
 
-def save_workflow(workflow, workflow_file):
-    """保存工作流文件（已整合到 validate_and_fix_debug_yml）"""
+def save_workflow(workflow, workflow_file, document=None):
+    """保存工作流文件；传入 document 时只记录替换操作，由调用方统一写入"""
     try:
-        with open(workflow_file, "w") as f:
-            yaml.dump(workflow, f, sort_keys=False, indent=2, allow_unicode=True)
+        if document is not None:
+            document.replace(workflow, reason="save_workflow")
+            print("[DEBUG] workflow 已记录到工作流文档，待统一写入")
+            return True
+        document = WorkflowDocument(workflow_file, data=workflow)
+        if not document.flush(force=True):
+            return False
         print("[DEBUG] workflow 已保存到 debug.yml")
         return True
     except Exception as e:
         print(f"[ERROR] 保存 workflow 失败: {e}")
-        return False
\ No newline at end of file
+        return False
+CACHE_ACTION = "actions/cache@v4"
+CACHE_PIP = "Cache pip packages"
+CACHE_NDK = "Cache Android NDK"
+CACHE_BUILDOZER = "Cache Buildozer"
+CACHE_GRADLE = "Cache Gradle"
+# 由 optimize_workflow_caching 维护的缓存步骤，每次按当前工作流重新生成
+MANAGED_CACHE_STEPS = {CACHE_PIP, CACHE_NDK, CACHE_BUILDOZER, CACHE_GRADLE}
+NDK_GUARD_MARKER = "# NDK 已由缓存恢复时跳过下载"
+PIP_INSTALL = re.compile(r"\bpip3?\s+install\b")
+BUILDOZER_COMMAND = re.compile(r"^\s*buildozer\b", re.MULTILINE)
+NDK_URL = re.compile(r"https?://\S*?(android-ndk-[\w.-]+?)\.zip")
+# NDK 解压目录变量，例如 NDK_INSTALL_DIR="$HOME/.buildozer/android/platform/android-ndk-r25b"
+NDK_DIRECTORY = re.compile(r'^(?P<indent>\s*)(?P<var>\w+)="(?P<path>[^"]*/android-ndk-[\w.-]*[\w-])"\s*$', re.MULTILINE)
+
+def _run_text(step):
+    run = step.get("run") if isinstance(step, dict) else None
+    return run if isinstance(run, str) else ""
+
+def _digest(*parts):
+    return hashlib.sha1("\n".join(parts).encode("utf-8")).hexdigest()[:12]
+
+def _first_index(steps, predicate):
+    return next((i for i, step in enumerate(steps) if predicate(step)), -1)
+
+def _cache_step(name, paths, key, restore_prefix=None):
+    step = {"name": name, "uses": CACHE_ACTION, "with": {"path": "\n".join(paths), "key": key}}
+    if restore_prefix:
+        step["with"]["restore-keys"] = restore_prefix
+    return step
+
+def _is_ndk_download(step):
+    run = _run_text(step)
+    return bool(NDK_URL.search(run)) and re.search(r"\b(?:curl|wget)\b", run) is not None
+
+def _ndk_directory(run):
+    """NDK 解压目录的变量定义（跳过下载地址与 zip 文件路径），未找到返回 None"""
+    for match in NDK_DIRECTORY.finditer(run):
+        path = match.group("path")
+        if "://" not in path and not path.endswith(".zip"):
+            return match
+    return None
+
+def _home_path(path):
+    return path.replace("${HOME}", "~").replace("$HOME", "~")
+
+def _targets_ndk_path(step, ndk_path):
+    """NDK 下载步骤是否解压到缓存的目录：按目录变量比较；没有目录变量时按下载的 NDK 版本比较"""
+    if not _is_ndk_download(step):
+        return False
+    run = _run_text(step)
+    directory = _ndk_directory(run)
+    if directory:
+        return _home_path(directory.group("path")) == ndk_path
+    archive = NDK_URL.search(run).group(1)
+    directory_name = ndk_path.rstrip("/").rsplit("/", 1)[-1]
+    # 压缩包名形如 android-ndk-r25b-linux，解压得到 android-ndk-r25b
+    return archive == directory_name or archive.startswith(directory_name + "-")
+
+def _guard_ndk_download(step, ndk_path):
+    """NDK 目录已存在（缓存命中）时直接导出 ANDROID_NDK_HOME 并跳过下载；已有保护时原样返回。
+
+    保护插在目录变量定义之后；没有目录变量的步骤在脚本开头按缓存路径判断。
+    """
+    run = _run_text(step)
+    if NDK_GUARD_MARKER in run:
+        return step
+    match = _ndk_directory(run)
+    if match:
+        indent, directory, position = match.group("indent"), "$" + match.group("var"), match.end()
+    else:
+        indent = run[:len(run) - len(run.lstrip(" "))]
+        directory = ndk_path.replace("~", "$HOME", 1) if ndk_path.startswith("~") else ndk_path
+        position = None
+    guard = "\n".join(indent + line for line in [
+        f'if [ -d "{directory}" ]; then  {NDK_GUARD_MARKER}',
+        f'  echo "NDK 已从缓存恢复：{directory}"',
+        f'  echo "ANDROID_NDK_HOME={directory}" >> $GITHUB_ENV',
+        "  exit 0",
+        "fi"
+    ])
+    guarded = dict(step)
+    guarded["run"] = guard + "\n" + run if position is None else run[:position] + "\n" + guard + run[position:]
+    return guarded
+
+def _unguarded_ndk_downloads(steps, ndk_path):
+    """仍会下载到缓存目录、却没有缓存命中保护的步骤名"""
+    return [step_key(step) for step in steps
+            if _targets_ndk_path(step, ndk_path) and NDK_GUARD_MARKER not in _run_text(step)]
+
+def optimize_workflow_caching(document):
+    """为耗时且结果可复用的步骤加入 actions/cache 缓存：pip、NDK、~/.buildozer 与 ~/.gradle。
+
+    缓存键取自工作流中的版本信息（pip 安装命令、NDK 下载地址、buildozer.spec 内容）的哈希，
+    缓存步骤插在第一个使用它的步骤之前；所有下载到缓存目录的 NDK 步骤都加入命中缓存时跳过的保护。
+    重复执行结果不变，修改后用 validate 验证，验证失败时回退。返回是否有修改。
+    """
+    if document.data is None:
+        return False
+    original = document.snapshot()
+    steps = [step for step in document.steps
+             if not (isinstance(step, dict) and step.get("uses") == CACHE_ACTION and step.get("name") in MANAGED_CACHE_STEPS)]
+    runs = [_run_text(step) for step in steps]
+    pip_lines = [line.strip() for run in runs for line in run.splitlines() if PIP_INSTALL.search(line)]
+    spec_runs = [run for run in runs if "buildozer.spec" in run]
+    buildozer_digest = _digest(*(spec_runs + [line for line in pip_lines if "buildozer" in line]))
+
+    insertions = []  # (插入位置, 缓存步骤)
+    pip_index = _first_index(steps, lambda step: PIP_INSTALL.search(_run_text(step)) is not None)
+    if pip_index != -1:
+        insertions.append((pip_index, _cache_step(
+            CACHE_PIP, ["~/.cache/pip"], "${{ runner.os }}-pip-" + _digest(*pip_lines), "${{ runner.os }}-pip-")))
+
+    ndk_index = _first_index(steps, _is_ndk_download)
+    ndk_excluded = []
+    if ndk_index != -1:
+        run = runs[ndk_index]
+        directory = _ndk_directory(run)
+        if directory:
+            ndk_path = _home_path(directory.group("path"))
+            ndk_version = NDK_URL.search(run).group(1)
+            insertions.append((ndk_index, _cache_step(CACHE_NDK, [ndk_path], "${{ runner.os }}-" + ndk_version)))
+            # 缓存命中后，任何一个下载到同一目录的步骤都不能再重新下载
+            steps = [_guard_ndk_download(step, ndk_path) if _targets_ndk_path(step, ndk_path) else step for step in steps]
+            unguarded = _unguarded_ndk_downloads(steps, ndk_path)
+            if unguarded:
+                print(f"[ERROR] 以下 NDK 下载步骤未能加入缓存命中保护，放弃缓存优化: {unguarded}")
+                return False
+            if ndk_path.startswith("~/.buildozer/"):
+                # NDK 单独缓存，~/.buildozer 的缓存不再重复保存
+                ndk_excluded.append("!" + ndk_path)
+
+    buildozer_index = _first_index(steps, lambda step: BUILDOZER_COMMAND.search(_run_text(step)) is not None)
+    if buildozer_index != -1:
+        insertions.append((buildozer_index, _cache_step(
+            CACHE_BUILDOZER, ["~/.buildozer"] + ndk_excluded,
+            "${{ runner.os }}-buildozer-" + buildozer_digest, "${{ runner.os }}-buildozer-")))
+        insertions.append((buildozer_index, _cache_step(
+            CACHE_GRADLE, ["~/.gradle/caches", "~/.gradle/wrapper"],
+            "${{ runner.os }}-gradle-" + buildozer_digest, "${{ runner.os }}-gradle-")))
+
+    # 从后往前插入，保证前面的位置不受影响；同一位置按添加顺序排列
+    for position, cache_step in reversed(sorted(insertions, key=lambda item: item[0])):
+        steps.insert(position, cache_step)
+    if not document.set_steps(steps, op="optimize_caching"):
+        print("[DEBUG] 缓存步骤已是最新，无需优化")
+        return False
+    if not document.validate():
+        print("[ERROR] 加入缓存步骤后工作流验证失败，回退")
+        document.replace(original, reason="revert_optimize_caching")
+        return False
+    print(f"[DEBUG] 已更新缓存步骤: {', '.join(cache_step['name'] for _, cache_step in insertions)}")
+    return True
+
+APT_COMMAND = re.compile(r"^(?P<sudo>sudo\s+)?apt(?:-get)?\s+(?P<args>.+)$")
+PIP_COMMAND = re.compile(r"^(?P<prefix>(?:python3?\s+-m\s+)?pip3?)\s+install\s+(?P<args>.+)$")
+# 含这些字符的命令（管道、重定向、变量、命令替换等）不做合并
+SHELL_SYNTAX = re.compile(r"[;&|<>`(){}$\\*?\[\]\"']")
+SIMPLE_APT_FLAGS = ("-y", "--yes", "-q", "-qq", "--quiet")
+# 修改软件源的命令之后安装的包不能提前，合并在此处截止
+APT_SOURCE_CHANGE = re.compile(r"add-apt-repository|sources\.list|apt-key|dpkg\s+--add-architecture")
+BLOCK_OPEN = re.compile(r"^(?:if|for|while|until|case)\b")
+BLOCK_CLOSE = re.compile(r"^(?:fi|done|esac)\b")
+BLOCK_KEYWORD = re.compile(r"^(?:fi|done|esac|else|elif|then|do|;;)\b")
+HEREDOC = re.compile(r"<<-?\s*['\"]?(\w+)['\"]?")
+# 预计节省时间：每次 apt-get update 约 15 秒，每次额外的 install 调用（依赖解析、dpkg 触发器）约 3 秒
+APT_UPDATE_SECONDS = 15
+INSTALL_INVOCATION_SECONDS = 3
+PACKAGES_PER_LINE = 8
+
+def _script_commands(run):
+    """把 run 脚本拆成命令：合并续行，跳过 heredoc 内容，记录起止行号、缩进与 if/for 等块的嵌套深度"""
+    lines = run.split("\n")
+    commands = []
+    depth = 0
+    heredoc = None
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if heredoc is not None:
+            if line.strip() == heredoc:
+                heredoc = None
+            i += 1
+            continue
+        first = i
+        text = line.strip()
+        while text.endswith("\\") and i + 1 < len(lines):
+            i += 1
+            text = text[:-1].rstrip() + " " + lines[i].strip()
+        stripped_comment = re.sub(r"\s+#.*$", "", text) if not text.startswith("#") else ""
+        if BLOCK_CLOSE.match(text):
+            depth = max(0, depth - 1)
+        if stripped_comment:
+            commands.append({"first": first, "last": i, "text": stripped_comment, "depth": depth,
+                             "indent": line[:len(line) - len(line.lstrip())]})
+        if BLOCK_OPEN.match(text) and not re.search(r"\b(?:fi|done|esac)\s*$", stripped_comment):
+            depth += 1
+        match = HEREDOC.search(stripped_comment)
+        if match:
+            heredoc = match.group(1)
+        i += 1
+    return commands
+
+def _parse_apt(text):
+    """简单的 apt-get update/install 命令返回 (操作, 选项, 软件包, 是否 sudo)，其他命令返回 None"""
+    match = APT_COMMAND.match(text)
+    if not match or SHELL_SYNTAX.search(text):
+        return None
+    args = match.group("args").split()
+    actions = [arg for arg in args if not arg.startswith("-")]
+    flags = [arg for arg in args if arg.startswith("-")]
+    if not actions or actions[0] not in ("update", "install") or any(flag not in SIMPLE_APT_FLAGS for flag in flags):
+        return None
+    if actions[0] == "update" and len(actions) > 1:
+        return None
+    return actions[0], flags, actions[1:], bool(match.group("sudo"))
+
+def _parse_pip(text):
+    """不带选项的 pip install 命令返回 (命令前缀, 软件包)，其他命令返回 None"""
+    match = PIP_COMMAND.match(text)
+    if not match or SHELL_SYNTAX.search(text.replace("==", "").replace(">=", "").replace("<=", "")):
+        return None
+    packages = match.group("args").split()
+    if any(package.startswith("-") for package in packages):
+        return None
+    return match.group("prefix"), packages
+
+def _package_name(requirement):
+    return re.split(r"[=<>!~\[]", requirement, 1)[0].lower().replace("_", "-")
+
+def _wrap_command(indent, command, packages):
+    """按每行 PACKAGES_PER_LINE 个包换行，续行多缩进两格"""
+    chunks = [packages[i:i + PACKAGES_PER_LINE] for i in range(0, len(packages), PACKAGES_PER_LINE)] or [[]]
+    lines = [f"{indent}{command} {' '.join(chunks[0])}".rstrip()]
+    lines += [f"{indent}  {' '.join(chunk)}" for chunk in chunks[1:]]
+    return " \\\n".join(lines).split("\n")
+
+def _removable_nested(lines, command):
+    """块内的单行命令只有在同一块中还有其他命令时才删除，避免留下空的 then/else 分支"""
+    if command["first"] != command["last"]:
+        return False
+    for j in (command["first"] - 1, command["first"] + 1):
+        if 0 <= j < len(lines):
+            neighbour = lines[j]
+            if neighbour.strip() and neighbour[:len(neighbour) - len(neighbour.lstrip())] == command["indent"] \
+                    and not BLOCK_KEYWORD.match(neighbour.strip()) and not neighbour.strip().startswith("#"):
+                return True
+    return False
+
+def consolidate_package_installs(document):
+    """合并各步骤 run 脚本中的 apt-get update/install 与 pip install。
+
+    - 所有 apt-get update 合并为一次，放在第一个涉及 apt 的步骤中、第一条 apt 命令之前；没有可删除的 update 时不调整
+    - 顶层（不在 if/for 等块中）的 apt-get install 合并、去重为一次调用，放在第一条 install 的位置；
+      块中的条件安装保持不变；修改软件源的步骤及之后的步骤不参与合并；被删除的命令前紧挨的注释行一并删除
+    - 不带选项的 pip install 按出现顺序合并，遇到带选项的 pip 命令（如 --upgrade）分段，同名包版本不一致时不合并
+    已是合并结果时返回 None，否则返回报告（含预计每次运行节省的秒数）。
+    """
+    if document.data is None:
+        return None
+    original = document.snapshot()
+    steps = document.steps
+    candidates = []
+    for index, step in enumerate(steps):
+        run = _run_text(step)
+        if APT_SOURCE_CHANGE.search(run):
+            break
+        if run:
+            candidates.append((index, run.split("\n"), _script_commands(run)))
+
+    # 每个步骤的修改：replace 为 首行号 -> (末行号, 替换行)，insert 为 行号 -> 插在该行之前的行
+    replace = {index: {} for index, _, _ in candidates}
+    insert = {index: {} for index, _, _ in candidates}
+    report = {"apt_updates": 0, "apt_installs": 0, "pip_installs": 0, "duplicate_packages": 0,
+              "invocations_removed": 0, "estimated_seconds": 0}
+
+    apt_commands = [(index, lines, command, _parse_apt(command["text"]))
+                    for index, lines, commands in candidates for command in commands
+                    if APT_COMMAND.match(command["text"])]
+    updates = [item for item in apt_commands if item[3] and item[3][0] == "update"]
+    installs = [item for item in apt_commands if item[3] and item[3][0] == "install" and item[2]["depth"] == 0]
+    sudo = "sudo " if any(item[3][3] for item in updates + installs) else ""
+    if len(updates) > 1 or (updates and updates[0] is not apt_commands[0]):
+        removable = [item for item in updates if item[2]["depth"] == 0 or _removable_nested(item[1], item[2])]
+    else:
+        removable = []
+    # 所有 update 都在块中无法删除时不再额外插入一次 update
+    if removable:
+        for index, _, command, _ in removable:
+            replace[index][command["first"]] = (command["last"], [])
+        first_index, _, first_command, _ = apt_commands[0]
+        anchor, indent = (first_command["first"], first_command["indent"]) if first_command["depth"] == 0 else (0, "")
+        insert[first_index].setdefault(anchor, []).append(f"{indent}{sudo}apt-get update -y")
+        removed = len(removable) - 1
+        report["apt_updates"] = len(updates)
+        report["invocations_removed"] += removed
+        report["estimated_seconds"] += removed * APT_UPDATE_SECONDS
+    if len(installs) > 1:
+        packages, flags, seen = [], ["-y"], set()
+        for _, _, _, (_, install_flags, install_packages, _) in installs:
+            flags += [flag for flag in install_flags if flag not in flags and flag != "--yes"]
+            for package in install_packages:
+                if package in seen:
+                    report["duplicate_packages"] += 1
+                    continue
+                seen.add(package)
+                packages.append(package)
+        for position, (index, _, command, _) in enumerate(installs):
+            merged = _wrap_command(command["indent"], f"{sudo}apt-get install {' '.join(flags)}", packages)
+            replace[index][command["first"]] = (command["last"], merged if position == 0 else [])
+        report["apt_installs"] = len(installs)
+        report["invocations_removed"] += len(installs) - 1
+        report["estimated_seconds"] += (len(installs) - 1) * INSTALL_INVOCATION_SECONDS
+
+    # pip：按带选项的 pip 命令（如 --upgrade）分段，段内合并
+    segments, current = [], []
+    for index, _, commands in candidates:
+        for command in commands:
+            if command["depth"] != 0 or not PIP_COMMAND.match(command["text"]):
+                continue
+            parsed = _parse_pip(command["text"])
+            if parsed is None:
+                segments.append(current)
+                current = []
+            else:
+                current.append((index, command, parsed))
+    segments.append(current)
+    for segment in segments:
+        if len(segment) < 2:
+            continue
+        requirements, packages = {}, []
+        conflict = False
+        for _, _, (_, segment_packages) in segment:
+            for package in segment_packages:
+                name = _package_name(package)
+                if name in requirements:
+                    conflict = conflict or requirements[name] != package
+                    report["duplicate_packages"] += 1
+                    continue
+                requirements[name] = package
+                packages.append(package)
+        if conflict:
+            print(f"[WARNING] pip 安装中同一软件包的版本要求不一致，跳过合并: {[item[1]['text'] for item in segment]}")
+            continue
+        for position, (index, command, (prefix, _)) in enumerate(segment):
+            merged = _wrap_command(command["indent"], f"{prefix} install", packages)
+            replace[index][command["first"]] = (command["last"], merged if position == 0 else [])
+        report["pip_installs"] += len(segment)
+        report["invocations_removed"] += len(segment) - 1
+        report["estimated_seconds"] += (len(segment) - 1) * INSTALL_INVOCATION_SECONDS
+
+    new_steps = list(steps)
+    for index, lines, _ in candidates:
+        if not replace[index] and not insert[index]:
+            continue
+        result = []
+        i = 0
+        while i < len(lines):
+            result.extend(insert[index].get(i, []))
+            if i in replace[index]:
+                last, replacement = replace[index][i]
+                # 删除的命令连同紧挨在它前面的注释行（连续多行时一并）删除
+                j = i - 1
+                while not replacement and j >= 0 and lines[j].strip().startswith("#") and result and result[-1] is lines[j]:
+                    result.pop()
+                    j -= 1
+                result.extend(replacement)
+                i = last + 1
+            else:
+                result.append(lines[i])
+                i += 1
+        new_run = "\n".join(result)
+        if not _script_commands(new_run):
+            new_run = f'echo "{step_key(steps[index])}: 软件包已合并到前面的步骤统一安装"'
+        if new_run != lines and new_run != "\n".join(lines):
+            step = dict(steps[index])
+            step["run"] = new_run
+            new_steps[index] = step
+
+    if new_steps == steps:
+        print("[DEBUG] 软件包安装已是合并结果，无需调整")
+        return None
+    document.set_steps(new_steps, op="consolidate_installs")
+    if not document.validate():
+        print("[ERROR] 合并软件包安装后工作流验证失败，回退")
+        document.replace(original, reason="revert_consolidate_installs")
+        return None
+    print(f"[INFO] 合并软件包安装: apt-get update {report['apt_updates']} 次, apt-get install {report['apt_installs']} 次, "
+          f"pip install {report['pip_installs']} 次，共减少 {report['invocations_removed']} 次调用，"
+          f"去除重复软件包 {report['duplicate_packages']} 个，预计每次运行节省约 {report['estimated_seconds']} 秒")
+    return report
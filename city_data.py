@@ -0,0 +1,366 @@
+# 内置城市词典：城市名,省份,拼音（音节以空格分隔，用于生成全拼与首字母索引）
+# 覆盖直辖市、地级市、自治州首府及部分常用县级市
+CITY_DATA = """
+北京,北京,bei jing
+上海,上海,shang hai
+天津,天津,tian jin
+重庆,重庆,chong qing
+石家庄,河北,shi jia zhuang
+唐山,河北,tang shan
+秦皇岛,河北,qin huang dao
+邯郸,河北,han dan
+邢台,河北,xing tai
+保定,河北,bao ding
+张家口,河北,zhang jia kou
+承德,河北,cheng de
+沧州,河北,cang zhou
+廊坊,河北,lang fang
+衡水,河北,heng shui
+太原,山西,tai yuan
+大同,山西,da tong
+阳泉,山西,yang quan
+长治,山西,chang zhi
+晋城,山西,jin cheng
+朔州,山西,shuo zhou
+晋中,山西,jin zhong
+运城,山西,yun cheng
+忻州,山西,xin zhou
+临汾,山西,lin fen
+吕梁,山西,lv liang
+呼和浩特,内蒙古,hu he hao te
+包头,内蒙古,bao tou
+乌海,内蒙古,wu hai
+赤峰,内蒙古,chi feng
+通辽,内蒙古,tong liao
+鄂尔多斯,内蒙古,e er duo si
+呼伦贝尔,内蒙古,hu lun bei er
+巴彦淖尔,内蒙古,ba yan nao er
+乌兰察布,内蒙古,wu lan cha bu
+乌兰浩特,内蒙古,wu lan hao te
+锡林浩特,内蒙古,xi lin hao te
+沈阳,辽宁,shen yang
+大连,辽宁,da lian
+鞍山,辽宁,an shan
+抚顺,辽宁,fu shun
+本溪,辽宁,ben xi
+丹东,辽宁,dan dong
+锦州,辽宁,jin zhou
+营口,辽宁,ying kou
+阜新,辽宁,fu xin
+辽阳,辽宁,liao yang
+盘锦,辽宁,pan jin
+铁岭,辽宁,tie ling
+朝阳,辽宁,chao yang
+葫芦岛,辽宁,hu lu dao
+长春,吉林,chang chun
+吉林,吉林,ji lin
+四平,吉林,si ping
+辽源,吉林,liao yuan
+通化,吉林,tong hua
+白山,吉林,bai shan
+松原,吉林,song yuan
+白城,吉林,bai cheng
+延吉,吉林,yan ji
+哈尔滨,黑龙江,ha er bin
+齐齐哈尔,黑龙江,qi qi ha er
+鸡西,黑龙江,ji xi
+鹤岗,黑龙江,he gang
+双鸭山,黑龙江,shuang ya shan
+大庆,黑龙江,da qing
+伊春,黑龙江,yi chun
+佳木斯,黑龙江,jia mu si
+七台河,黑龙江,qi tai he
+牡丹江,黑龙江,mu dan jiang
+黑河,黑龙江,hei he
+绥化,黑龙江,sui hua
+漠河,黑龙江,mo he
+南京,江苏,nan jing
+无锡,江苏,wu xi
+徐州,江苏,xu zhou
+常州,江苏,chang zhou
+苏州,江苏,su zhou
+南通,江苏,nan tong
+连云港,江苏,lian yun gang
+淮安,江苏,huai an
+盐城,江苏,yan cheng
+扬州,江苏,yang zhou
+镇江,江苏,zhen jiang
+泰州,江苏,tai zhou
+宿迁,江苏,su qian
+昆山,江苏,kun shan
+江阴,江苏,jiang yin
+杭州,浙江,hang zhou
+宁波,浙江,ning bo
+温州,浙江,wen zhou
+嘉兴,浙江,jia xing
+湖州,浙江,hu zhou
+绍兴,浙江,shao xing
+金华,浙江,jin hua
+衢州,浙江,qu zhou
+舟山,浙江,zhou shan
+台州,浙江,tai zhou
+丽水,浙江,li shui
+义乌,浙江,yi wu
+合肥,安徽,he fei
+芜湖,安徽,wu hu
+蚌埠,安徽,beng bu
+淮南,安徽,huai nan
+马鞍山,安徽,ma an shan
+淮北,安徽,huai bei
+铜陵,安徽,tong ling
+安庆,安徽,an qing
+黄山,安徽,huang shan
+滁州,安徽,chu zhou
+阜阳,安徽,fu yang
+宿州,安徽,su zhou
+六安,安徽,lu an
+亳州,安徽,bo zhou
+池州,安徽,chi zhou
+宣城,安徽,xuan cheng
+福州,福建,fu zhou
+厦门,福建,xia men
+莆田,福建,pu tian
+三明,福建,san ming
+泉州,福建,quan zhou
+漳州,福建,zhang zhou
+南平,福建,nan ping
+龙岩,福建,long yan
+宁德,福建,ning de
+南昌,江西,nan chang
+景德镇,江西,jing de zhen
+萍乡,江西,ping xiang
+九江,江西,jiu jiang
+新余,江西,xin yu
+鹰潭,江西,ying tan
+赣州,江西,gan zhou
+吉安,江西,ji an
+宜春,江西,yi chun
+抚州,江西,fu zhou
+上饶,江西,shang rao
+济南,山东,ji nan
+青岛,山东,qing dao
+淄博,山东,zi bo
+枣庄,山东,zao zhuang
+东营,山东,dong ying
+烟台,山东,yan tai
+潍坊,山东,wei fang
+济宁,山东,ji ning
+泰安,山东,tai an
+威海,山东,wei hai
+日照,山东,ri zhao
+临沂,山东,lin yi
+德州,山东,de zhou
+聊城,山东,liao cheng
+滨州,山东,bin zhou
+菏泽,山东,he ze
+郑州,河南,zheng zhou
+开封,河南,kai feng
+洛阳,河南,luo yang
+平顶山,河南,ping ding shan
+安阳,河南,an yang
+鹤壁,河南,he bi
+新乡,河南,xin xiang
+焦作,河南,jiao zuo
+濮阳,河南,pu yang
+许昌,河南,xu chang
+漯河,河南,luo he
+三门峡,河南,san men xia
+南阳,河南,nan yang
+商丘,河南,shang qiu
+信阳,河南,xin yang
+周口,河南,zhou kou
+驻马店,河南,zhu ma dian
+济源,河南,ji yuan
+武汉,湖北,wu han
+黄石,湖北,huang shi
+十堰,湖北,shi yan
+宜昌,湖北,yi chang
+襄阳,湖北,xiang yang
+鄂州,湖北,e zhou
+荆门,湖北,jing men
+孝感,湖北,xiao gan
+荆州,湖北,jing zhou
+黄冈,湖北,huang gang
+咸宁,湖北,xian ning
+随州,湖北,sui zhou
+恩施,湖北,en shi
+仙桃,湖北,xian tao
+潜江,湖北,qian jiang
+天门,湖北,tian men
+神农架,湖北,shen nong jia
+长沙,湖南,chang sha
+株洲,湖南,zhu zhou
+湘潭,湖南,xiang tan
+衡阳,湖南,heng yang
+邵阳,湖南,shao yang
+岳阳,湖南,yue yang
+常德,湖南,chang de
+张家界,湖南,zhang jia jie
+益阳,湖南,yi yang
+郴州,湖南,chen zhou
+永州,湖南,yong zhou
+怀化,湖南,huai hua
+娄底,湖南,lou di
+吉首,湖南,ji shou
+广州,广东,guang zhou
+韶关,广东,shao guan
+深圳,广东,shen zhen
+珠海,广东,zhu hai
+汕头,广东,shan tou
+佛山,广东,fo shan
+江门,广东,jiang men
+湛江,广东,zhan jiang
+茂名,广东,mao ming
+肇庆,广东,zhao qing
+惠州,广东,hui zhou
+梅州,广东,mei zhou
+汕尾,广东,shan wei
+河源,广东,he yuan
+阳江,广东,yang jiang
+清远,广东,qing yuan
+东莞,广东,dong guan
+中山,广东,zhong shan
+潮州,广东,chao zhou
+揭阳,广东,jie yang
+云浮,广东,yun fu
+南宁,广西,nan ning
+柳州,广西,liu zhou
+桂林,广西,gui lin
+梧州,广西,wu zhou
+北海,广西,bei hai
+防城港,广西,fang cheng gang
+钦州,广西,qin zhou
+贵港,广西,gui gang
+玉林,广西,yu lin
+百色,广西,bai se
+贺州,广西,he zhou
+河池,广西,he chi
+来宾,广西,lai bin
+崇左,广西,chong zuo
+海口,海南,hai kou
+三亚,海南,san ya
+三沙,海南,san sha
+儋州,海南,dan zhou
+琼海,海南,qiong hai
+万宁,海南,wan ning
+文昌,海南,wen chang
+五指山,海南,wu zhi shan
+成都,四川,cheng du
+自贡,四川,zi gong
+攀枝花,四川,pan zhi hua
+泸州,四川,lu zhou
+德阳,四川,de yang
+绵阳,四川,mian yang
+广元,四川,guang yuan
+遂宁,四川,sui ning
+内江,四川,nei jiang
+乐山,四川,le shan
+南充,四川,nan chong
+眉山,四川,mei shan
+宜宾,四川,yi bin
+广安,四川,guang an
+达州,四川,da zhou
+雅安,四川,ya an
+巴中,四川,ba zhong
+资阳,四川,zi yang
+马尔康,四川,ma er kang
+康定,四川,kang ding
+西昌,四川,xi chang
+贵阳,贵州,gui yang
+六盘水,贵州,liu pan shui
+遵义,贵州,zun yi
+安顺,贵州,an shun
+毕节,贵州,bi jie
+铜仁,贵州,tong ren
+凯里,贵州,kai li
+都匀,贵州,du yun
+兴义,贵州,xing yi
+昆明,云南,kun ming
+曲靖,云南,qu jing
+玉溪,云南,yu xi
+保山,云南,bao shan
+昭通,云南,zhao tong
+丽江,云南,li jiang
+普洱,云南,pu er
+临沧,云南,lin cang
+楚雄,云南,chu xiong
+蒙自,云南,meng zi
+文山,云南,wen shan
+景洪,云南,jing hong
+大理,云南,da li
+芒市,云南,mang shi
+香格里拉,云南,xiang ge li la
+拉萨,西藏,la sa
+日喀则,西藏,ri ka ze
+昌都,西藏,chang du
+林芝,西藏,lin zhi
+山南,西藏,shan nan
+那曲,西藏,na qu
+西安,陕西,xi an
+铜川,陕西,tong chuan
+宝鸡,陕西,bao ji
+咸阳,陕西,xian yang
+渭南,陕西,wei nan
+延安,陕西,yan an
+汉中,陕西,han zhong
+榆林,陕西,yu lin
+安康,陕西,an kang
+商洛,陕西,shang luo
+兰州,甘肃,lan zhou
+嘉峪关,甘肃,jia yu guan
+金昌,甘肃,jin chang
+白银,甘肃,bai yin
+天水,甘肃,tian shui
+武威,甘肃,wu wei
+张掖,甘肃,zhang ye
+平凉,甘肃,ping liang
+酒泉,甘肃,jiu quan
+庆阳,甘肃,qing yang
+定西,甘肃,ding xi
+陇南,甘肃,long nan
+临夏,甘肃,lin xia
+敦煌,甘肃,dun huang
+西宁,青海,xi ning
+海东,青海,hai dong
+格尔木,青海,ge er mu
+德令哈,青海,de ling ha
+玉树,青海,yu shu
+银川,宁夏,yin chuan
+石嘴山,宁夏,shi zui shan
+吴忠,宁夏,wu zhong
+固原,宁夏,gu yuan
+中卫,宁夏,zhong wei
+乌鲁木齐,新疆,wu lu mu qi
+克拉玛依,新疆,ke la ma yi
+吐鲁番,新疆,tu lu fan
+哈密,新疆,ha mi
+昌吉,新疆,chang ji
+博乐,新疆,bo le
+库尔勒,新疆,ku er le
+阿克苏,新疆,a ke su
+阿图什,新疆,a tu shi
+喀什,新疆,ka shi
+和田,新疆,he tian
+伊宁,新疆,yi ning
+塔城,新疆,ta cheng
+阿勒泰,新疆,a le tai
+石河子,新疆,shi he zi
+香港,香港,xiang gang
+澳门,澳门,ao men
+台北,台湾,tai bei
+高雄,台湾,gao xiong
+台中,台湾,tai zhong
+台南,台湾,tai nan
+新竹,台湾,xin zhu
+基隆,台湾,ji long
+"""
+
+
+def iter_cities(text=CITY_DATA):
+    """逐条返回 (城市名, 省份, 拼音音节列表)"""
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        name, province, pinyin = line.split(",", 2)
+        yield name, province, pinyin.split()
@@ -0,0 +1,96 @@
+from bisect import bisect_left
+from city_data import iter_cities
+from weather_cache import normalize_city
+
+
+def normalize_query(text):
+    """规范化输入：在城市名规范化的基础上去掉拼音中的隔音符号（如 xi'an）"""
+    return normalize_city(text or "").replace("'", "").replace("’", "")
+
+
+class CityIndex:
+    """城市前缀索引：中文名、全拼与拼音首字母按排序数组存放，用二分查找做前缀匹配"""
+
+    def __init__(self, cities=None):
+        self.names = []
+        self.provinces = []
+        entries = []
+        for name, province, syllables in (iter_cities() if cities is None else cities):
+            city_id = len(self.names)
+            self.names.append(name)
+            self.provinces.append(province)
+            keys = {normalize_query(name)}
+            if syllables:
+                keys.add("".join(syllables).lower())
+                keys.add("".join(syllable[0] for syllable in syllables).lower())
+            for key in keys:
+                entries.append((key, city_id))
+        entries.sort()
+        self.keys = [key for key, _ in entries]
+        self.ids = [city_id for _, city_id in entries]
+
+    def __len__(self):
+        return len(self.names)
+
+    def exact(self, text):
+        """完全匹配的城市名列表（同音城市如 suzhou 会返回多个）"""
+        key = normalize_query(text)
+        if not key:
+            return []
+        matches = []
+        position = bisect_left(self.keys, key)
+        while position < len(self.keys) and self.keys[position] == key:
+            name = self.names[self.ids[position]]
+            if name not in matches:
+                matches.append(name)
+            position += 1
+        return matches
+
+    def suggest(self, prefix, limit=5):
+        """返回以 prefix 开头的城市名（去重），最多 limit 个"""
+        key = normalize_query(prefix)
+        if not key:
+            return []
+        suggestions = []
+        position = bisect_left(self.keys, key)
+        while position < len(self.keys) and len(suggestions) < limit:
+            if not self.keys[position].startswith(key):
+                break
+            name = self.names[self.ids[position]]
+            if name not in suggestions:
+                suggestions.append(name)
+            position += 1
+        return suggestions
+
+    def resolve(self, text):
+        """把输入解析为唯一的城市名（支持拼音与首字母），无法唯一确定时返回 None"""
+        matches = self.exact(text)
+        return matches[0] if len(matches) == 1 else None
+
+    def close_matches(self, text, limit=5):
+        """输入有误时的候选：逐步缩短前缀直到有匹配（如“北惊”→“北京”、“北海”）"""
+        key = normalize_query(text)
+        for end in range(len(key), 0, -1):
+            suggestions = self.suggest(key[:end], limit)
+            if suggestions:
+                return suggestions
+        return []
+
+    def validate(self, text):
+        """返回 (城市名, 候选列表)：能唯一确定时城市名非空，否则给出候选供用户选择"""
+        city = self.resolve(text)
+        if city is not None:
+            return city, []
+        matches = self.exact(text)
+        return None, matches or self.close_matches(text)
+
+
+_default_index = None
+
+
+def get_city_index():
+    """内置城市词典的索引，首次使用时构建"""
+    global _default_index
+    if _default_index is None:
+        _default_index = CityIndex()
+    return _default_index
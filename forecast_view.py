@@ -0,0 +1,104 @@
+from kivy.properties import StringProperty
+from kivy.uix.boxlayout import BoxLayout
+from kivy.uix.label import Label
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
+
+ROW_FIELDS = ('title', 'summary', 'temp', 'wind')
+
+
+def forecast_rows(data):
+    """将响应中的 forecast 数组转换为列表行数据（每天一行）"""
+    rows = []
+    for day in data['data']['forecast']:
+        rows.append({
+            'title': day.get('date', ''),
+            'summary': day.get('type', ''),
+            'temp': f"{day.get('low', '')[2:]}~{day.get('high', '')[2:]}",
+            'wind': day.get('fengxiang', '')
+        })
+    return rows
+
+
+def city_row(city, data=None, error=None):
+    """多城市模式下每个城市一行：显示当天天气或错误信息"""
+    if error is not None:
+        return {'title': city, 'summary': str(error), 'temp': '', 'wind': ''}
+    today = forecast_rows(data)[0]
+    return dict(today, title=city)
+
+
+class ForecastRow(RecycleDataViewBehavior, BoxLayout):
+    """可复用的行控件：只在字段值变化时更新对应的 Label"""
+    title = StringProperty('')
+    summary = StringProperty('')
+    temp = StringProperty('')
+    wind = StringProperty('')
+    created = 0
+
+    def __init__(self, **kwargs):
+        super().__init__(orientation='horizontal', spacing=5, **kwargs)
+        ForecastRow.created += 1
+        self.index = None
+        self.labels = {}
+        for field, weight in zip(ROW_FIELDS, (0.3, 0.25, 0.25, 0.2)):
+            label = Label(size_hint_x=weight)
+            self.labels[field] = label
+            self.add_widget(label)
+            self.fbind(field, self.update_label, field)
+
+    def update_label(self, field, instance, value):
+        self.labels[field].text = value
+
+    def refresh_view_attrs(self, rv, index, data):
+        self.index = index
+        for field in ROW_FIELDS:
+            value = data.get(field, '')
+            if getattr(self, field) != value:
+                setattr(self, field, value)
+
+
+class ForecastView(RecycleView):
+    """基于 RecycleView 的预报列表：行控件循环复用，刷新时只修改变化的数据项"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.viewclass = ForecastRow
+        layout = RecycleBoxLayout(
+            orientation='vertical',
+            default_size=(None, 40),
+            default_size_hint=(1, None),
+            size_hint_y=None,
+            spacing=5
+        )
+        layout.bind(minimum_height=layout.setter('height'))
+        self.add_widget(layout)
+        self.keys = {}
+
+    def set_rows(self, rows):
+        """用新的行数据替换列表：相同位置内容未变的行不触发刷新"""
+        self.keys = {}
+        data = self.data
+        for i, row in enumerate(rows):
+            if i < len(data):
+                if data[i] != row:
+                    data[i] = row
+            else:
+                data.append(row)
+        if len(data) > len(rows):
+            del data[len(rows):]
+
+    def upsert_row(self, key, row):
+        """按键更新或追加一行（多城市模式下同一城市只占一行）"""
+        position = self.keys.get(key)
+        if position is None:
+            self.keys[key] = len(self.data)
+            self.data.append(row)
+        elif self.data[position] != row:
+            self.data[position] = row
+
+    def clear(self):
+        self.keys = {}
+        if self.data:
+            del self.data[:]
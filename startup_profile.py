@@ -0,0 +1,105 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# 在独立子进程中测量，保证每次都是冷导入
+PROBE = r"""
+import json, os, sys, time
+sys.path.insert(0, {root!r})
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+os.environ.setdefault('KIVY_NO_CONSOLELOG', '1')
+timings = {{}}
+start = time.perf_counter()
+import weatherapp
+timings['import_ms'] = (time.perf_counter() - start) * 1000
+app = weatherapp.WeatherApp()
+start = time.perf_counter()
+app.build()
+timings['build_ms'] = (time.perf_counter() - start) * 1000
+timings['network_loaded_after_build'] = 'weather_http' in sys.modules
+timings['certifi_loaded_after_build'] = 'certifi' in sys.modules
+start = time.perf_counter()
+weatherapp.http_client().ssl_context
+timings['first_request_setup_ms'] = (time.perf_counter() - start) * 1000
+start = time.perf_counter()
+weatherapp.http_client().ssl_context
+timings['cached_request_setup_ms'] = (time.perf_counter() - start) * 1000
+print('STARTUP_TIMINGS ' + json.dumps(timings))
+"""
+
+
+def run_probe(root):
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE.format(root=root)],
+        capture_output=True, text=True, cwd=root
+    )
+    for line in result.stdout.splitlines():
+        if line.startswith("STARTUP_TIMINGS "):
+            return json.loads(line[len("STARTUP_TIMINGS "):])
+    raise RuntimeError(f"启动测量失败:\n{result.stderr[-2000:]}")
+
+
+def import_breakdown(root, top=15):
+    """用 -X importtime 统计导入 weatherapp 时耗时最多的模块（累计微秒）"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import weatherapp"],
+        capture_output=True, text=True, cwd=root,
+        env=dict(os.environ, KIVY_NO_ARGS="1", KIVY_NO_CONSOLELOG="1")
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # 格式: "import time:      self |  cumulative | module"
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in parts)
+        modules.append({"module": name, "self_us": int(self_us), "cumulative_us": int(cumulative_us)})
+    modules.sort(key=lambda item: item["cumulative_us"], reverse=True)
+    return modules[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="测量 weatherapp 冷启动：模块导入耗时与 build() 耗时")
+    parser.add_argument("--runs", type=int, default=5, help="冷启动测量次数（取中位数）")
+    parser.add_argument("--top", type=int, default=15, help="列出导入耗时最多的模块数")
+    parser.add_argument("--output", default=None, help="将结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    root = os.path.dirname(os.path.abspath(__file__))
+    runs = []
+    for i in range(args.runs):
+        try:
+            runs.append(run_probe(root))
+        except Exception as e:
+            print(f"[ERROR] 第 {i + 1} 次测量失败: {e}")
+            return 1
+    summary = {}
+    for key in ("import_ms", "build_ms", "first_request_setup_ms", "cached_request_setup_ms"):
+        values = [run[key] for run in runs]
+        summary[key] = {"median": round(statistics.median(values), 2), "max": round(max(values), 2)}
+    summary["network_loaded_after_build"] = any(run["network_loaded_after_build"] for run in runs)
+    summary["certifi_loaded_after_build"] = any(run["certifi_loaded_after_build"] for run in runs)
+    summary["slowest_imports"] = import_breakdown(root, args.top)
+
+    print(f"[INFO] 冷启动测量 {len(runs)} 次（中位数 / 最大值）:")
+    for key in ("import_ms", "build_ms", "first_request_setup_ms", "cached_request_setup_ms"):
+        print(f"  {key}: {summary[key]['median']:.2f} / {summary[key]['max']:.2f} ms")
+    if summary["network_loaded_after_build"] or summary["certifi_loaded_after_build"]:
+        print("[WARNING] build() 结束时网络模块或 certifi 已被导入，延迟导入未生效")
+    print("[INFO] 导入耗时最多的模块（累计）:")
+    for item in summary["slowest_imports"]:
+        print(f"  {item['cumulative_us'] / 1000:8.2f} ms  {item['module']}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+        print(f"[INFO] 结果已写入 {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
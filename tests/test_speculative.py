@@ -0,0 +1,111 @@
+import os
+import subprocess
+import sys
+
+import yaml
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from autodebug.speculative import SCRATCH_PREFIX, RunReporter, SpeculativeRunner
+
+WORKFLOW_PATH = os.path.join(".github", "workflows", "debug.yml")
+BASE_WORKFLOW = {
+    "name": "Build",
+    "on": {"push": {"branches": ["main"]}},
+    "jobs": {"build": {"runs-on": "ubuntu-latest", "steps": [
+        {"name": "Checkout", "uses": "actions/checkout@v4"},
+        {"name": "Build APK", "run": "buildozer android debug"}
+    ]}}
+}
+
+def git(args, cwd):
+    return subprocess.run(["git"] + args, cwd=cwd, capture_output=True, text=True, check=True).stdout.strip()
+
+class FakeReporter(RunReporter):
+    """按分支名决定结果：含 good 的候选成功，其余一直运行，直到被取消"""
+
+    def __init__(self):
+        self.cancelled = []
+        self.queried = {}
+
+    def find_run(self, branch, sha):
+        self.queried[branch] = sha
+        if "good" in branch:
+            return {"id": f"run-{branch}", "status": "completed", "conclusion": "success"}
+        return {"id": f"run-{branch}", "status": "in_progress", "conclusion": None}
+
+    def cancel(self, run_id):
+        self.cancelled.append(run_id)
+        return True
+
+def candidate(name, step):
+    workflow = yaml.safe_load(yaml.safe_dump(BASE_WORKFLOW))
+    workflow["jobs"]["build"]["steps"].insert(1, step)
+    return {"name": name, "workflow": workflow}
+
+def setup_repos(tmp_path):
+    remote = tmp_path / "remote.git"
+    work = tmp_path / "work"
+    git(["init", "--bare", "-b", "main", str(remote)], tmp_path)
+    git(["init", "-b", "main", str(work)], tmp_path)
+    (work / ".github" / "workflows").mkdir(parents=True)
+    (work / WORKFLOW_PATH).write_text(yaml.safe_dump(BASE_WORKFLOW, sort_keys=False))
+    git(["add", WORKFLOW_PATH], work)
+    git(["-c", "user.name=Test", "-c", "user.email=test@example.com", "commit", "-m", "Initial workflow"], work)
+    git(["remote", "add", "origin", str(remote)], work)
+    git(["push", "origin", "main"], work)
+    return remote, work
+
+def test_run_fast_forwards_main_and_deletes_scratch_branches(tmp_path):
+    remote, work = setup_repos(tmp_path)
+    base_sha = git(["rev-parse", "main"], work)
+    reporter = FakeReporter()
+    runner = SpeculativeRunner(str(work), str(work / WORKFLOW_PATH), "main", reporter,
+                               poll_interval=0, sleep=lambda seconds: None)
+
+    outcome = runner.run([
+        candidate("Slow fix", {"name": "Slow Fix", "run": "sleep 600"}),
+        candidate("Good fix", {"name": "Good Fix", "run": "pip install buildozer==1.5.0"})
+    ], tag="t1")
+
+    assert outcome["winner"]["name"] == "Good fix"
+    assert outcome["states"] == ["cancelled", "success"]
+    # 主分支（远程与本地）快进到获胜的候选提交
+    remote_main = git(["rev-parse", "main"], remote)
+    assert remote_main == outcome["sha"] == git(["rev-parse", "main"], work)
+    assert git(["merge-base", "--is-ancestor", base_sha, remote_main], remote) == ""
+    assert git(["log", "--format=%s", "-1", remote_main], remote) == "AutoDebug: Speculative fix 'Good fix'"
+    # scratch 分支的触发条件没有进入主分支
+    merged = yaml.safe_load(git(["show", f"main:{WORKFLOW_PATH.replace(os.sep, '/')}"], remote))
+    assert merged["on"]["push"]["branches"] == ["main"]
+    assert [step["name"] for step in merged["jobs"]["build"]["steps"]] == ["Checkout", "Good Fix", "Build APK"]
+    # 运行在 scratch 分支的顶端提交上，它比合并的提交多一次触发提交
+    good_branch = next(branch for branch in reporter.queried if "good" in branch)
+    assert git(["rev-parse", f"{reporter.queried[good_branch]}^"], work) == remote_main
+    # 落后的候选被取消，所有 scratch 分支都已删除
+    assert outcome["results"][good_branch] == "success"
+    assert list(outcome["results"].values()).count("cancelled") == 1
+    assert len(reporter.cancelled) == 1
+    assert git(["branch", "--list", f"{SCRATCH_PREFIX}/*"], remote) == ""
+    assert git(["branch", "--list", f"{SCRATCH_PREFIX}/*"], work) == ""
+    assert git(["worktree", "list", "--porcelain"], work).count("worktree ") == 1
+
+def test_run_leaves_main_unchanged_when_no_candidate_succeeds(tmp_path):
+    remote, work = setup_repos(tmp_path)
+    base_sha = git(["rev-parse", "main"], work)
+    clock = iter(range(0, 10000, 100))
+    runner = SpeculativeRunner(str(work), str(work / WORKFLOW_PATH), "main", FakeReporter(),
+                               poll_interval=0, timeout=300, sleep=lambda seconds: None, clock=lambda: next(clock))
+
+    outcome = runner.run([
+        candidate("Slow fix", {"name": "Slow Fix", "run": "sleep 600"}),
+        candidate("Other fix", {"name": "Other Fix", "run": "sleep 900"})
+    ], tag="t2")
+
+    assert outcome["winner"] is None and outcome["sha"] is None
+    assert sorted(outcome["results"].values()) == ["cancelled", "cancelled"]
+    assert git(["rev-parse", "main"], remote) == base_sha == git(["rev-parse", "main"], work)
+    assert git(["branch", "--list", f"{SCRATCH_PREFIX}/*"], remote) == ""
+    assert git(["branch", "--list", f"{SCRATCH_PREFIX}/*"], work) == ""
@@ -0,0 +1,119 @@
+import re
+import time
+from collections import deque
+from weather_cache import normalize_city
+
+CITY_SEPARATORS = re.compile(r"[,，、;；\n]+")
+
+
+def parse_city_list(text):
+    """解析逗号（中英文）、顿号、分号或换行分隔的城市列表，按规范化城市名去重并保持顺序"""
+    cities = []
+    seen = set()
+    for city in CITY_SEPARATORS.split(text or ""):
+        city = city.strip()
+        if not city or city.startswith("#"):
+            continue
+        key = normalize_city(city)
+        if key in seen:
+            continue
+        seen.add(key)
+        cities.append(city)
+    return cities
+
+
+def load_city_file(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return parse_city_list(f.read())
+
+
+class BatchWeatherQuery:
+    """多城市并发查询：最多 max_concurrent 个请求同时进行，结果按到达顺序回调"""
+
+    def __init__(self, cities, fetch, on_result, on_complete=None, cache=None, max_concurrent=6):
+        # fetch(city, on_success(data), on_error(error)) 发起单个请求并返回请求对象
+        self.cities = list(cities)
+        self.fetch = fetch
+        self.on_result = on_result
+        self.on_complete = on_complete
+        self.cache = cache
+        self.max_concurrent = max(1, max_concurrent)
+        self.pending = deque()
+        self.active = {}
+        self.latencies = {}
+        self.results = {}
+        self.errors = {}
+        self.cancelled = False
+        self.started_at = None
+        self.finished_at = None
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        for city in self.cities:
+            cached = self.cache.get(city) if self.cache else None
+            if cached:
+                self.latencies[city] = 0.0
+                self.results[city] = cached[0]
+                self.on_result(city, cached[0], None)
+            else:
+                self.pending.append(city)
+        self._fill()
+        self._check_complete()
+
+    def cancel(self):
+        self.cancelled = True
+        self.pending.clear()
+        for request in list(self.active.values()):
+            if request is not None and hasattr(request, "cancel"):
+                request.cancel()
+        self.active.clear()
+
+    def _fill(self):
+        while self.pending and len(self.active) < self.max_concurrent and not self.cancelled:
+            city = self.pending.popleft()
+            started = time.perf_counter()
+            self.active[city] = None
+            request = self.fetch(
+                city,
+                lambda data, city=city, started=started: self._done(city, started, data, None),
+                lambda error, city=city, started=started: self._done(city, started, None, error)
+            )
+            if city in self.active:
+                self.active[city] = request
+
+    def _done(self, city, started, data, error):
+        if self.cancelled or city not in self.active:
+            return
+        self.active.pop(city, None)
+        self.latencies[city] = time.perf_counter() - started
+        if error is None:
+            self.results[city] = data
+            if self.cache:
+                self.cache.put(city, data)
+        else:
+            self.errors[city] = error
+        self.on_result(city, data, error)
+        self._fill()
+        self._check_complete()
+
+    def _check_complete(self):
+        if self.pending or self.active or self.finished_at is not None or self.cancelled:
+            return
+        self.finished_at = time.perf_counter()
+        if self.on_complete:
+            self.on_complete(self.stats())
+
+    def stats(self):
+        """总耗时与单个请求耗时之和的对比：并发时总耗时应接近单次往返，而不是 N 次往返之和"""
+        end = self.finished_at or time.perf_counter()
+        total = end - self.started_at if self.started_at else 0.0
+        latencies = [value for value in self.latencies.values() if value > 0]
+        return {
+            "cities": len(self.cities),
+            "succeeded": len(self.results),
+            "failed": len(self.errors),
+            "total_seconds": round(total, 3),
+            "sequential_seconds": round(sum(latencies), 3),
+            "max_request_seconds": round(max(latencies), 3) if latencies else 0.0,
+            "max_concurrent": self.max_concurrent
+        }
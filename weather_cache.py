@@ -0,0 +1,113 @@
+import json
+import os
+import time
+from collections import OrderedDict
+
+
+def normalize_city(city):
+    """规范化城市名作为缓存键：去空白、统一大小写、去掉末尾的“市”"""
+    key = "".join(city.split()).casefold()
+    if len(key) > 1 and key.endswith("市"):
+        key = key[:-1]
+    return key
+
+
+class WeatherCache:
+    """天气响应缓存：按城市名缓存解析后的响应，支持 TTL 过期、LRU 淘汰与磁盘持久化。
+
+    put 只在内存中更新并调用 on_change（例如 Clock.create_trigger 返回的触发器），由调用方择时 save。
+    """
+
+    def __init__(self, path=None, ttl=600, max_entries=50, on_change=None):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.on_change = on_change
+        self.entries = OrderedDict()
+        self.dirty = False
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.load()
+
+    def get(self, city, allow_stale=False):
+        """返回 (data, fresh)；未命中（或过期且不允许旧数据）时返回 None"""
+        key = normalize_city(city)
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        fresh = time.time() - entry["time"] < self.ttl
+        if not fresh and not allow_stale:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        if fresh:
+            self.hits += 1
+        else:
+            self.stale_hits += 1
+        return entry["data"], fresh
+
+    def put(self, city, data, fetched_at=None):
+        """fetched_at 为数据实际获取的时间（例如来自离线存储），TTL 从该时间起算"""
+        key = normalize_city(city)
+        self.entries[key] = {"time": fetched_at or time.time(), "data": data}
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        self.dirty = True
+        if self.on_change:
+            self.on_change()
+
+    def invalidate(self, city):
+        self.entries.pop(normalize_city(city), None)
+
+    @property
+    def requests(self):
+        return self.hits + self.stale_hits + self.misses
+
+    @property
+    def hit_rate(self):
+        """命中率（过期数据的命中也计入，因为界面同样可以立即显示）"""
+        if not self.requests:
+            return 0.0
+        return (self.hits + self.stale_hits) / self.requests
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hit_rate, 3)
+        }
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+            entries = stored.get("entries", [])
+            for key, entry in entries[-self.max_entries:]:
+                self.entries[key] = entry
+        except Exception as e:
+            print(f"[WARNING] 天气缓存加载失败，已忽略: {e}")
+            self.entries.clear()
+
+    def save(self):
+        """有待写入的修改时把缓存写入磁盘"""
+        if not self.path or not self.dirty:
+            return
+        self.dirty = False
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"entries": list(self.entries.items())}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            self.dirty = True
+            print(f"[WARNING] 天气缓存保存失败: {e}")
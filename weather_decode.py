@@ -0,0 +1,102 @@
+import gzip
+import json
+import queue
+import threading
+import time
+from forecast_view import forecast_rows
+
+
+def decode_payload(raw):
+    """将原始响应解码为 dict：支持 gzip 压缩、bytes/str 以及已解码的 dict"""
+    if isinstance(raw, dict):
+        return raw
+    if isinstance(raw, bytes):
+        if raw[:2] == b'\x1f\x8b':
+            raw = gzip.decompress(raw)
+        try:
+            raw = raw.decode('utf-8')
+        except UnicodeDecodeError:
+            raw = raw.decode('gbk')
+    return json.loads(raw)
+
+
+def format_summary(city, data):
+    weather = data['data']['forecast'][0]
+    return (
+        f"{city} 天气:\n"
+        f"{weather['type']}\n"
+        f"温度: {weather['low'][2:]}~{weather['high'][2:]}\n"
+        f"风向: {weather['fengxiang']}"
+    )
+
+
+def build_view_model(city, raw, adapt=None):
+    """解码并转换为可直接渲染的视图模型：{'city', 'data', 'summary', 'rows', 'error'}
+
+    adapt 用于把其他数据源的响应转换为 weather_mini 格式
+    """
+    model = {'city': city, 'data': None, 'summary': '', 'rows': [], 'error': None}
+    try:
+        data = decode_payload(raw)
+        if adapt is not None:
+            data = adapt(data)
+    except Exception as e:
+        model['error'] = f"数据解析错误: {str(e)}"
+        return model
+    if not isinstance(data, dict) or data.get('status') != 1000:
+        model['error'] = "城市不存在或查询失败"
+        return model
+    try:
+        model['summary'] = format_summary(city, data)
+        model['rows'] = forecast_rows(data)
+    except Exception as e:
+        model['error'] = f"数据解析错误: {str(e)}"
+        return model
+    model['data'] = data
+    return model
+
+
+class DecodeWorker:
+    """后台解码线程：在工作线程中完成 JSON 解码与视图模型转换，再通过主循环回调交给 UI"""
+
+    def __init__(self, schedule_once):
+        # schedule_once 与 kivy.clock.Clock.schedule_once 签名一致，用于回到主线程
+        self.schedule_once = schedule_once
+        self.tasks = queue.Queue()
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.last_seconds = 0.0
+        self.thread = threading.Thread(target=self.run, name='weather-decode', daemon=True)
+        self.thread.start()
+
+    def submit(self, city, raw, callback, adapt=None):
+        self.tasks.put((city, raw, callback, adapt))
+
+    def run(self):
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                return
+            city, raw, callback, adapt = task
+            start = time.perf_counter()
+            model = build_view_model(city, raw, adapt)
+            elapsed = time.perf_counter() - start
+            model['decode_ms'] = round(elapsed * 1000, 3)
+            self.count += 1
+            self.total_seconds += elapsed
+            self.max_seconds = max(self.max_seconds, elapsed)
+            self.last_seconds = elapsed
+            self.schedule_once(lambda dt, callback=callback, model=model: callback(model), 0)
+
+    def stop(self):
+        self.tasks.put(None)
+
+    def stats(self):
+        """解码耗时统计（毫秒），用于性能分析"""
+        return {
+            'count': self.count,
+            'last_ms': round(self.last_seconds * 1000, 3),
+            'avg_ms': round(self.total_seconds * 1000 / self.count, 3) if self.count else 0.0,
+            'max_ms': round(self.max_seconds * 1000, 3)
+        }
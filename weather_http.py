@@ -0,0 +1,265 @@
+import http.client
+import socket
+import ssl
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlsplit
+
+# 连接可能被服务器关闭的异常：复用的空闲连接出现这些错误时换新连接重试一次
+RETRYABLE_ERRORS = (http.client.RemoteDisconnected, http.client.BadStatusLine, ConnectionResetError,
+                    BrokenPipeError, ConnectionAbortedError)
+
+
+class RequestCancelled(Exception):
+    pass
+
+
+def abort_connection(connection):
+    """关闭连接并中断正在阻塞读写该连接的线程"""
+    sock = connection.sock
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    connection.close()
+
+
+class HttpRequest:
+    """与 UrlRequest 相同的回调约定：on_success(req, result) / on_failure(req, result) / on_error(req, error)"""
+
+    def __init__(self, url, on_success=None, on_error=None, on_failure=None, on_cancel=None):
+        self.url = url
+        self.on_success = on_success
+        self.on_error = on_error
+        self.on_failure = on_failure or on_error
+        self.on_cancel = on_cancel
+        self.resp_status = None
+        self.resp_headers = {}
+        self.result = None
+        self.error = None
+        self.latency = None
+        self.reused = False
+        self.cancelled = False
+        self.is_finished = False
+        self.lock = threading.Lock()
+        self.connection = None
+
+    def cancel(self):
+        # 关闭正在使用的连接，使阻塞在读写上的工作线程立即返回，不再占用线程池；该连接不会放回连接池
+        if self.is_finished or self.cancelled:
+            return
+        with self.lock:
+            self.cancelled = True
+            connection, self.connection = self.connection, None
+        if connection is not None:
+            abort_connection(connection)
+        if self.on_cancel:
+            self.on_cancel(self)
+
+    def attach(self, connection):
+        """登记工作线程正在使用的连接；请求已取消时返回 False"""
+        with self.lock:
+            if self.cancelled:
+                return False
+            self.connection = connection
+            return True
+
+    def detach(self):
+        """取消登记，返回连接是否仍可复用（期间未被 cancel 关闭）"""
+        with self.lock:
+            self.connection = None
+            return not self.cancelled
+
+
+class HttpClient:
+    """共享 HTTP 客户端：按主机复用 keep-alive 连接，SSL 上下文只创建一次，请求在线程池中执行"""
+
+    def __init__(self, schedule_once, cafile=None, max_workers=6, max_idle_per_host=4, idle_timeout=55,
+                 timeout=15, headers=None, max_redirects=3, window=100):
+        # schedule_once 与 kivy.clock.Clock.schedule_once 签名一致，用于把回调送回主线程
+        # cafile 可以是证书路径或返回路径的函数（首次建立 HTTPS 连接时才解析）
+        self.schedule_once = schedule_once
+        self.cafile = cafile
+        self.max_idle_per_host = max_idle_per_host
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.headers = dict(headers or {})
+        self.headers.setdefault('Accept-Encoding', 'gzip')
+        self.headers.setdefault('Connection', 'keep-alive')
+        self.max_redirects = max_redirects
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='weather-http')
+        self.lock = threading.Lock()
+        self.idle = {}  # (scheme, host, port) -> deque[(connection, idle_since)]
+        self._ssl_context = None
+        self.latencies = deque(maxlen=window)
+        self.requests = 0
+        self.new_connections = 0
+        self.reused_connections = 0
+        self.connect_seconds = 0.0
+        self.closed = False
+
+    @property
+    def ssl_context(self):
+        if self._ssl_context is None:
+            cafile = self.cafile() if callable(self.cafile) else self.cafile
+            self._ssl_context = ssl.create_default_context(cafile=cafile)
+        return self._ssl_context
+
+    def request(self, url, on_success=None, on_error=None, on_failure=None, on_cancel=None, timeout=None,
+                req_headers=None, **kwargs):
+        """发起 GET 请求并立即返回 HttpRequest；多余的 UrlRequest 参数（decode、ca_file 等）被忽略"""
+        req = HttpRequest(url, on_success, on_error, on_failure, on_cancel)
+        headers = dict(self.headers)
+        headers.update(req_headers or {})
+        headers.pop('Content-Type', None)
+        self.executor.submit(self._run, req, headers, timeout or self.timeout)
+        return req
+
+    def _run(self, req, headers, timeout):
+        start = time.perf_counter()
+        url = req.url
+        if req.cancelled:
+            # 排队期间已被取消，不再发起请求
+            self.schedule_once(lambda dt: self._deliver(req), 0)
+            return
+        try:
+            for _ in range(self.max_redirects + 1):
+                status, response_headers, body = self._fetch(req, url, headers, timeout)
+                location = response_headers.get('location')
+                if status in (301, 302, 303, 307, 308) and location:
+                    url = urljoin(url, location)
+                    continue
+                break
+            req.resp_status = status
+            req.resp_headers = response_headers
+            req.result = body
+        except Exception as e:
+            req.error = e
+        req.latency = time.perf_counter() - start
+        with self.lock:
+            self.requests += 1
+            self.latencies.append(req.latency)
+        self.schedule_once(lambda dt: self._deliver(req), 0)
+
+    def _deliver(self, req):
+        req.is_finished = True
+        if req.cancelled:
+            return
+        if req.error is not None:
+            if req.on_error:
+                req.on_error(req, req.error)
+        elif 200 <= req.resp_status < 300:
+            if req.on_success:
+                req.on_success(req, req.result)
+        elif req.on_failure:
+            req.on_failure(req, req.result)
+
+    def _fetch(self, req, url, headers, timeout):
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        connection, reused = self._acquire(key, timeout)
+        if not req.attach(connection):
+            self._release(key, connection)
+            raise RequestCancelled()
+        try:
+            try:
+                response = self._send(connection, path, headers)
+            except RETRYABLE_ERRORS:
+                connection.close()
+                if not reused or req.cancelled:
+                    raise
+                connection, reused = self._connect(key, timeout), False
+                if not req.attach(connection):
+                    connection.close()
+                    raise RequestCancelled()
+                response = self._send(connection, path, headers)
+            except Exception:
+                connection.close()
+                raise
+            try:
+                body = response.read()
+            except Exception:
+                connection.close()
+                raise
+        finally:
+            reusable = req.detach()
+        req.reused = reused
+        response_headers = {name.lower(): value for name, value in response.getheaders()}
+        if response.will_close or not reusable:
+            connection.close()
+        else:
+            self._release(key, connection)
+        return response.status, response_headers, body
+
+    def _send(self, connection, path, headers):
+        connection.request('GET', path, headers=headers)
+        return connection.getresponse()
+
+    def _acquire(self, key, timeout):
+        now = time.monotonic()
+        with self.lock:
+            idle = self.idle.get(key)
+            while idle:
+                connection, idle_since = idle.pop()
+                if now - idle_since < self.idle_timeout:
+                    self.reused_connections += 1
+                    connection.timeout = timeout
+                    if connection.sock is not None:
+                        connection.sock.settimeout(timeout)
+                    return connection, True
+                connection.close()
+        return self._connect(key, timeout), False
+
+    def _connect(self, key, timeout):
+        scheme, host, port = key
+        start = time.perf_counter()
+        if scheme == 'https':
+            connection = http.client.HTTPSConnection(host, port, timeout=timeout, context=self.ssl_context)
+        else:
+            connection = http.client.HTTPConnection(host, port, timeout=timeout)
+        # 提前建立连接（含 TLS 握手），以便单独统计握手耗时
+        connection.connect()
+        with self.lock:
+            self.new_connections += 1
+            self.connect_seconds += time.perf_counter() - start
+        return connection
+
+    def _release(self, key, connection):
+        with self.lock:
+            if self.closed:
+                connection.close()
+                return
+            idle = self.idle.setdefault(key, deque())
+            idle.append((connection, time.monotonic()))
+            while len(idle) > self.max_idle_per_host:
+                idle.popleft()[0].close()
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            for idle in self.idle.values():
+                for connection, _ in idle:
+                    connection.close()
+            self.idle.clear()
+        self.executor.shutdown(wait=False)
+
+    def stats(self):
+        """请求耗时与连接复用统计（毫秒）"""
+        with self.lock:
+            latencies = sorted(self.latencies)
+            connections = self.new_connections + self.reused_connections
+            return {
+                'requests': self.requests,
+                'new_connections': self.new_connections,
+                'reused_connections': self.reused_connections,
+                'reuse_rate': self.reused_connections / connections if connections else 0.0,
+                'avg_connect_ms': round(self.connect_seconds * 1000 / self.new_connections, 1) if self.new_connections else 0.0,
+                'avg_ms': round(sum(latencies) * 1000 / len(latencies), 1) if latencies else 0.0,
+                'p95_ms': round(latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))] * 1000, 1) if latencies else 0.0
+            }
@@ -0,0 +1,237 @@
+import time
+from collections import deque
+from urllib.parse import quote, urlparse
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class WeatherProvider:
+    """天气数据源：负责拼接请求地址，并可通过 adapt 把响应转换为 weather_mini 格式"""
+
+    def __init__(self, name, base_url, adapt=None, window=50):
+        self.name = name
+        self.base_url = base_url
+        self.adapt = adapt
+        self.latencies = deque(maxlen=window)
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+
+    def url(self, city):
+        return f'{self.base_url}?city={quote(city)}'
+
+    def healthy(self, now=None):
+        return (now or time.time()) >= self.unhealthy_until
+
+    def record_success(self, seconds):
+        self.latencies.append(seconds)
+        self.successes += 1
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+
+    def record_failure(self, max_failures, cooldown):
+        self.failures += 1
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= max_failures:
+            # 连续失败达到阈值后暂时熔断，冷却期内不再作为首选线路
+            self.unhealthy_until = time.time() + cooldown
+
+    def p50(self):
+        return percentile(self.latencies, 0.5)
+
+    def p95(self):
+        return percentile(self.latencies, 0.95)
+
+    def stats(self):
+        p50 = self.p50()
+        p95 = self.p95()
+        return {
+            'name': self.name,
+            'healthy': self.healthy(),
+            'successes': self.successes,
+            'failures': self.failures,
+            'p50_ms': round(p50 * 1000, 1) if p50 is not None else None,
+            'p95_ms': round(p95 * 1000, 1) if p95 is not None else None
+        }
+
+
+def providers_from_urls(urls):
+    """由地址列表创建数据源，名称取主机名（重名时追加序号）"""
+    providers = []
+    names = set()
+    for url in urls:
+        url = url.strip()
+        if not url:
+            continue
+        name = urlparse(url).netloc or url
+        if name in names:
+            name = f'{name}#{len(providers) + 1}'
+        names.add(name)
+        providers.append(WeatherProvider(name, url))
+    return providers
+
+
+class HedgedRequest:
+    """一次城市查询：先请求最快的线路，超过其 p95 延迟仍未返回时再并行请求下一条线路，先成功者胜出"""
+
+    def __init__(self, router, city, on_success, on_error):
+        self.router = router
+        self.city = city
+        self.on_success = on_success
+        self.on_error = on_error
+        self.candidates = deque(router.ranked())
+        self.attempts = {}  # provider.name -> {'provider', 'request', 'started'}
+        self.hedge_event = None
+        self.last_error = None
+        self.done = False
+        self.provider = None
+        self.starting = False
+
+    def start(self):
+        # start() 返回之前调用方还拿不到请求对象，这期间的失败回调推迟到下一帧再通知
+        self.starting = True
+        try:
+            if not self.candidates:
+                self.finish_error("没有可用的天气数据源")
+            else:
+                self.launch()
+        finally:
+            self.starting = False
+        return self
+
+    def launch(self):
+        while self.candidates and not self.done:
+            provider = self.candidates.popleft()
+            attempt = {'provider': provider, 'request': None, 'started': time.perf_counter()}
+            self.attempts[provider.name] = attempt
+            try:
+                attempt['request'] = self.router.open_request(
+                    provider.url(self.city),
+                    on_success=lambda req, result, provider=provider: self.succeeded(provider, result),
+                    on_error=lambda req, error, provider=provider: self.failed(provider, error),
+                    on_failure=lambda req, result, provider=provider: self.failed(provider, f"HTTP {req.resp_status}")
+                )
+            except Exception as e:
+                self.attempts.pop(provider.name, None)
+                provider.record_failure(self.router.max_failures, self.router.cooldown)
+                self.last_error = e
+                continue
+            if not self.done and provider.name in self.attempts:
+                self.schedule_hedge(provider)
+            return
+        if not self.attempts and not self.done:
+            self.finish_error(self.last_error or "没有可用的天气数据源")
+
+    def schedule_hedge(self, provider):
+        self.cancel_hedge()
+        if self.candidates and self.router.hedging:
+            self.hedge_event = self.router.schedule_once(lambda dt: self.hedge(), self.router.hedge_delay(provider))
+
+    def cancel_hedge(self):
+        if self.hedge_event is not None:
+            self.hedge_event.cancel()
+            self.hedge_event = None
+
+    def hedge(self):
+        self.hedge_event = None
+        if not self.done:
+            self.router.hedged += 1
+            self.launch()
+
+    def succeeded(self, provider, result):
+        attempt = self.attempts.pop(provider.name, None)
+        if self.done or attempt is None:
+            return
+        provider.record_success(time.perf_counter() - attempt['started'])
+        self.done = True
+        self.provider = provider
+        self.cancel_hedge()
+        self.cancel_attempts()
+        self.on_success(self, result, provider)
+
+    def failed(self, provider, error):
+        if self.attempts.pop(provider.name, None) is None or self.done:
+            return
+        provider.record_failure(self.router.max_failures, self.router.cooldown)
+        self.last_error = error
+        if self.candidates:
+            # 失败后立即切换到下一条线路，而不是等待对冲计时器
+            self.router.failovers += 1
+            self.launch()
+        elif not self.attempts:
+            self.finish_error(error)
+
+    def finish_error(self, error):
+        self.done = True
+        self.cancel_hedge()
+        if self.starting:
+            self.router.schedule_once(lambda dt: self.on_error(self, error), 0)
+        else:
+            self.on_error(self, error)
+
+    def cancel_attempts(self):
+        for attempt in list(self.attempts.values()):
+            request = attempt['request']
+            if request is not None and hasattr(request, 'cancel'):
+                request.cancel()
+        self.attempts.clear()
+
+    def cancel(self):
+        self.done = True
+        self.cancel_hedge()
+        self.cancel_attempts()
+
+
+class ProviderRouter:
+    """多数据源路由：按健康状态和延迟选择线路，支持对冲请求与故障切换"""
+
+    def __init__(self, providers, open_request, schedule_once, hedge_default=2.0, min_hedge=0.2,
+                 max_hedge=10.0, min_samples=5, max_failures=3, cooldown=60, hedging=True):
+        # open_request(url, on_success, on_error, on_failure) 发起单个 HTTP 请求并返回可取消的请求对象
+        # schedule_once 与 kivy.clock.Clock.schedule_once 签名一致，用于对冲计时
+        self.providers = list(providers)
+        self.open_request = open_request
+        self.schedule_once = schedule_once
+        self.hedge_default = hedge_default
+        self.min_hedge = min_hedge
+        self.max_hedge = max_hedge
+        self.min_samples = min_samples
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+        self.hedging = hedging and len(self.providers) > 1
+        self.hedged = 0
+        self.failovers = 0
+
+    def ranked(self):
+        """健康的线路在前，按中位延迟从快到慢排序；尚无样本的线路按配置顺序排在有样本的慢线路之前"""
+        now = time.time()
+
+        def rank(item):
+            position, provider = item
+            p50 = provider.p50()
+            latency = p50 if p50 is not None else self.hedge_default / 2
+            return (not provider.healthy(now), latency, position)
+        return [provider for _, provider in sorted(enumerate(self.providers), key=rank)]
+
+    def hedge_delay(self, provider):
+        if len(provider.latencies) < self.min_samples:
+            return self.hedge_default
+        return min(self.max_hedge, max(self.min_hedge, provider.p95()))
+
+    def fetch(self, city, on_success, on_error):
+        """on_success(request, result, provider) / on_error(request, error)，返回带 cancel() 的请求对象"""
+        return HedgedRequest(self, city, on_success, on_error).start()
+
+    def stats(self):
+        return {
+            'providers': [provider.stats() for provider in self.providers],
+            'hedged': self.hedged,
+            'failovers': self.failovers
+        }
@@ -0,0 +1,171 @@
+import json
+import os
+import time
+from collections import OrderedDict
+from weather_cache import normalize_city
+from weather_batch import BatchWeatherQuery
+
+
+class WeatherStore:
+    """离线天气存储（紧凑 JSON 文件）：保存每个城市完整的 forecast 数据以及收藏城市列表。
+
+    收藏城市的数据一直保留，其他城市按最近使用保留 max_entries 个。修改只标记为待写入并调用 on_change
+    （例如 Clock.create_trigger 返回的触发器），由调用方择时 flush，避免每次响应都重写整个文件。
+    """
+
+    def __init__(self, path, max_entries=100, on_change=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.on_change = on_change
+        self.forecasts = OrderedDict()  # 规范化城市名 -> {'city', 'fetched_at', 'data'}，最近使用的在后
+        self.favorite_cities = {}  # 规范化城市名 -> {'city', 'added_at'}
+        self.dirty = False
+        self.load_file()
+
+    def load_file(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+            self.forecasts = OrderedDict(stored.get('forecasts', {}))
+            self.favorite_cities = stored.get('favorites', {})
+        except Exception as e:
+            print(f"[WARNING] 离线天气存储加载失败，已忽略: {e}")
+        self.evict()
+
+    def changed(self):
+        self.dirty = True
+        if self.on_change:
+            self.on_change()
+
+    def evict(self):
+        """淘汰最久未使用的非收藏城市，直到非收藏城市不超过 max_entries 个"""
+        others = [key for key in self.forecasts if key not in self.favorite_cities]
+        for key in others[:max(0, len(others) - self.max_entries)]:
+            del self.forecasts[key]
+            self.dirty = True
+
+    def flush(self):
+        """有待写入的修改时把整个存储写入磁盘"""
+        if not self.dirty:
+            return
+        self.dirty = False
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(
+                    {'forecasts': self.forecasts, 'favorites': self.favorite_cities},
+                    f, ensure_ascii=False, separators=(',', ':')
+                )
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            self.dirty = True
+            print(f"[WARNING] 离线天气存储保存失败: {e}")
+
+    def save(self, city, data, fetched_at=None):
+        """保存完整响应（包含 5 天的 forecast 数组）"""
+        key = normalize_city(city)
+        self.forecasts[key] = {
+            'city': city,
+            'fetched_at': fetched_at or time.time(),
+            'data': data
+        }
+        self.forecasts.move_to_end(key)
+        self.evict()
+        self.changed()
+
+    def load(self, city):
+        """返回 (data, fetched_at)，没有离线数据时返回 None"""
+        key = normalize_city(city)
+        entry = self.forecasts.get(key)
+        if entry is None:
+            return None
+        self.forecasts.move_to_end(key)
+        return entry['data'], entry['fetched_at']
+
+    def forecast(self, city):
+        stored = self.load(city)
+        if stored is None:
+            return []
+        return stored[0].get('data', {}).get('forecast', [])
+
+    def add_favorite(self, city):
+        key = normalize_city(city)
+        if key in self.favorite_cities:
+            return
+        self.favorite_cities[key] = {'city': city, 'added_at': time.time()}
+        self.changed()
+
+    def remove_favorite(self, city):
+        if self.favorite_cities.pop(normalize_city(city), None) is not None:
+            self.evict()
+            self.changed()
+
+    def is_favorite(self, city):
+        return normalize_city(city) in self.favorite_cities
+
+    def favorites(self):
+        entries = sorted(self.favorite_cities.values(), key=lambda entry: entry['added_at'])
+        return [entry['city'] for entry in entries]
+
+    def close(self):
+        self.flush()
+
+
+class PrefetchScheduler:
+    """按固定间隔在后台预取收藏城市，使这些城市的查询直接由本地存储返回"""
+
+    def __init__(self, store, fetch, schedule_interval, interval=1800, max_concurrent=4, on_update=None):
+        # schedule_interval 与 kivy.clock.Clock.schedule_interval 签名一致
+        self.store = store
+        self.fetch = fetch
+        self.schedule_interval = schedule_interval
+        self.interval = interval
+        self.max_concurrent = max_concurrent
+        self.on_update = on_update
+        self.event = None
+        self.batch = None
+        self.last_run = None
+
+    def start(self):
+        if self.event is None and self.interval > 0:
+            self.event = self.schedule_interval(lambda dt: self.run(), self.interval)
+        self.run()
+
+    def stop(self):
+        if self.event is not None:
+            self.event.cancel()
+            self.event = None
+        if self.batch:
+            self.batch.cancel()
+            self.batch = None
+
+    def due(self, city):
+        stored = self.store.load(city)
+        return stored is None or time.time() - stored[1] >= self.interval
+
+    def run(self):
+        if self.batch and self.batch.finished_at is None:
+            return
+        cities = [city for city in self.store.favorites() if self.due(city)]
+        self.last_run = time.time()
+        if not cities:
+            return
+        self.batch = BatchWeatherQuery(
+            cities,
+            fetch=self.fetch,
+            on_result=self._store_result,
+            max_concurrent=self.max_concurrent
+        )
+        self.batch.start()
+
+    def _store_result(self, city, data, error):
+        if error is not None:
+            return
+        self.store.save(city, data)
+        if self.on_update:
+            self.on_update(city, data)
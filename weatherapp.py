@@ -3,81 +3,515 @@ from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.label import Label
 from kivy.uix.textinput import TextInput
 from kivy.uix.button import Button
-from kivy.network.urlrequest import UrlRequest
-from urllib.parse import quote
-import json
-import certifi
+from kivy.clock import Clock
+import os
+import time
+from weather_cache import WeatherCache, normalize_city
+from weather_batch import BatchWeatherQuery, CITY_SEPARATORS, parse_city_list, load_city_file
+from weather_store import WeatherStore, PrefetchScheduler
+from forecast_view import ForecastView, forecast_rows, city_row
+from weather_decode import DecodeWorker, format_summary
+from weather_providers import ProviderRouter, providers_from_urls
+from city_index import get_city_index
+
+# 可通过环境变量指向本地桩服务进行测试
+WEATHER_API_URL = os.environ.get('WEATHER_API_URL', 'https://wthrcdn.etouch.cn/weather_mini')
+# 备用数据源（逗号分隔，需兼容 weather_mini 格式）；主线路慢或不可用时自动切换
+WEATHER_API_FALLBACKS = os.environ.get('WEATHER_API_FALLBACKS', '')
+# 尚无延迟样本时的对冲等待时间（秒）；有样本后使用该线路的 p95 延迟
+HEDGE_DELAY = float(os.environ.get('WEATHER_HEDGE_DELAY', '2.0'))
+CACHE_TTL = int(os.environ.get('WEATHER_CACHE_TTL', '600'))
+CACHE_MAX_ENTRIES = int(os.environ.get('WEATHER_CACHE_SIZE', '50'))
+# 多城市模式下同时进行的请求数上限
+BATCH_MAX_CONCURRENT = int(os.environ.get('WEATHER_BATCH_CONCURRENCY', '6'))
+# 边输入边查询的静默期（秒）：输入停止超过该时间才发起查询，0 表示关闭
+LIVE_SEARCH_DELAY = float(os.environ.get('WEATHER_LIVE_DELAY', '0.6'))
+# 输入联想显示的候选城市数
+SUGGESTION_LIMIT = 5
+# 收藏城市的后台预取间隔（秒），以及首次启动时预置的收藏城市
+PREFETCH_INTERVAL = int(os.environ.get('WEATHER_PREFETCH_INTERVAL', '1800'))
+DEFAULT_FAVORITES = os.environ.get('WEATHER_FAVORITES', '')
+PREFETCH_START_DELAY = 3
+# 离线存储中保留的非收藏城市数，以及缓存与存储修改后延迟写盘的时间（秒），期间的多次修改合并为一次写入
+STORE_MAX_ENTRIES = int(os.environ.get('WEATHER_STORE_SIZE', '100'))
+SAVE_DELAY = 5
+
+_http_client = None
+_ca_file = None
+
+
+def http_client():
+    """共享的 keep-alive HTTP 客户端，首次发起请求时才导入并创建，缩短冷启动时间"""
+    global _http_client
+    if _http_client is None:
+        from weather_http import HttpClient
+        _http_client = HttpClient(
+            Clock.schedule_once,
+            cafile=ca_file,
+            max_workers=BATCH_MAX_CONCURRENT,
+            timeout=15,
+            headers={'User-Agent': 'Mozilla/5.0'}
+        )
+    return _http_client
+
+
+def ca_file():
+    """CA 证书路径只在首次请求时解析一次，之后复用"""
+    global _ca_file
+    if _ca_file is None:
+        import certifi
+        _ca_file = certifi.where()
+    return _ca_file
+
 
 class WeatherApp(App):
+    # 命中缓存时是否在后台刷新数据
+    refresh_on_hit = True
+
     def build(self):
+        # 进行中的请求表：规范化城市名 -> {'request', 'city', 'background'}
+        self.in_flight = {}
+        self.latest_key = None
+        self.batch = None
+        self.save_trigger = Clock.create_trigger(lambda dt: self.save_state(), SAVE_DELAY)
+        self.cache = WeatherCache(
+            os.path.join(self.user_data_dir, 'weather_cache.json'),
+            ttl=CACHE_TTL,
+            max_entries=CACHE_MAX_ENTRIES,
+            on_change=self.save_trigger
+        )
+        self.store = WeatherStore(
+            os.path.join(self.user_data_dir, 'weather_store.json'),
+            max_entries=STORE_MAX_ENTRIES,
+            on_change=self.save_trigger
+        )
+        for city in parse_city_list(DEFAULT_FAVORITES):
+            self.store.add_favorite(city)
+        self.prefetcher = None
+        self._decoder = None
+        # 未通过本地校验的输入；再次点击查询时按原样发送请求（词典未收录的县区等）
+        self.unverified_text = None
+        self.live_trigger = Clock.create_trigger(self.live_search, LIVE_SEARCH_DELAY) if LIVE_SEARCH_DELAY > 0 else None
+        self.live_searches = 0
+        self.router = ProviderRouter(
+            providers_from_urls([WEATHER_API_URL] + WEATHER_API_FALLBACKS.split(',')),
+            self.open_request,
+            Clock.schedule_once,
+            hedge_default=HEDGE_DELAY
+        )
         self.layout = BoxLayout(orientation='vertical', padding=10, spacing=10)
         self.city_input = TextInput(
-            hint_text='输入城市名',
-            size_hint=(1, 0.2),
+            hint_text='输入城市名（多个城市用逗号分隔，或输入城市列表文件路径）',
+            size_hint=(1, 0.1),
             multiline=False
         )
         self.submit = Button(
             text='查询天气',
-            size_hint=(1, 0.2),
+            size_hint=(0.7, 1),
             background_normal='',
             background_color=(0.2, 0.6, 1, 1)
         )
+        self.favorite_button = Button(
+            text='收藏',
+            size_hint=(0.3, 1)
+        )
+        self.buttons = BoxLayout(orientation='horizontal', size_hint=(1, 0.1), spacing=10)
+        self.buttons.add_widget(self.submit)
+        self.buttons.add_widget(self.favorite_button)
+        self.suggestion_bar = BoxLayout(orientation='horizontal', size_hint=(1, 0.08), spacing=5)
         self.weather_label = Label(
             text='天气信息将显示在这里',
-            size_hint=(1, 0.6),
+            size_hint=(1, 0.3),
             halign='center',
             valign='middle'
         )
-        
+        self.results_view = ForecastView(size_hint=(1, 0.4))
+        self.cache_label = Label(
+            text='',
+            size_hint=(1, 0.1),
+            font_size='12sp'
+        )
+
         self.submit.bind(on_press=self.get_weather)
+        self.favorite_button.bind(on_press=self.toggle_favorite)
+        self.city_input.bind(text=self.on_city_text)
         self.layout.add_widget(self.city_input)
-        self.layout.add_widget(self.submit)
+        self.layout.add_widget(self.suggestion_bar)
+        self.layout.add_widget(self.buttons)
         self.layout.add_widget(self.weather_label)
+        self.layout.add_widget(self.results_view)
+        self.layout.add_widget(self.cache_label)
         return self.layout
 
-    def get_weather(self, instance):
+    def on_start(self):
+        self.prefetcher = PrefetchScheduler(
+            self.store,
+            self.fetch_for_batch,
+            Clock.schedule_interval,
+            interval=PREFETCH_INTERVAL,
+            on_update=self.on_prefetched
+        )
+        # 首次预取推迟到界面显示之后，避免与冷启动争抢 CPU 和网络
+        Clock.schedule_once(lambda dt: self.prefetcher.start(), PREFETCH_START_DELAY)
+
+    def save_state(self):
+        self.save_trigger.cancel()
+        self.cache.save()
+        self.store.flush()
+
+    def on_pause(self):
+        # 切到后台后进程可能被系统回收，先写入待保存的数据
+        self.save_state()
+        return True
+
+    def on_stop(self):
+        if self.prefetcher:
+            self.prefetcher.stop()
+        if self._decoder is not None:
+            self._decoder.stop()
+        if _http_client is not None:
+            _http_client.close()
+        self.save_state()
+
+    @property
+    def decoder(self):
+        # 解码线程在第一次收到响应时才启动
+        if self._decoder is None:
+            self._decoder = DecodeWorker(Clock.schedule_once)
+        return self._decoder
+
+    @property
+    def city_index(self):
+        return get_city_index()
+
+    def toggle_favorite(self, instance):
+        city = self.city_input.text.strip()
+        if not city or len(parse_city_list(city)) != 1:
+            return
+        if self.store.is_favorite(city):
+            self.store.remove_favorite(city)
+        else:
+            self.store.add_favorite(city)
+            if self.prefetcher:
+                self.prefetcher.run()
+        self.update_favorite_button()
+
+    def update_favorite_button(self):
+        city = self.city_input.text.strip()
+        self.favorite_button.text = '取消收藏' if city and self.store.is_favorite(city) else '收藏'
+
+    def on_city_text(self, instance, text):
+        self.update_favorite_button()
+        self.update_suggestions(text)
+        self.schedule_live_search()
+
+    def schedule_live_search(self):
+        """防抖：每次输入都重新计时，只有输入停止 LIVE_SEARCH_DELAY 秒后才查询"""
+        if self.live_trigger is None:
+            return
+        self.live_trigger.cancel()
+        self.live_trigger()
+
+    def live_search(self, dt):
+        # 只对本地词典能唯一确定的单个城市自动查询，多城市、文件路径和未完成的输入等待手动查询
+        text = self.city_input.text.strip()
+        city = self.city_index.resolve(text) if text else None
+        if city is None or normalize_city(city) == self.latest_key:
+            return
+        self.live_searches += 1
+        self.get_weather(None, live=True)
+
+    def update_suggestions(self, text):
+        """根据输入的最后一个城市（多城市时按分隔符切分）显示前缀匹配的候选城市"""
+        self.suggestion_bar.clear_widgets()
+        last = CITY_SEPARATORS.split(text)[-1].strip()
+        if not last:
+            return
+        suggestions = self.city_index.suggest(last, SUGGESTION_LIMIT)
+        if suggestions == [last]:
+            return
+        for city in suggestions:
+            button = Button(text=city, font_size='13sp')
+            button.bind(on_press=lambda instance, city=city: self.pick_suggestion(city))
+            self.suggestion_bar.add_widget(button)
+
+    def pick_suggestion(self, city):
+        text = self.city_input.text
+        last = CITY_SEPARATORS.split(text)[-1]
+        prefix = text[:len(text) - len(last)] if last else text
+        self.city_input.text = prefix + city
+        self.get_weather(None)
+
+    def validate_cities(self, text, cities):
+        """本地校验城市名（支持拼音），返回 (可查询的城市列表, 未识别的城市 -> 候选列表)"""
+        resolved = []
+        unknown = {}
+        for city in cities:
+            name, suggestions = self.city_index.validate(city)
+            if name is not None:
+                resolved.append(name)
+            elif text == self.unverified_text:
+                resolved.append(city)
+            else:
+                unknown[city] = suggestions
+        return parse_city_list('\n'.join(resolved)), unknown
+
+    def on_prefetched(self, city, data):
+        self.cache.put(city, data)
+        if normalize_city(city) == self.latest_key:
+            self.render_weather(city, data)
+
+    def get_weather(self, instance, live=False):
+        if self.live_trigger is not None:
+            self.live_trigger.cancel()
         city = self.city_input.text.strip()
         if not city:
             self.weather_label.text = "请输入城市名"
             return
-            
+        if self.batch:
+            self.batch.cancel()
+            self.batch = None
+        cities, unknown = self.validate_cities(city, self.parse_cities(city))
+        if unknown:
+            # 未收录或拼写有误的城市不发送请求，先给出候选
+            self.unverified_text = city
+            self.show_unknown_cities(unknown)
+            return
+        self.unverified_text = None
+        if len(cities) > 1:
+            self.get_weather_batch(cities)
+            return
+        if not cities:
+            return
+        city = cities[0]
+        self.results_view.clear()
+
+        self.latest_key = normalize_city(city)
+        self.supersede_requests(self.latest_key)
+        cached = self.cache.get(city, allow_stale=True)
+        self.update_cache_label()
+        if cached:
+            data, fresh = cached
+            try:
+                self.render_weather(city, data)
+            except Exception:
+                self.cache.invalidate(city)
+                self.request_weather(city)
+                return
+            if fresh and (live or not self.refresh_on_hit):
+                # 自动查询命中未过期缓存时不再后台刷新，避免输入过程中产生额外请求
+                return
+            self.request_weather(city, background=True)
+            return
+        stored = self.store.load(city)
+        if stored:
+            # 本地存储中有数据（例如已预取的收藏城市）时直接显示，无需等待网络
+            data, fetched_at = stored
+            try:
+                self.render_weather(city, data, fetched_at=fetched_at)
+                if time.time() - fetched_at < PREFETCH_INTERVAL:
+                    self.cache.put(city, data, fetched_at=fetched_at)
+                    return
+                self.request_weather(city, background=True)
+                return
+            except Exception:
+                pass
+        self.request_weather(city)
+
+    def show_unknown_cities(self, unknown):
+        lines = []
+        for city, suggestions in unknown.items():
+            hint = f"，是否要查询：{'、'.join(suggestions)}" if suggestions else ''
+            lines.append(f"未找到城市“{city}”{hint}")
+        lines.append("（再次点击查询将直接发送请求）")
+        self.weather_label.text = '\n'.join(lines)
+        last = list(unknown)[-1]
+        self.suggestion_bar.clear_widgets()
+        for suggestion in unknown[last][:SUGGESTION_LIMIT]:
+            button = Button(text=suggestion, font_size='13sp')
+            button.bind(on_press=lambda instance, old=last, new=suggestion: self.replace_city(old, new))
+            self.suggestion_bar.add_widget(button)
+
+    def replace_city(self, old, new):
+        cities = [new if city == old else city for city in self.parse_cities(self.city_input.text)]
+        self.city_input.text = '，'.join(cities)
+        self.get_weather(None)
+
+    def open_request(self, url, on_success, on_error, on_failure=None, on_cancel=None):
+        # 复用连接池中的已建立连接，响应体保持原始 bytes（可能是 gzip），由解码线程处理
+        return http_client().request(
+            url,
+            on_success=on_success,
+            on_error=on_error,
+            on_failure=on_failure or on_error,
+            on_cancel=on_cancel
+        )
+
+    def request_weather(self, city, background=False):
+        key = normalize_city(city)
+        pending = self.in_flight.get(key)
+        if pending:
+            # 同一城市已有请求在进行中，复用该请求
+            if not background and pending['background']:
+                pending['background'] = False
+                self.weather_label.text = "查询中..."
+            return
         try:
-            url = f'https://wthrcdn.etouch.cn/weather_mini?city={quote(city)}'
-            UrlRequest(
-                url, 
-                on_success=self.update_ui, 
-                on_error=self.handle_error,
-                timeout=15,
-                ca_file=certifi.where(),
-                req_headers={
-                    'User-Agent': 'Mozilla/5.0',
-                    'Content-Type': 'application/json'
-                }
+            entry = {'city': city, 'background': background, 'request': None}
+            self.in_flight[key] = entry
+            entry['request'] = self.router.fetch(
+                city,
+                on_success=lambda req, result, provider: self.update_ui(req, result, city, provider),
+                on_error=lambda req, error: self.handle_error(req, error, city)
             )
-            self.weather_label.text = "查询中..."
+            if not background and self.in_flight.get(key) is entry:
+                self.weather_label.text = "查询中..."
         except Exception as e:
-            self.weather_label.text = f"请求错误: {str(e)}"
+            self.in_flight.pop(key, None)
+            if not background:
+                self.weather_label.text = f"请求错误: {str(e)}"
 
-    def update_ui(self, req, result):
-        try:
-            data = json.loads(result)
-            if data.get('status') == 1000:
-                weather = data['data']['forecast'][0]
-                self.weather_label.text = (
-                    f"{self.city_input.text} 天气:\n"
-                    f"{weather['type']}\n"
-                    f"温度: {weather['low'][2:]}~{weather['high'][2:]}\n"
-                    f"风向: {weather['fengxiang']}"
-                )
+    def supersede_requests(self, key):
+        """新的查询发起后，取消其他城市仍在进行的请求，只保留最新查询的结果"""
+        for other_key in list(self.in_flight):
+            if other_key == key:
+                continue
+            entry = self.in_flight.pop(other_key)
+            request = entry.get('request')
+            if request is not None and hasattr(request, 'cancel'):
+                request.cancel()
+
+    def finish_request(self, key, req):
+        """请求结束后从进行中表移除，返回该请求的登记信息；已被取代的请求返回 None"""
+        entry = self.in_flight.get(key)
+        if entry is None:
+            return None
+        # request 仍为 None 说明回调发生在 fetch() 返回之前，也属于这次登记的请求
+        if entry.get('request') is not req and entry.get('request') is not None:
+            return None
+        return self.in_flight.pop(key)
+
+    def update_ui(self, req, result, city=None, provider=None):
+        city = city or self.city_input.text
+        key = normalize_city(city)
+        entry = self.finish_request(key, req)
+        background = entry['background'] if entry else True
+        # JSON 解码与视图模型转换在工作线程中完成，完成后经 Clock 回到主线程渲染
+        self.decoder.submit(
+            city, result,
+            lambda model: self.apply_view_model(model, background),
+            adapt=provider.adapt if provider else None
+        )
+
+    def apply_view_model(self, model, background=False):
+        city = model['city']
+        is_latest = normalize_city(city) == self.latest_key
+        if model['error'] is None:
+            self.cache.put(city, model['data'])
+            self.store.save(city, model['data'])
+            if is_latest:
+                self.results_view.set_rows(model['rows'])
+                self.weather_label.text = model['summary']
+        elif is_latest and not background:
+            self.weather_label.text = model['error']
+        self.update_cache_label()
+
+    def parse_cities(self, text):
+        if os.path.isfile(text):
+            try:
+                return load_city_file(text)
+            except Exception as e:
+                self.weather_label.text = f"城市列表读取失败: {str(e)}"
+                return []
+        return parse_city_list(text)
+
+    def get_weather_batch(self, cities):
+        self.latest_key = None
+        self.supersede_requests(None)
+        self.results_view.clear()
+        self.weather_label.text = f"正在查询 {len(cities)} 个城市..."
+        self.batch = BatchWeatherQuery(
+            cities,
+            fetch=self.fetch_for_batch,
+            on_result=self.add_batch_result,
+            on_complete=self.finish_batch,
+            cache=self.cache,
+            max_concurrent=BATCH_MAX_CONCURRENT
+        )
+        self.batch.start()
+
+    def fetch_for_batch(self, city, on_success, on_error):
+        def decoded(model):
+            if model['error'] is None:
+                on_success(model['data'])
             else:
-                self.weather_label.text = "城市不存在或查询失败"
+                on_error(model['error'])
+
+        def success(req, result, provider):
+            self.decoder.submit(city, result, decoded, adapt=provider.adapt)
+        return self.router.fetch(
+            city,
+            on_success=success,
+            on_error=lambda req, error: on_error(f"网络错误: {str(error)}")
+        )
+
+    def add_batch_result(self, city, data, error):
+        if error is None:
+            self.store.save(city, data)
+        try:
+            row = city_row(city, data, error)
         except Exception as e:
-            self.weather_label.text = f"数据解析错误: {str(e)}"
+            row = city_row(city, error=f"数据解析错误: {str(e)}")
+        self.results_view.upsert_row(normalize_city(city), row)
+        done = len(self.batch.results) + len(self.batch.errors) if self.batch else 0
+        self.weather_label.text = f"已返回 {done}/{len(self.batch.cities) if self.batch else done} 个城市"
+
+    def finish_batch(self, stats):
+        self.weather_label.text = (
+            f"{stats['cities']} 个城市查询完成（成功 {stats['succeeded']}，失败 {stats['failed']}）\n"
+            f"总耗时 {stats['total_seconds']:.2f}s，逐个查询约需 {stats['sequential_seconds']:.2f}s"
+        )
+        self.update_cache_label()
 
-    def handle_error(self, req, error):
+    def render_weather(self, city, data, fetched_at=None, note=None):
+        self.results_view.set_rows(forecast_rows(data))
+        text = format_summary(city, data)
+        if fetched_at is not None:
+            text += f"\n（{note or '离线数据'}，更新于 {time.strftime('%m-%d %H:%M', time.localtime(fetched_at))}）"
+        self.weather_label.text = text
+
+    def update_cache_label(self):
+        stats = self.cache.stats()
+        decode = self._decoder.stats() if self._decoder else {'avg_ms': 0.0}
+        text = (
+            f"缓存命中率: {stats['hit_rate']:.0%} "
+            f"(命中 {stats['hits'] + stats['stale_hits']} / 查询 {self.cache.requests}，缓存 {stats['entries']} 个城市)"
+            f"  解码 {decode['avg_ms']:.1f}ms/次"
+        )
+        if _http_client is not None:
+            http = _http_client.stats()
+            text += f"\n请求 {http['avg_ms']:.0f}ms (p95 {http['p95_ms']:.0f}ms)，连接复用 {http['reuse_rate']:.0%}"
+        if len(self.router.providers) > 1:
+            fastest = self.router.ranked()[0].stats()
+            latency = f" {fastest['p50_ms']:.0f}ms" if fastest['p50_ms'] is not None else ''
+            text += f"\n线路: {fastest['name']}{latency}，对冲 {self.router.hedged} 次，切换 {self.router.failovers} 次"
+        self.cache_label.text = text
+
+    def handle_error(self, req, error, city=None):
+        key = normalize_city(city) if city else self.latest_key
+        entry = self.finish_request(key, req)
+        if entry is None or entry['background'] or key != self.latest_key:
+            return
+        stored = self.store.load(city) if city else None
+        if stored:
+            try:
+                self.render_weather(city, stored[0], fetched_at=stored[1], note="网络错误，显示离线数据")
+                return
+            except Exception:
+                pass
         self.weather_label.text = f"网络错误: {str(error)}"
 
 if __name__ == '__main__':
     WeatherApp().run()
 
-    # v1
\ No newline at end of file
+    # v1